@@ -0,0 +1,80 @@
+"""
+Admin changelists for the big tables.
+
+With ADMIN_PERFORMANCE_MODE on, ``PerformanceAdminMixin`` keeps a
+changelist page to a fixed handful of queries however large the table:
+
+* text and JSON columns the list does not show (``message``, ``skills``...)
+  are deferred, so a list page never reads them;
+* the count comes from ``EstimatedCountPaginator``: on Postgres an
+  unfiltered table past ADMIN_ESTIMATED_COUNT_THRESHOLD rows is counted
+  from ``pg_class.reltuples`` instead of a ``COUNT(*)`` scan;
+* the second, unfiltered count behind "N of M selected" is skipped.
+
+Payment payloads are not columns at all any more (payments/payloads.py).
+"""
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections, models
+from django.utils.functional import cached_property
+
+
+def performance_mode():
+    return getattr(settings, "ADMIN_PERFORMANCE_MODE", True)
+
+
+class EstimatedCountPaginator(Paginator):
+    def estimate(self):
+        """The planner's row count when the queryset is a whole Postgres table, else None."""
+        queryset = self.object_list
+        if not isinstance(queryset, models.QuerySet) or queryset.query.where or queryset.query.combinator:
+            return None
+        connection = connections[queryset.db]
+        if connection.vendor != "postgresql":
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                           [connection.ops.quote_name(queryset.model._meta.db_table)])
+            row = cursor.fetchone()
+        # -1 until the table has been vacuumed or analyzed.
+        return row[0] if row and row[0] >= 0 else None
+
+    @cached_property
+    def count(self):
+        estimate = self.estimate()
+        if estimate is not None and estimate >= getattr(settings, "ADMIN_ESTIMATED_COUNT_THRESHOLD", 10000):
+            return estimate
+        return super().count
+
+
+class PerformanceAdminMixin:
+    """ModelAdmin changelists that stay cheap on large tables (see module docstring)."""
+
+    # Columns left out of list pages; None defers every text/JSON field not in list_display.
+    list_defer = None
+
+    @property
+    def show_full_result_count(self):
+        return not performance_mode()
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        paginator = EstimatedCountPaginator if performance_mode() else self.paginator
+        return paginator(queryset, per_page, orphans, allow_empty_first_page)
+
+    def get_list_defer(self, request):
+        if self.list_defer is not None:
+            return self.list_defer
+        shown = set(self.get_list_display(request)) | set(self.list_editable)
+        return [
+            field.name for field in self.model._meta.concrete_fields
+            if isinstance(field, (models.TextField, models.JSONField)) and field.name not in shown
+        ]
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        opts = self.model._meta
+        match = getattr(request, "resolver_match", None)
+        # Only the list page; the change form needs every column.
+        if performance_mode() and match and match.url_name == f"{opts.app_label}_{opts.model_name}_changelist":
+            queryset = queryset.defer(*self.get_list_defer(request))
+        return queryset
@@ -0,0 +1,185 @@
+"""
+Response cache for read-heavy public GET list endpoints.
+
+``cache_response(Model)`` stores the rendered body of a 200 GET in the
+``RESPONSE_CACHE_ALIAS`` cache, keyed on the path, the sorted query params
+and the ``Accept`` header. Keys also carry the model's *generation*: the
+time of its last change, bumped by ``track_model``'s save/delete signals.
+A change moves readers to fresh keys at once and old entries just age
+out, so no backend needs key scans.
+
+Only processes that share the cache see each other's generations. On the
+default per-process locmem a change made in one gunicorn worker (or a
+management command) leaves every other worker serving the old body until
+RESPONSE_CACHE_SECONDS run out, so gunicorn.conf.py calls
+``check_shared`` and refuses to start several workers on it: point
+RESPONSE_CACHE_URL at Redis, a file path or a database table instead.
+
+The generation doubles as ``Last-Modified``, and every response carries an
+``ETag`` of its body, so revalidating clients get a 304.
+"""
+import functools
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from payments.signals import rows_bulk_created, rows_bulk_updated
+
+from .metrics import Metric, register_collector
+
+KEY_PREFIX = "resp"
+
+_stats = {}  # model label -> {event: count}
+_stats_lock = threading.Lock()
+
+
+def get_cache():
+    return caches[getattr(settings, "RESPONSE_CACHE_ALIAS", "default")]
+
+
+def is_process_local(alias):
+    """True when every process keeps its own copy of cache ``alias``."""
+    return settings.CACHES[alias]["BACKEND"] == "django.core.cache.backends.locmem.LocMemCache"
+
+
+def check_shared(workers):
+    """Raise ImproperlyConfigured if ``workers`` processes would each keep their own generations."""
+    alias = getattr(settings, "RESPONSE_CACHE_ALIAS", "default")
+    if workers > 1 and getattr(settings, "RESPONSE_CACHE_ENABLED", True) and is_process_local(alias):
+        raise ImproperlyConfigured(
+            f"The response cache is per-process locmem but {workers} workers would serve from it; "
+            "set RESPONSE_CACHE_URL to a shared cache or RESPONSE_CACHE_ENABLED=False."
+        )
+
+
+def _count(label, event):
+    with _stats_lock:
+        counts = _stats.setdefault(label, {"hits": 0, "misses": 0, "not_modified": 0, "invalidations": 0})
+        counts[event] += 1
+
+
+# ----------- Invalidation -----------
+def generation(label):
+    """
+    Timestamp of the last change to ``label``'s rows (set on first use), as
+    seen by every process sharing the response cache.
+    """
+    cache = get_cache()
+    key = f"{KEY_PREFIX}:gen:{label}"
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, time.time(), None)
+        value = cache.get(key, time.time())
+    return value
+
+
+def invalidate(label):
+    get_cache().set(f"{KEY_PREFIX}:gen:{label}", time.time(), None)
+    _count(label, "invalidations")
+
+
+def _changed(sender, **kwargs):
+    label = sender._meta.label_lower
+    invalidate(label)
+    # Again once committed: a read between the two could have cached the
+    # pre-commit rows under the first new generation.
+    transaction.on_commit(lambda: invalidate(label))
+
+
+def track_model(model):
+    """Bump ``model``'s generation whenever its rows change. Call from ``AppConfig.ready``."""
+    uid = f"response-cache-{model._meta.label_lower}"
+    post_save.connect(_changed, sender=model, dispatch_uid=uid)
+    post_delete.connect(_changed, sender=model, dispatch_uid=uid)
+    rows_bulk_created.connect(_changed, sender=model, dispatch_uid=uid)
+    rows_bulk_updated.connect(_changed, sender=model, dispatch_uid=uid)
+
+
+# ----------- View decorator -----------
+def cache_key(request, label, gen):
+    params = sorted((k, v) for k, values in request.GET.lists() for v in values)
+    raw = repr((request.path, params, request.headers.get("Accept", "")))
+    return f"{KEY_PREFIX}:{label}:{gen!r}:{hashlib.md5(raw.encode()).hexdigest()}"
+
+
+def _finish(request, entry, last_modified, response=None):
+    if response is None:
+        response = HttpResponse(entry["content"], content_type=entry["content_type"])
+        if entry["vary"]:
+            response["Vary"] = entry["vary"]
+    response["ETag"] = entry["etag"]
+    response["Last-Modified"] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    return get_conditional_response(request, etag=entry["etag"], last_modified=int(last_modified),
+                                    response=response)
+
+
+def cache_response(model):
+    """Serve GETs of the wrapped view from the response cache until ``model`` changes."""
+    label = model._meta.label_lower
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != "GET" or not getattr(settings, "RESPONSE_CACHE_ENABLED", True):
+                return view(request, *args, **kwargs)
+
+            cache = get_cache()
+            # Read the generation before the rows, so a concurrent change
+            # can only leave a stale entry under a key nobody reads.
+            gen = generation(label)
+            key = cache_key(request, label, gen)
+            entry = cache.get(key)
+            if entry is not None:
+                response = _finish(request, entry, gen)
+                _count(label, "not_modified" if response.status_code == 304 else "hits")
+                return response
+
+            _count(label, "misses")
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            if hasattr(response, "render"):
+                response.render()
+            entry = {
+                "content": response.content,
+                "content_type": response["Content-Type"],
+                "vary": response.get("Vary", ""),
+                "etag": '"%s"' % hashlib.md5(response.content).hexdigest(),
+            }
+            cache.set(key, entry, getattr(settings, "RESPONSE_CACHE_SECONDS", 300))
+            return _finish(request, entry, gen, response)
+        return wrapper
+    return decorator
+
+
+# ----------- Stats -----------
+def stats():
+    with _stats_lock:
+        snapshot = {label: dict(counts) for label, counts in _stats.items()}
+    for counts in snapshot.values():
+        served = counts["hits"] + counts["not_modified"] + counts["misses"]
+        counts["hit_ratio"] = round((served - counts["misses"]) / served, 4) if served else 0.0
+    return snapshot
+
+
+def _collect():
+    events = Metric("http_response_cache_total", "counter", "Response cache lookups and invalidations, by model.")
+    ratio = Metric("http_response_cache_hit_ratio", "gauge", "Share of cacheable GETs served from the cache.")
+    for label, counts in stats().items():
+        for event in ("hits", "misses", "not_modified", "invalidations"):
+            events.add(counts[event], model=label, event=event)
+        ratio.add(counts["hit_ratio"], model=label)
+    return [events, ratio]
+
+
+register_collector("response_cache", _collect)
@@ -0,0 +1,135 @@
+"""
+Aggregate rows kept in step with the rows they summarise, by delta.
+
+``dashboard.counters`` (totals per name) and ``payments.rollups`` (totals
+per day, channel, currency and status) both work this way: a tracked row
+*contributes* ``{key: (count, total)}``, and every insert, update, delete
+and bulk path adds the difference between what the row contributed
+before and after to the aggregate rows, in the writer's transaction.
+
+``DeltaTracker`` holds the signal handlers. It snapshots contributions on
+``post_init``, so an update needs no extra SELECT, and it falls back to
+reading the stored row when the instance was loaded with a tracked field
+deferred. ``apply`` receives the merged deltas; it must update the
+aggregates in sorted key order, so concurrent writers lock the rows in the
+same order and cannot deadlock.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models.signals import post_init, post_save, pre_delete, pre_save
+
+from payments.signals import rows_bulk_created, rows_bulk_updated
+
+ZERO = Decimal("0")
+
+
+def diff(old, new):
+    deltas = defaultdict(lambda: [0, ZERO])
+    for key, (count, total) in new.items():
+        deltas[key][0] += count
+        deltas[key][1] += total
+    for key, (count, total) in old.items():
+        deltas[key][0] -= count
+        deltas[key][1] -= total
+    return {key: tuple(d) for key, d in deltas.items() if d[0] or d[1]}
+
+
+def merge(into, deltas):
+    for key, (count, total) in deltas.items():
+        old_count, old_total = into.get(key, (0, ZERO))
+        into[key] = (old_count + count, old_total + total)
+    return into
+
+
+class DeltaTracker:
+    """
+    Signal handlers feeding ``apply`` the deltas of the models in ``fields``.
+
+    ``fields`` maps each model to the fields ``contributions`` reads; a model
+    with none contributes the same on every save, so only inserts and deletes
+    count. ``name`` keeps the instance attributes and dispatch uids apart.
+    """
+
+    def __init__(self, name, fields, contributions, apply):
+        self.name = name
+        self.fields = fields
+        self.contributions = contributions
+        self.apply = apply
+        self.loaded_attr = f"_{name}_loaded"
+        self.before_attr = f"_{name}_before"
+
+    def stored(self, model, pk):
+        """Contributions of the row as currently stored; None if they cannot change."""
+        fields = self.fields[model]
+        if not fields:
+            return None
+        old = model.objects.filter(pk=pk).only(*fields).first()
+        return self.contributions(old) if old is not None else {}
+
+    # ----------- Handlers -----------
+    def remember_loaded(self, sender, instance, **kwargs):
+        fields = self.fields[sender]
+        if fields and instance.pk is not None and not instance.get_deferred_fields().intersection(fields):
+            setattr(instance, self.loaded_attr, self.contributions(instance))
+
+    def remember_stored(self, sender, instance, raw=False, **kwargs):
+        if raw:
+            return
+        if instance._state.adding:
+            before = {}
+        elif hasattr(instance, self.loaded_attr):
+            before = getattr(instance, self.loaded_attr)
+        else:
+            before = self.stored(sender, instance.pk)
+        setattr(instance, self.before_attr, before)
+
+    def on_save(self, sender, instance, raw=False, **kwargs):
+        if raw:
+            return
+        before = getattr(instance, self.before_attr, {})
+        if before is None:
+            return  # Already counted, and its contributions cannot change.
+        after = self.contributions(instance)
+        self.apply(diff(before, after))
+        setattr(instance, self.before_attr, None)
+        if self.fields[sender]:
+            setattr(instance, self.loaded_attr, after)
+
+    def on_delete(self, sender, instance, **kwargs):
+        # Deletes are rare; read what is stored rather than trust a possibly stale instance.
+        before = self.stored(sender, instance.pk)
+        if before is None:
+            before = self.contributions(instance)
+        self.apply(diff(before, {}))
+
+    def on_bulk_create(self, sender, objs, **kwargs):
+        if sender not in self.fields:
+            return
+        # bulk_create skips post_save; count the whole batch in one update per key.
+        totals = {}
+        for obj in objs:
+            merge(totals, self.contributions(obj))
+        self.apply(totals)
+
+    def on_bulk_update(self, sender, objs, **kwargs):
+        if not self.fields.get(sender):
+            return
+        totals = {}
+        for obj in objs:
+            before = getattr(obj, self.loaded_attr, None)
+            if before is None:
+                continue  # Loaded with deferred fields; the periodic recount catches it.
+            after = self.contributions(obj)
+            merge(totals, diff(before, after))
+            setattr(obj, self.loaded_attr, after)
+        self.apply(totals)
+
+    def connect(self):
+        rows_bulk_created.connect(self.on_bulk_create, dispatch_uid=f"{self.name}-bulk-create")
+        rows_bulk_updated.connect(self.on_bulk_update, dispatch_uid=f"{self.name}-bulk-update")
+        for model in self.fields:
+            post_init.connect(self.remember_loaded, sender=model, dispatch_uid=f"{self.name}-init-{model.__name__}")
+            pre_save.connect(self.remember_stored, sender=model, dispatch_uid=f"{self.name}-pre-{model.__name__}")
+            post_save.connect(self.on_save, sender=model, dispatch_uid=f"{self.name}-save-{model.__name__}")
+            pre_delete.connect(self.on_delete, sender=model, dispatch_uid=f"{self.name}-delete-{model.__name__}")
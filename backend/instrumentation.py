@@ -0,0 +1,208 @@
+"""
+Per-request timing: SQL queries and DB time, outbound provider HTTP time
+and DRF render time.
+
+``InstrumentationMiddleware`` opens a ``RequestMetrics`` for each request.
+Anything on the request path can add to it with ``record(kind, ms)`` or
+``with timer(kind):``; both are no-ops outside a request (management
+commands, workers). Totals feed a structured log line and the per-route
+histograms behind ``/metrics``, and, with INSTRUMENTATION_SERVER_TIMING, a
+``Server-Timing`` header.
+"""
+import contextvars
+import hmac
+import json
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse
+
+from .metrics import LatencyHistogram, Metric, collect_all, histogram_metric, register_collector, render
+
+logger = logging.getLogger("backend.requests")
+slow_logger = logging.getLogger("backend.requests.slow")
+
+_current = contextvars.ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.timings = {}  # kind -> [total ms, count]
+
+    def add(self, kind, elapsed_ms, count=1):
+        entry = self.timings.setdefault(kind, [0.0, 0])
+        entry[0] += elapsed_ms
+        entry[1] += count
+
+    def ms(self, kind):
+        return self.timings.get(kind, (0.0, 0))[0]
+
+
+def current():
+    return _current.get()
+
+
+def record(kind, elapsed_ms, count=1):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.add(kind, elapsed_ms, count)
+
+
+@contextmanager
+def timer(kind):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(kind, (time.perf_counter() - started) * 1000)
+
+
+def _count_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.add("db", (time.perf_counter() - started) * 1000)
+
+
+def _install_query_counter(connection, **kwargs):
+    # The wrapper reads the request from the context variable, so it also
+    # counts queries that async views run through sync_to_async threads.
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+connection_created.connect(_install_query_counter)
+
+
+# ----------- Per-route aggregates for /metrics -----------
+_routes_lock = threading.Lock()
+_route_latency = {}
+_route_counts = {}  # (route, method, status) -> [requests, queries]
+
+
+def _observe_route(route, method, status, total_ms, queries):
+    key = (("route", route), ("method", method))
+    with _routes_lock:
+        histogram = _route_latency.get(key)
+        if histogram is None:
+            histogram = _route_latency[key] = LatencyHistogram()
+        counts = _route_counts.setdefault((route, method, str(status)), [0, 0])
+        counts[0] += 1
+        counts[1] += queries
+    histogram.observe(total_ms, error=status >= 500)
+
+
+def _collect_requests():
+    with _routes_lock:
+        latency = dict(_route_latency)
+        counts = {k: list(v) for k, v in _route_counts.items()}
+    requests_total = Metric("http_requests_total", "counter", "Requests served, by route and status.")
+    queries_total = Metric("http_request_queries_total", "counter", "SQL queries issued while serving requests.")
+    for (route, method, status), (n, queries) in counts.items():
+        requests_total.add(n, route=route, method=method, status=status)
+        queries_total.add(queries, route=route, method=method, status=status)
+    return [
+        histogram_metric("http_request_duration_seconds", "Request latency by route.", latency),
+        requests_total,
+        queries_total,
+    ]
+
+
+register_collector("requests", _collect_requests)
+
+
+# ----------- Middleware -----------
+class InstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        # Connections opened before this module was imported missed the signal.
+        for conn in connections.all(initialized_only=True):
+            _install_query_counter(conn)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, started)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, started)
+
+    def finish(self, request, response, metrics, started):
+        total_ms = (time.perf_counter() - started) * 1000
+        if getattr(settings, "INSTRUMENTATION_SERVER_TIMING", False):
+            response["Server-Timing"] = self.server_timing(metrics, total_ms)
+        match = getattr(request, "resolver_match", None)
+        route = "/" + match.route if match is not None else "<unmatched>"
+        _observe_route(route, request.method, response.status_code, total_ms, metrics.queries)
+        self.log(request, response, route, metrics, total_ms)
+        return response
+
+    @staticmethod
+    def server_timing(metrics, total_ms):
+        parts = [f'db;dur={metrics.ms("db"):.1f};desc="{metrics.queries} queries"']
+        for kind, (elapsed, count) in metrics.timings.items():
+            if kind != "db":
+                parts.append(f'{kind};dur={elapsed:.1f};desc="{count} calls"')
+        parts.append(f"total;dur={total_ms:.1f}")
+        return ", ".join(parts)
+
+    @staticmethod
+    def log(request, response, route, metrics, total_ms):
+        slow = total_ms >= getattr(settings, "INSTRUMENTATION_SLOW_REQUEST_MS", 1000)
+        rate = getattr(settings, "INSTRUMENTATION_SLOW_SAMPLE_RATE" if slow else "INSTRUMENTATION_LOG_SAMPLE_RATE", 0.0)
+        if random.random() >= rate:
+            return
+        line = json.dumps({
+            "method": request.method,
+            "path": request.path,
+            "route": route,
+            "status": response.status_code,
+            "total_ms": round(total_ms, 1),
+            "queries": metrics.queries,
+            **{f"{kind}_ms": round(elapsed, 1) for kind, (elapsed, _) in metrics.timings.items()},
+        })
+        (slow_logger.warning if slow else logger.info)(line)
+
+
+# ----------- /metrics -----------
+def metrics_view(request):
+    """Prometheus text exposition; 404 unless METRICS_ENABLED."""
+    if not getattr(settings, "METRICS_ENABLED", False):
+        raise Http404()
+    token = getattr(settings, "METRICS_TOKEN", "")
+    supplied = request.headers.get("Authorization", "").encode()
+    if token and not hmac.compare_digest(supplied, f"Bearer {token}".encode()):
+        return HttpResponse(status=401)
+    return HttpResponse(render(collect_all()), content_type="text/plain; version=0.0.4; charset=utf-8")
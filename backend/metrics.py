@@ -0,0 +1,135 @@
+"""
+In-process metrics and Prometheus text exposition.
+
+Subsystems either keep their own counters and register a *collector* (a
+callable returning ``Metric`` objects, read at scrape time) or use the
+shared ``LatencyHistogram``. Values are per worker process; scrape each
+worker or aggregate downstream.
+"""
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (in milliseconds) of the latency histogram buckets.
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 20000)
+
+
+# ----------- Latency histograms -----------
+class LatencyHistogram:
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def observe(self, elapsed_ms, error=False):
+        index = bisect.bisect_left(self.buckets, elapsed_ms)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total_ms += elapsed_ms
+            if error:
+                self.errors += 1
+
+    def snapshot(self):
+        with self._lock:
+            cumulative, running = [], 0
+            for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+                running += n
+                cumulative.append((bound, running))
+            return {
+                "count": self.count,
+                "sum_ms": round(self.total_ms, 3),
+                "errors": self.errors,
+                "buckets": cumulative,
+            }
+
+
+# ----------- Exposition -----------
+class Metric:
+    def __init__(self, name, kind, help_text, samples=None):
+        self.name = name
+        self.kind = kind  # counter / gauge / histogram
+        self.help = help_text
+        self.samples = samples or []  # (labels dict, value)
+
+    def add(self, value, **labels):
+        self.samples.append((labels, value))
+        return self
+
+
+def histogram_metric(name, help_text, histograms):
+    """Build a Prometheus histogram (seconds) from ``{labels tuple: LatencyHistogram}``."""
+    metric = Metric(name, "histogram", help_text)
+    for labels, histogram in histograms.items():
+        labels = dict(labels)
+        snap = histogram.snapshot()
+        for bound, count in snap["buckets"]:
+            le = "+Inf" if bound == float("inf") else repr(bound / 1000)
+            metric.samples.append(({**labels, "le": le, "__suffix": "_bucket"}, count))
+        metric.samples.append(({**labels, "__suffix": "_sum"}, snap["sum_ms"] / 1000))
+        metric.samples.append(({**labels, "__suffix": "_count"}, snap["count"]))
+    return metric
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render(metrics):
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for labels, value in metric.samples:
+            labels = dict(labels)
+            suffix = labels.pop("__suffix", "")
+            label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+            lines.append(f"{metric.name}{suffix}{{{label_text}}} {value}" if label_text else f"{metric.name}{suffix} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# ----------- Collector registry -----------
+_collectors = {}
+
+
+def register_collector(name, collect):
+    """``collect()`` returns an iterable of ``Metric``; re-registering replaces it."""
+    _collectors[name] = collect
+
+
+def collect_all():
+    metrics = []
+    for name, collect in list(_collectors.items()):
+        try:
+            metrics.extend(collect())
+        except Exception:
+            logger.exception("Metrics collector %s failed", name)
+    return metrics
+
+
+# ----------- Standalone exporter for worker processes -----------
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = render(collect_all()).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port, host="0.0.0.0"):
+    """Serve ``collect_all()`` on ``port`` from a daemon thread (for management-command workers)."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-exporter", daemon=True).start()
+    return server
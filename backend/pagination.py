@@ -0,0 +1,73 @@
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+from search.index import search
+
+from .serializers import ValuesReader
+
+
+# ----------- Keyset (cursor) pagination for list endpoints -----------
+class SubmissionCursorPagination(CursorPagination):
+    """
+    Keyset pagination: each page is an index range scan from the cursor
+    position, so page 1,000 costs the same as page 1.
+    """
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
+
+
+def wants_pagination(request):
+    # Opt-in so existing clients that expect a bare list keep working.
+    return "cursor" in request.query_params or "page_size" in request.query_params
+
+
+def requested_fields(request):
+    raw = request.query_params.get("fields", "")
+    return [f.strip() for f in raw.split(",") if f.strip()]
+
+
+def prune_columns(queryset, request, ordering):
+    """Only SELECT the columns a ``?fields=`` request will render."""
+    fields = requested_fields(request)
+    if not fields:
+        return queryset
+    concrete = {f.name for f in queryset.model._meta.concrete_fields}
+    columns = {f for f in fields if f in concrete}
+    if not columns:
+        # The serializer falls back to every field; don't defer any of them.
+        return queryset
+    return queryset.only(*columns | ({o.lstrip("-") for o in ordering} & concrete))
+
+
+def list_response(request, queryset, serializer_class, ordering):
+    """
+    Serialize ``queryset`` for a GET list endpoint, honouring ``?fields=``,
+    ``?q=`` (full-text search, best matches first) and, when requested,
+    cursor pagination on ``ordering``. Rows are read
+    with ``.values()`` and shaped by ``ValuesReader`` when the serializer
+    allows it, skipping model instances and per-field serializer calls.
+    """
+    q = request.query_params.get("q", "").strip()
+    if q:
+        queryset = search(queryset, q)
+        ordering = ("-search_rank", *ordering)
+    queryset = queryset.order_by(*ordering)
+    context = {"request": request}
+    reader = ValuesReader(serializer_class, context)
+    if reader.supported:
+        queryset = reader.values(queryset, *(o.lstrip("-") for o in ordering))
+        serialize = reader.to_representation
+    else:
+        queryset = prune_columns(queryset, request, ordering)
+
+        def serialize(rows):
+            return serializer_class(rows, many=True, context=context).data
+
+    if not wants_pagination(request):
+        return Response(serialize(queryset))
+
+    paginator = SubmissionCursorPagination()
+    paginator.ordering = ordering
+    page = paginator.paginate_queryset(queryset, request)
+    return paginator.get_paginated_response(serialize(page))
@@ -0,0 +1,80 @@
+import io
+import re
+
+from rest_framework import renderers
+from rest_framework.parsers import JSONParser
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import instrumentation
+
+try:
+    import orjson
+except ImportError:  # Optional: the Fast* classes fall back to the stdlib.
+    orjson = None
+
+
+class TimedJSONRenderer(renderers.JSONRenderer):
+    """Stock JSONRenderer that reports its render time to the instrumentation."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with instrumentation.timer("render"):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+# ----------- orjson fast path -----------
+# orjson writes datetimes natively in DRF's form (isoformat, "Z" for UTC);
+# Decimals, lazy strings, querysets and the like go through DRF's encoder.
+ORJSON_OPTIONS = (orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS) if orjson else 0
+_drf_default = JSONEncoder().default
+# A run this long may be an integer past 64 bits, which orjson would read as
+# a float; such bodies (rare: phone numbers are 12 digits) go to the stdlib.
+WIDE_DIGITS = re.compile(rb"\d{19}")
+
+
+class FastJSONRenderer(TimedJSONRenderer):
+    """
+    ``JSONRenderer`` on orjson. Output matches the stock compact renderer
+    except for floats: exponents are spelt ``1e16`` rather than ``1e+16``
+    (the same number to any JSON reader), and NaN/Infinity render as
+    ``null`` instead of raising. Data orjson cannot encode, such as integers
+    wider than 64 bits, indented (``; indent=``) requests and installs
+    without orjson use the stdlib path.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b""
+        try:
+            with instrumentation.timer("render"):
+                ret = orjson.dumps(data, default=_drf_default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Same escaping as JSONRenderer, so the output is also valid JavaScript.
+        if b"\xe2\x80\xa8" in ret or b"\xe2\x80\xa9" in ret:
+            ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    """
+    ``JSONParser`` on orjson; non-UTF-8 bodies, bodies that may hold an
+    integer wider than 64 bits and anything orjson rejects go to the stdlib,
+    so every body parses to what the stock parser returns.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get("encoding", "utf-8")
+        if orjson is None or encoding.lower().replace("_", "-") not in ("utf-8", "utf8"):
+            return super().parse(stream, media_type, parser_context)
+        raw = stream.read()
+        if WIDE_DIGITS.search(raw):
+            return super().parse(io.BytesIO(raw), media_type, parser_context)
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            # Let the stdlib produce DRF's error message (or accept what orjson
+            # won't, e.g. NaN when STRICT_JSON is off).
+            pass
+        return super().parse(io.BytesIO(raw), media_type, parser_context)
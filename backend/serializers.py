@@ -0,0 +1,85 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+
+class SparseFieldsMixin:
+    """
+    Lets GET requests ask for a subset of a serializer's fields with
+    ``?fields=id,name,email``. Unknown names are ignored; write requests
+    always get the full field set.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is None or request.method != "GET":
+            return
+        raw = request.query_params.get("fields")
+        if not raw:
+            return
+        wanted = {f.strip() for f in raw.split(",") if f.strip()}
+        if wanted & set(self.fields):
+            for name in set(self.fields) - wanted:
+                self.fields.pop(name)
+
+
+class ValuesReader:
+    """
+    Read-only fast path for a ModelSerializer's list output.
+
+    Builds the same dicts ``serializer_class(rows, many=True).data`` would,
+    straight from ``.values()`` rows: plain columns are copied as loaded and
+    only fields that reformat their value (dates, decimals...) run their
+    ``to_representation``. Serializers with fields that don't map onto a
+    concrete column (methods, dotted sources, m2m) aren't ``supported``;
+    use the serializer for those, and for every write.
+    """
+
+    # Fields whose to_representation is a no-op on the value the DB returns.
+    PASSTHROUGH = (serializers.CharField, serializers.IntegerField, serializers.BooleanField, serializers.FloatField)
+
+    def __init__(self, serializer_class, context=None):
+        serializer = serializer_class(context=context or {})
+        model = serializer.Meta.model
+        self.columns = []
+        self.fields = []  # (output name, column, converter or None)
+        self.supported = True
+        for name, field in serializer.fields.items():
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                self.supported = False
+                return
+            if not model_field.concrete or model_field.many_to_many or isinstance(field, serializers.ModelField):
+                self.supported = False
+                return
+            self.columns.append(model_field.attname)
+            self.fields.append((name, model_field.attname, self._converter(field)))
+
+    def _converter(self, field):
+        if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+            return None  # The column already holds the pk.
+        if isinstance(field, serializers.JSONField) and not field.binary:
+            return None
+        for base in self.PASSTHROUGH:
+            if isinstance(field, base) and type(field).to_representation is base.to_representation:
+                return None
+        if isinstance(field, serializers.DateTimeField) and not hasattr(field, "timezone"):
+            # Look the active timezone up once rather than for every row.
+            field.timezone = field.default_timezone()
+        return field.to_representation
+
+    def values(self, queryset, *extra):
+        """``queryset.values()`` with the columns ``to_representation`` needs, plus ``extra``."""
+        return queryset.values(*dict.fromkeys(self.columns + list(extra)))
+
+    def to_representation(self, rows):
+        fields = self.fields
+        data = []
+        for row in rows:
+            item = {}
+            for name, column, convert in fields:
+                value = row[column]
+                item[name] = value if convert is None or value is None else convert(value)
+            data.append(item)
+        return data
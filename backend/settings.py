@@ -1,4 +1,5 @@
 import os
+import tempfile
 from decouple import config
 import dj_database_url
 from pathlib import Path
@@ -36,6 +37,10 @@ INSTALLED_APPS = [
     'volunteers',
     'payments',
     'contacts',
+    'dashboard',
+    'exports',
+    'outbox',
+    'search',
 ]
 
 # --------------------------------------------------
@@ -43,8 +48,9 @@ INSTALLED_APPS = [
 # --------------------------------------------------
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',  # Must be first
+    'backend.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # For static files
+    'backend.middleware.WhiteNoiseMiddleware',  # For static files (WSGI and ASGI)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -54,10 +60,17 @@ MIDDLEWARE = [
 ]
 
 # --------------------------------------------------
-# URLs & WSGI
+# URLs, WSGI & ASGI
 # --------------------------------------------------
 ROOT_URLCONF = 'backend.urls'
 WSGI_APPLICATION = 'backend.wsgi.application'
+ASGI_APPLICATION = 'backend.asgi.application'
+# ASGI_MODE serves the provider-bound payment endpoints from async views
+# (payments/async_views.py). backend/asgi.py switches it on, and
+# gunicorn.conf.py then runs uvicorn workers. Under ASGI every in-flight
+# request can hold a DB connection, so leave CONN_MAX_AGE at 0 and put a
+# pooler (e.g. pgbouncer) in front of Postgres.
+ASGI_MODE = config('ASGI_MODE', default=False, cast=bool)
 
 # --------------------------------------------------
 # Templates
@@ -85,6 +98,57 @@ DATABASES = {
     'default': dj_database_url.config(default=config('DATABASE_URL'))
 }
 
+# --------------------------------------------------
+# Caches
+# --------------------------------------------------
+# Public GET list endpoints (partners, volunteers, contacts) are served from
+# the "responses" cache until a row of their model changes; "throttle" holds
+# the rate-limit buckets. Both are per-process locmem by default. Point
+# RESPONSE_CACHE_URL / THROTTLE_CACHE_URL at redis://host:6379/1 (needs the
+# redis package), file:///path or db://table_name (run createcachetable) to
+# share them between gunicorn workers. The response cache must be shared
+# once there is more than one worker (gunicorn refuses to start otherwise),
+# and whenever another process writes the cached models.
+def _cache_from_url(url, location):
+    if url.startswith(('redis://', 'rediss://')):
+        return {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': url}
+    if url.startswith('file://'):
+        return {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': url[len('file://'):]}
+    if url.startswith('db://'):
+        return {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': url[len('db://'):]}
+    return {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': location,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+
+RESPONSE_CACHE_URL = config('RESPONSE_CACHE_URL', default='')
+THROTTLE_CACHE_URL = config('THROTTLE_CACHE_URL', default='')
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'responses': _cache_from_url(RESPONSE_CACHE_URL, 'responses'),
+    'throttle': _cache_from_url(THROTTLE_CACHE_URL, 'throttle'),
+}
+RESPONSE_CACHE_ALIAS = 'responses'
+RESPONSE_CACHE_ENABLED = config('RESPONSE_CACHE_ENABLED', default=True, cast=bool)
+RESPONSE_CACHE_SECONDS = config('RESPONSE_CACHE_SECONDS', default=300, cast=int)
+
+# Token buckets for the public write routes (see backend/throttling.py),
+# per client IP and, for STK push, per phone number. "N/period" allows
+# bursts of N and refills at N per period (sec, min, hour, day). On the
+# default locmem cache each gunicorn worker keeps its own buckets, so a
+# client gets up to N per worker; set THROTTLE_CACHE_URL to enforce N.
+THROTTLE_CACHE_ALIAS = 'throttle'
+THROTTLE_ENABLED = config('THROTTLE_ENABLED', default=True, cast=bool)
+THROTTLE_RATES = {
+    'contact_submit': {'ip': config('THROTTLE_CONTACT_RATE', default='5/min')},
+    'volunteer_submit': {'ip': config('THROTTLE_VOLUNTEER_RATE', default='5/min')},
+    'stk_push': {
+        'ip': config('THROTTLE_STK_IP_RATE', default='10/min'),
+        'phone': config('THROTTLE_STK_PHONE_RATE', default='3/min'),
+    },
+}
+
 # --------------------------------------------------
 # Password Validation
 # --------------------------------------------------
@@ -144,6 +208,22 @@ PAYPAL_CALLBACK_URL = config(
     'PAYPAL_CALLBACK_URL',
     default='https://my-backend-1-8oq8.onrender.com/api/payments/paypal/'
 )
+PAYPAL_WEBHOOK_ID = config('PAYPAL_WEBHOOK_ID', default='')
+PAYPAL_BASE_URL = config('PAYPAL_BASE_URL', default='')
+# Webhook signatures are checked locally against PayPal's signing cert.
+# 'local_with_fallback' calls the verify-webhook-signature API only when the
+# local check cannot be made; 'local' never calls it, 'remote' always does.
+PAYPAL_WEBHOOK_VERIFY_MODE = config('PAYPAL_WEBHOOK_VERIFY_MODE', default='local_with_fallback')
+PAYPAL_CERT_CACHE_DIR = config(
+    'PAYPAL_CERT_CACHE_DIR',
+    default=os.path.join(tempfile.gettempdir(), 'paypal-certs')
+)
+PAYPAL_CERT_HOSTS = [
+    'api.paypal.com',
+    'api-m.paypal.com',
+    'api.sandbox.paypal.com',
+    'api-m.sandbox.paypal.com',
+]
 
 # --------------------------------------------------
 # M-Pesa Configuration
@@ -157,6 +237,141 @@ MPESA_CALLBACK_URL = config(
     'MPESA_CALLBACK_URL',
     default='https://my-backend-1-8oq8.onrender.com/api/payments/mpesa/callback/'
 )
+# OAuth tokens are cached until MPESA_TOKEN_REFRESH_MARGIN seconds before
+# expiry and refreshed in the background once inside the proactive window.
+# Set MPESA_TOKEN_CACHE_ALIAS to a shared cache (e.g. 'default' on Redis) so
+# gunicorn workers reuse one token.
+MPESA_TOKEN_REFRESH_MARGIN = config('MPESA_TOKEN_REFRESH_MARGIN', default=60, cast=int)
+MPESA_TOKEN_PROACTIVE_WINDOW = config('MPESA_TOKEN_PROACTIVE_WINDOW', default=300, cast=int)
+MPESA_TOKEN_CACHE_ALIAS = config('MPESA_TOKEN_CACHE_ALIAS', default='') or None
+# With MPESA_STK_ASYNC the STK push view only queues the push and returns 202,
+# as the bulk endpoint always does; the Procfile's stk_worker process
+# (`python manage.py run_stk_dispatcher`) sends them and must be deployed
+# alongside the web process.
+MPESA_STK_ASYNC = config('MPESA_STK_ASYNC', default=False, cast=bool)
+MPESA_DISPATCH_MAX_ATTEMPTS = config('MPESA_DISPATCH_MAX_ATTEMPTS', default=3, cast=int)
+# Jobs a dead dispatcher left running longer than this are requeued (or
+# marked done if their push already went out).
+MPESA_DISPATCH_CLAIM_TIMEOUT = config('MPESA_DISPATCH_CLAIM_TIMEOUT', default=300, cast=int)
+# Queued and bulk pushes are held to this many per second per process (match
+# the Safaricom app's quota; 0 disables). Bulk requests may carry at most
+# MPESA_BULK_MAX_ITEMS phone/amount pairs.
+MPESA_STK_RATE_LIMIT = config('MPESA_STK_RATE_LIMIT', default=5, cast=float)
+MPESA_STK_RATE_BURST = config('MPESA_STK_RATE_BURST', default=5, cast=int)
+MPESA_BULK_MAX_ITEMS = config('MPESA_BULK_MAX_ITEMS', default=10000, cast=int)
+# `python manage.py reconcile_pending_payments` re-checks payments still
+# pending MPESA_RECONCILE_AFTER_SECONDS after creation (lost callbacks) with
+# the STK Push Query API, up to MPESA_RECONCILE_MAX_AGE_HOURS old.
+MPESA_RECONCILE_AFTER_SECONDS = config('MPESA_RECONCILE_AFTER_SECONDS', default=120, cast=int)
+MPESA_RECONCILE_MAX_AGE_HOURS = config('MPESA_RECONCILE_MAX_AGE_HOURS', default=48, cast=int)
+# Number of processed callback/webhook ids remembered in-process before
+# falling back to the ProcessedEvent table.
+PAYMENTS_DEDUP_LRU_SIZE = config('PAYMENTS_DEDUP_LRU_SIZE', default=10000, cast=int)
+# Raw provider payloads live in PaymentPayload, not on the payment rows.
+# `python manage.py archive_payment_payloads` moves those of payments older
+# than PAYMENT_ARCHIVE_AFTER_DAYS into compressed JSONL segments under
+# PAYMENT_ARCHIVE_DIR; archived payloads are still read back for the admin
+# change page and exports. The segments are then the only copy, so the
+# directory must be persistent storage (on Render, a mounted disk; the
+# app's own disk is wiped on every deploy) and has no default: archiving
+# refuses to run until it is set.
+PAYMENT_ARCHIVE_DIR = config('PAYMENT_ARCHIVE_DIR', default='')
+PAYMENT_ARCHIVE_AFTER_DAYS = config('PAYMENT_ARCHIVE_AFTER_DAYS', default=90, cast=int)
+
+# --------------------------------------------------
+# Payment Provider HTTP Clients
+# --------------------------------------------------
+# One keep-alive session per provider. Timeouts are (connect, read) seconds
+# per endpoint; only idempotent calls are retried, with jittered backoff.
+PAYMENT_HTTP_POOL_CONNECTIONS = config('PAYMENT_HTTP_POOL_CONNECTIONS', default=10, cast=int)
+PAYMENT_HTTP_POOL_MAXSIZE = config('PAYMENT_HTTP_POOL_MAXSIZE', default=10, cast=int)
+PAYMENT_HTTP_MAX_RETRIES = config('PAYMENT_HTTP_MAX_RETRIES', default=2, cast=int)
+PAYMENT_HTTP_BACKOFF = config('PAYMENT_HTTP_BACKOFF', default=0.2, cast=float)
+# Concurrent connections per provider for the async client (ASGI mode).
+PAYMENT_HTTP_ASYNC_MAX_CONNECTIONS = config('PAYMENT_HTTP_ASYNC_MAX_CONNECTIONS', default=100, cast=int)
+# Circuit breaker per provider: open when at least MIN_CALLS calls in the last
+# WINDOW seconds failed at FAILURE_RATE or more, refuse calls for OPEN_SECONDS,
+# then let HALF_OPEN_CALLS probes through. The bulkhead caps in-flight calls
+# per provider per worker process; callers past it get a 503 immediately.
+PAYMENT_BREAKER_FAILURE_RATE = config('PAYMENT_BREAKER_FAILURE_RATE', default=0.5, cast=float)
+PAYMENT_BREAKER_MIN_CALLS = config('PAYMENT_BREAKER_MIN_CALLS', default=10, cast=int)
+PAYMENT_BREAKER_WINDOW = config('PAYMENT_BREAKER_WINDOW', default=30, cast=float)
+PAYMENT_BREAKER_OPEN_SECONDS = config('PAYMENT_BREAKER_OPEN_SECONDS', default=30, cast=float)
+PAYMENT_BREAKER_HALF_OPEN_CALLS = config('PAYMENT_BREAKER_HALF_OPEN_CALLS', default=1, cast=int)
+PAYMENT_BULKHEAD_MAX_CONCURRENT = config('PAYMENT_BULKHEAD_MAX_CONCURRENT', default=50, cast=int)
+PAYMENT_HTTP_TIMEOUTS = {
+    'default': (3.05, 15),
+    'mpesa.oauth': (3.05, 15),
+    'mpesa.stkpush': (3.05, 20),
+    'mpesa.stkquery': (3.05, 15),
+    'paypal.oauth': (3.05, 15),
+    'paypal.verify': (3.05, 15),
+}
+
+# --------------------------------------------------
+# Dashboard Counters
+# --------------------------------------------------
+# Counts are maintained by signals; run `python manage.py reconcile_counters`
+# periodically to correct drift from bulk operations.
+DASHBOARD_COUNTS_CACHE_SECONDS = config('DASHBOARD_COUNTS_CACHE_SECONDS', default=30, cast=int)
+DASHBOARD_COUNTS_MAX_AGE = config('DASHBOARD_COUNTS_MAX_AGE', default=10, cast=int)
+
+# --------------------------------------------------
+# Admin
+# --------------------------------------------------
+# Performance mode for the submission and payment changelists: unshown text
+# columns are deferred, and on Postgres an unfiltered table with more than
+# ADMIN_ESTIMATED_COUNT_THRESHOLD rows is counted from the planner's
+# estimate (pg_class.reltuples) instead of COUNT(*).
+ADMIN_PERFORMANCE_MODE = config('ADMIN_PERFORMANCE_MODE', default=True, cast=bool)
+ADMIN_ESTIMATED_COUNT_THRESHOLD = config('ADMIN_ESTIMATED_COUNT_THRESHOLD', default=10000, cast=int)
+
+# --------------------------------------------------
+# Outbox
+# --------------------------------------------------
+# Contact, volunteer and partner submissions record an outbox message in the
+# same transaction; `python manage.py run_outbox_relay` (the Procfile's
+# outbox_worker process) delivers them to the handlers listed per topic
+# (dotted paths taking the OutboxMessage).
+OUTBOX_HANDLERS = {
+    'contacts.contact.created': ['outbox.handlers.log_message'],
+    'volunteers.volunteer.created': ['outbox.handlers.log_message'],
+    'partnerApplications.partners.created': ['outbox.handlers.log_message'],
+}
+OUTBOX_MAX_ATTEMPTS = config('OUTBOX_MAX_ATTEMPTS', default=5, cast=int)
+# Messages claimed longer ago than this by a relay that died are retried.
+OUTBOX_CLAIM_TIMEOUT = config('OUTBOX_CLAIM_TIMEOUT', default=300, cast=int)
+
+# --------------------------------------------------
+# Instrumentation & Metrics
+# --------------------------------------------------
+# INSTRUMENTATION_SERVER_TIMING adds a Server-Timing header (db, http,
+# render, total) to every response. It shows anyone query counts and
+# provider latency, so leave it off outside development.
+# Requests slower than INSTRUMENTATION_SLOW_REQUEST_MS are logged to
+# "backend.requests.slow" (sampled by INSTRUMENTATION_SLOW_SAMPLE_RATE);
+# INSTRUMENTATION_LOG_SAMPLE_RATE logs a share of all requests.
+INSTRUMENTATION_SERVER_TIMING = config('INSTRUMENTATION_SERVER_TIMING', default=False, cast=bool)
+INSTRUMENTATION_SLOW_REQUEST_MS = config('INSTRUMENTATION_SLOW_REQUEST_MS', default=1000, cast=int)
+INSTRUMENTATION_SLOW_SAMPLE_RATE = config('INSTRUMENTATION_SLOW_SAMPLE_RATE', default=1.0, cast=float)
+INSTRUMENTATION_LOG_SAMPLE_RATE = config('INSTRUMENTATION_LOG_SAMPLE_RATE', default=0.0, cast=float)
+# Prometheus text at /metrics; send METRICS_TOKEN as a Bearer token if set.
+METRICS_ENABLED = config('METRICS_ENABLED', default=False, cast=bool)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'plain'},
+    },
+    'loggers': {
+        'backend.requests': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
 
 # --------------------------------------------------
 # Security Headers (Render Production)
@@ -173,11 +388,29 @@ if not DEBUG:
 # --------------------------------------------------
 # REST Framework
 # --------------------------------------------------
+# JSON_FAST_PATH renders and parses JSON with orjson (stdlib fallback when
+# it isn't installed). Parsed bodies match the stock parser; rendered output
+# matches the stock renderer apart from float spelling (1e16 for 1e+16) and
+# NaN/Infinity rendering as null (see backend/renderers.py). Off by default
+# because of those differences; set JSON_FAST_PATH=True once clients are
+# known to cope with them.
+JSON_FAST_PATH = config('JSON_FAST_PATH', default=False, cast=bool)
+
 REST_FRAMEWORK = {
+    # Proxies in front of the app. Render's load balancer is one hop and
+    # appends the connecting address to X-Forwarded-For, so the throttles
+    # key on that last entry; earlier entries are whatever the client sent.
+    # Set to 0 when clients connect directly.
+    'NUM_PROXIES': config('NUM_PROXIES', default=1, cast=int),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'backend.renderers.FastJSONRenderer' if JSON_FAST_PATH else 'backend.renderers.TimedJSONRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'backend.renderers.FastJSONParser' if JSON_FAST_PATH else 'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
 }
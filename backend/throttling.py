@@ -0,0 +1,154 @@
+"""
+Token-bucket throttling for the public write endpoints.
+
+Each route names a *scope* in ``THROTTLE_RATES``; a scope has one bucket
+per client IP and, for payment routes, one per phone number:
+
+    THROTTLE_RATES = {"stk_push": {"ip": "10/min", "phone": "3/min"}}
+
+A rate of ``N/period`` allows bursts of ``N`` and refills at ``N`` per
+period. Buckets live in the ``THROTTLE_CACHE_ALIAS`` cache. That is
+per-process locmem by default, which makes every limit per gunicorn
+worker: with four workers a client can get up to ``4 * N`` through. Point
+``THROTTLE_CACHE_URL`` at Redis or the database to share the buckets.
+``_lock`` only makes the read-update-write atomic between the threads of
+one process, so concurrent workers on a shared cache can let a request or
+two more through than the rate; that is fine for abuse control.
+
+The IP is DRF's ``get_ident``, which trusts only the last ``NUM_PROXIES``
+hops of ``X-Forwarded-For``, so a client cannot pick its own bucket by
+sending the header.
+
+Checks run before the request body is validated, so a rejected request
+costs a cache round trip and no ORM work.
+"""
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+
+from .metrics import Metric, register_collector
+
+KEY_PREFIX = "throttle"
+PERIODS = {"s": 1, "sec": 1, "second": 1, "m": 60, "min": 60, "minute": 60,
+           "h": 3600, "hour": 3600, "d": 86400, "day": 86400}
+
+_lock = threading.Lock()
+_stats = {}  # (scope, kind) -> {"allowed": n, "rejected": n}
+
+
+def get_cache():
+    return caches[getattr(settings, "THROTTLE_CACHE_ALIAS", "default")]
+
+
+def parse_rate(rate):
+    """``"5/min"`` -> ``(5, 60)``: bucket size and the seconds it takes to refill."""
+    count, _, period = rate.partition("/")
+    return int(count), PERIODS[period.strip().lower()]
+
+
+def rates_for(scope):
+    if not getattr(settings, "THROTTLE_ENABLED", True):
+        return {}
+    return getattr(settings, "THROTTLE_RATES", {}).get(scope, {})
+
+
+def phone_key(value):
+    """Last nine digits, so 07..., 2547... and +2547... share a bucket."""
+    digits = re.sub(r"\D", "", str(value or ""))
+    return digits[-9:] if len(digits) >= 9 else None
+
+
+def _count(scope, kind, outcome):
+    with _lock:
+        _stats.setdefault((scope, kind), {"allowed": 0, "rejected": 0})[outcome] += 1
+
+
+# ----------- Buckets -----------
+def take(scope, kind, ident, rate, now=None):
+    """Take a token from ``ident``'s bucket; return 0.0, or the seconds until one is available."""
+    size, period = parse_rate(rate)
+    refill = size / period
+    key = f"{KEY_PREFIX}:{scope}:{kind}:{ident}"
+    now = time.time() if now is None else now
+    cache = get_cache()
+    with _lock:
+        tokens, updated = cache.get(key) or (size, now)
+        tokens = min(size, tokens + max(0.0, now - updated) * refill)
+        if tokens < 1:
+            return (1 - tokens) / refill
+        # Expire once the bucket would be full again anyway.
+        cache.set(key, (tokens - 1, now), period + 1)
+    return 0.0
+
+
+def check(scope, ip, phone=None, now=None):
+    """Run the request through ``scope``'s buckets; return 0.0 if allowed, else the wait in seconds."""
+    for kind, rate in rates_for(scope).items():
+        ident = ip if kind == "ip" else phone_key(phone) if kind == "phone" else None
+        if not ident:
+            continue
+        wait = take(scope, kind, ident, rate, now)
+        if wait:
+            _count(scope, kind, "rejected")
+            return wait
+        _count(scope, kind, "allowed")
+    return 0.0
+
+
+# ----------- DRF throttle -----------
+class WriteThrottle(BaseThrottle):
+    """Throttles unsafe methods by ``scope``'s buckets; reads pass through."""
+
+    scope = None
+
+    def allow_request(self, request, view):
+        if request.method in SAFE_METHODS:
+            return True
+        phone = None
+        if "phone" in rates_for(self.scope) and hasattr(request.data, "get"):
+            phone = request.data.get("phone")
+        self.wait_seconds = check(self.scope, self.get_ident(request), phone)
+        return not self.wait_seconds
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class ContactSubmitThrottle(WriteThrottle):
+    scope = "contact_submit"
+
+
+class VolunteerSubmitThrottle(WriteThrottle):
+    scope = "volunteer_submit"
+
+
+class StkPushThrottle(WriteThrottle):
+    scope = "stk_push"
+
+
+# ----------- Stats -----------
+def stats():
+    with _lock:
+        return {f"{scope}:{kind}": dict(counts) for (scope, kind), counts in _stats.items()}
+
+
+def reset_stats():
+    with _lock:
+        _stats.clear()
+
+
+def _collect():
+    metric = Metric("http_throttle_requests_total", "counter", "Write requests checked by the throttle, by outcome.")
+    with _lock:
+        for (scope, kind), counts in sorted(_stats.items()):
+            for outcome, value in counts.items():
+                metric.add(value, scope=scope, bucket=kind, outcome=outcome)
+    return [metric]
+
+
+register_collector("throttle", _collect)
@@ -1,9 +1,8 @@
 from django.contrib import admin
 from django.urls import path, include
 from django.http import JsonResponse
-from partnerApplications.models import Partners
-from volunteers.models import Volunteer
-from contacts.models import Contact  # ✅ make sure this matches your actual model name
+from dashboard.views import dashboard_counts
+from backend.instrumentation import metrics_view
 
 
 # Home route
@@ -20,16 +19,6 @@ def home(request):
     })
 
 
-# ✅ Fixed dashboard counts
-def dashboard_counts(request):
-    data = {
-        "partners": Partners.objects.count(),
-        "volunteers": Volunteer.objects.count(),
-        "contacts": Contact.objects.count(),  # ✅ change this to your contact model name
-    }
-    return JsonResponse(data)
-
-
 urlpatterns = [
     path('', home),
     path('admin/', admin.site.urls),
@@ -39,7 +28,11 @@ urlpatterns = [
     path('api/partners/', include('partnerApplications.urls')),
     path('api/volunteers/', include('volunteers.urls')),
     path('api/contacts/', include('contacts.urls')),
+    path('api/exports/', include('exports.urls')),
 
     # ✅ Dashboard counts endpoint
     path('api/dashboard-counts/', dashboard_counts),
+
+    # Prometheus scrape endpoint (404 unless METRICS_ENABLED)
+    path('metrics', metrics_view),
 ]
@@ -0,0 +1,235 @@
+"""
+Load test for the public API.
+
+    python -m benchmarks.api_load --concurrency 16 --requests 500 -o run.json
+    python -m benchmarks.compare base.json run.json
+
+Boots the Django app on a local threaded WSGI server against a throwaway
+database (SQLite on disk by default, or whatever DATABASE_URL points at),
+starts fake Safaricom and PayPal servers, and drives every route with
+``--concurrency`` client threads. For each route it reports p50/p95/p99
+latency, throughput, error count and mean SQL queries per request, as one
+JSON document that ``benchmarks.compare`` can diff between commits.
+"""
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from benchmarks.common import BASE_DIR, benchmark_database, emit, setup_django, summarize
+
+
+class _ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def counting_app(app):
+    """Wrap a WSGI app so each response carries its SQL query count."""
+    from django.db import connection
+
+    def wrapped(environ, start_response):
+        count = [0]
+
+        def wrapper(execute, sql, params, many, context):
+            count[0] += 1
+            return execute(sql, params, many, context)
+
+        def start(status, headers, exc_info=None):
+            return start_response(status, headers + [("X-Query-Count", str(count[0]))], exc_info)
+
+        with connection.execute_wrapper(wrapper):
+            return app(environ, start)
+    return wrapped
+
+
+# ----------- Route scenarios -----------
+class Scenarios:
+    """Each scenario builds one request; counters keep payloads unique."""
+
+    def __init__(self, seed_rows):
+        self.seq = itertools.count(1)
+        self.seed_rows = seed_rows
+
+    def contacts_list(self):
+        return "GET", "/api/contacts/?page_size=50", None
+
+    def contacts_create(self):
+        n = next(self.seq)
+        return "POST", "/api/contacts/", {"name": f"Load {n}", "email": f"load{n}@example.com", "message": "Hello"}
+
+    def volunteers_list(self):
+        return "GET", "/api/volunteers/?page_size=50", None
+
+    def volunteers_create(self):
+        n = next(self.seq)
+        return "POST", "/api/volunteers/", {
+            "full_name": f"Load {n}", "email": f"vol{n}@example.com", "phone": "0700000000", "skills": "Logistics",
+        }
+
+    def partners_list(self):
+        return "GET", "/api/partners/?page_size=50", None
+
+    def dashboard_counts(self):
+        return "GET", "/api/dashboard-counts/", None
+
+    def mpesa_stkpush(self):
+        return "POST", "/api/payments/mpesa/stkpush/", {"phone": "254700000000", "amount": "10.00"}
+
+    def mpesa_callback(self):
+        # Each callback targets a different seeded payment.
+        n = next(self.seq) % self.seed_rows
+        return "POST", "/api/payments/mpesa/callback/", {"Body": {"stkCallback": {
+            "MerchantRequestID": f"seed-{n}", "CheckoutRequestID": f"ws_SEED_{n:08d}", "ResultCode": 0,
+        }}}
+
+    def mpesa_status(self):
+        return "GET", f"/api/payments/mpesa/{1 + next(self.seq) % self.seed_rows}/status/", None
+
+    def paypal_webhook(self):
+        n = next(self.seq)
+        return "POST", "/api/payments/paypal/webhook/", {
+            "id": f"WH-{n}", "event_type": "PAYMENT.CAPTURE.COMPLETED", "resource": {"id": f"CAPTURE-{n}"},
+        }
+
+
+ROUTES = (
+    "contacts_list", "contacts_create", "volunteers_list", "volunteers_create", "partners_list",
+    "dashboard_counts", "mpesa_stkpush", "mpesa_callback", "mpesa_status", "paypal_webhook",
+)
+
+
+def seed(rows):
+    from contacts.models import Contact
+    from partnerApplications.models import Partners
+    from payments.models import MpesaPayment
+    from volunteers.models import Volunteer
+
+    Contact.objects.bulk_create([Contact(name=f"P{i}", email=f"p{i}@example.com", message="hi") for i in range(rows)])
+    Volunteer.objects.bulk_create([
+        Volunteer(full_name=f"V{i}", email=f"v{i}@example.com", phone="0700", skills="x") for i in range(rows)
+    ])
+    Partners.objects.bulk_create([
+        Partners(organization_name=f"O{i}", contact_person="J", phone="0700", email=f"o{i}@example.com")
+        for i in range(rows)
+    ])
+    MpesaPayment.objects.bulk_create([
+        MpesaPayment(phone="254700000000", amount=10, checkout_request_id=f"ws_SEED_{i:08d}",
+                     merchant_request_id=f"seed-{i}")
+        for i in range(rows)
+    ])
+
+
+def run_route(session, base_url, scenarios, name, total, concurrency):
+    build = getattr(scenarios, name)
+
+    def one(_):
+        method, path, body = build()
+        started = time.perf_counter()
+        try:
+            res = session.request(method, base_url + path, json=body, timeout=60)
+            elapsed = (time.perf_counter() - started) * 1000
+            return elapsed, res.status_code < 400, int(res.headers.get("X-Query-Count", 0))
+        except Exception:
+            return (time.perf_counter() - started) * 1000, False, 0
+
+    wall = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(total)))
+    wall = time.perf_counter() - wall
+
+    samples = [r[0] for r in results]
+    return {
+        "requests": total,
+        "errors": sum(1 for r in results if not r[1]),
+        "throughput_rps": round(total / wall, 1),
+        "queries_mean": round(sum(r[2] for r in results) / total, 2),
+        **summarize(samples),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per route.")
+    parser.add_argument("--routes", default=",".join(ROUTES))
+    parser.add_argument("--seed-rows", type=int, default=1000)
+    parser.add_argument("--provider-latency", type=float, default=0.05, help="Seconds the fake providers sleep.")
+    parser.add_argument("--output", "-o", help="Write the JSON report here as well as stdout.")
+    args = parser.parse_args()
+
+    os.environ.setdefault("MPESA_SHORTCODE", "174379")
+    os.environ.setdefault("MPESA_PASSKEY", "benchmark")
+    os.environ.setdefault("PAYPAL_WEBHOOK_VERIFY_MODE", "remote")
+    setup_django()
+
+    import requests
+    from django.conf import settings
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.db import connection
+    from payments.testing import FakeDarajaServer, FakePayPalServer
+
+    tmp = tempfile.mkdtemp(prefix="api-load-")
+    with FakeDarajaServer(delay=args.provider_latency) as daraja, \
+            FakePayPalServer(delay=args.provider_latency) as paypal, \
+            benchmark_database(sqlite_file=os.path.join(tmp, "load.sqlite3")):
+        settings.MPESA_BASE_URL = daraja.base_url
+        settings.PAYPAL_BASE_URL = paypal.base_url
+        settings.SECURE_SSL_REDIRECT = False
+        settings.ALLOWED_HOSTS = ["*"]
+        settings.THROTTLE_ENABLED = False  # one client IP sends every request
+        seed(args.seed_rows)
+
+        httpd = make_server("127.0.0.1", 0, counting_app(WSGIHandler()),
+                            server_class=_ThreadingWSGIServer, handler_class=_QuietHandler)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{httpd.server_address[1]}"
+
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency)
+        session.mount("http://", adapter)
+        scenarios = Scenarios(args.seed_rows)
+        report = {
+            "meta": {
+                "commit": git_commit(),
+                "vendor": connection.vendor,
+                "concurrency": args.concurrency,
+                "requests_per_route": args.requests,
+                "seed_rows": args.seed_rows,
+                "provider_latency_s": args.provider_latency,
+                "python": sys.version.split()[0],
+            },
+            "routes": {},
+        }
+        for name in args.routes.split(","):
+            report["routes"][name] = run_route(session, base_url, scenarios, name, args.requests, args.concurrency)
+            emit({"route": name, **report["routes"][name]}, stream=sys.stderr)
+        httpd.shutdown()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
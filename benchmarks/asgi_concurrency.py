@@ -0,0 +1,130 @@
+"""
+One web worker under load from slow providers: WSGI vs ASGI.
+
+    python -m benchmarks.asgi_concurrency --concurrency 200 --requests 600
+
+Starts the project under gunicorn twice against a migrated database --
+once as the WSGI app on a single sync worker, once as the ASGI app on a
+single uvicorn worker -- with a fake Daraja server that sleeps
+``--provider-latency`` seconds per call, then fires ``--requests`` STK
+pushes with ``--concurrency`` in flight. Prints one JSON line per mode with
+throughput, latency percentiles and errors.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import BASE_DIR, emit, summarize
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, proc, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with {proc.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server did not listen on {port}")
+
+
+async def drive(base_url, total, concurrency):
+    import httpx
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        async def one():
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    res = await client.post("/api/payments/mpesa/stkpush/",
+                                            json={"phone": "254700000000", "amount": "10.00"})
+                    error = None if res.status_code == 200 else f"{res.status_code} {res.text[:200]}"
+                except httpx.HTTPError as exc:
+                    error = repr(exc)
+                return (time.perf_counter() - started) * 1000, error
+
+        wall = time.perf_counter()
+        results = await asyncio.gather(*[one() for _ in range(total)])
+        wall = time.perf_counter() - wall
+    return wall, results
+
+
+def run_mode(mode, env, args):
+    port = free_port()
+    cmd = [sys.executable, "-m", "gunicorn", "--workers", "1", "--bind", f"127.0.0.1:{port}",
+           "--timeout", "120", "--log-level", "warning"]
+    env = dict(env, ASGI_MODE="True" if mode == "asgi" else "False")
+    proc = subprocess.Popen(cmd, cwd=BASE_DIR, env=env)
+    try:
+        wait_for_port(port, proc)
+        wall, results = asyncio.run(drive(f"http://127.0.0.1:{port}", args.requests, args.concurrency))
+    finally:
+        proc.terminate()
+        proc.wait(10)
+    return {
+        "mode": mode,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "provider_latency_s": args.provider_latency,
+        "errors": sum(1 for _, error in results if error),
+        "first_error": next((error for _, error in results if error), None),
+        "throughput_rps": round(args.requests / wall, 1),
+        **summarize([elapsed for elapsed, _ in results]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=600)
+    parser.add_argument("--provider-latency", type=float, default=0.5)
+    parser.add_argument("--modes", default="wsgi,asgi")
+    parser.add_argument("--database-url", help="Migrated in place; defaults to a fresh SQLite file.")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(BASE_DIR))
+    from payments.testing import FakeDarajaServer
+
+    database_url = args.database_url
+    if not database_url:
+        # WAL plus a busy timeout so concurrent request threads queue for
+        # SQLite's single writer instead of failing with "database is locked".
+        path = os.path.join(tempfile.mkdtemp(prefix="asgi-bench-"), "bench.sqlite3")
+        database_url = (f"sqlite:///{path}?timeout=30&transaction_mode=IMMEDIATE"
+                        "&init_command=PRAGMA%20journal_mode%3DWAL%3BPRAGMA%20synchronous%3DNORMAL")
+    env = dict(
+        os.environ,
+        DATABASE_URL=database_url,
+        DEBUG="True",
+        INSTRUMENTATION_SLOW_SAMPLE_RATE="0",
+        MPESA_SHORTCODE="174379",
+        MPESA_PASSKEY="benchmark",
+        MPESA_CONSUMER_KEY="key",
+        MPESA_CONSUMER_SECRET="secret",
+        THROTTLE_ENABLED="False",
+    )
+    subprocess.run([sys.executable, "manage.py", "migrate", "-v", "0"], cwd=BASE_DIR, env=env, check=True)
+
+    with FakeDarajaServer(delay=args.provider_latency) as daraja:
+        env["MPESA_BASE_URL"] = daraja.base_url
+        for mode in args.modes.split(","):
+            emit(run_mode(mode, env, args))
+
+
+if __name__ == "__main__":
+    main()
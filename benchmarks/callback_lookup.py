@@ -0,0 +1,86 @@
+"""
+M-Pesa callback reconciliation latency as the payments table grows.
+
+    python -m benchmarks.callback_lookup --sizes 10000,100000,1000000
+
+Seeds ``MpesaPayment`` up to each size and replays callbacks for random
+existing rows (half matched by CheckoutRequestID, half by
+MerchantRequestID only) through MpesaCallbackView. With the indexes from
+payments/migrations/0003 the per-callback latency should stay flat.
+"""
+import argparse
+import random
+
+from benchmarks.common import benchmark_database, emit, setup_django, summarize, timed
+
+BATCH = 5000
+
+
+def seed(target, start):
+    from payments.models import MpesaPayment
+
+    for offset in range(start, target, BATCH):
+        MpesaPayment.objects.bulk_create([
+            MpesaPayment(
+                phone="2547%08d" % (i % 10 ** 8),
+                amount=100,
+                checkout_request_id=f"ws_CO_{i:012d}",
+                merchant_request_id=f"merchant-{i}",
+            )
+            for i in range(offset, min(offset + BATCH, target))
+        ])
+
+
+def callback_body(i, by_merchant):
+    return {
+        "Body": {
+            "stkCallback": {
+                "MerchantRequestID": f"merchant-{i}",
+                "CheckoutRequestID": None if by_merchant else f"ws_CO_{i:012d}",
+                "ResultCode": 0,
+                "ResultDesc": "The service request is processed successfully.",
+            }
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--callbacks", type=int, default=500)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.test import APIRequestFactory
+    from payments.views import MpesaCallbackView
+
+    factory = APIRequestFactory()
+    view = MpesaCallbackView.as_view()
+
+    with benchmark_database():
+        seeded = 0
+        for size in sorted(int(s) for s in args.sizes.split(",")):
+            seed(size, seeded)
+            seeded = size
+            samples, queries = [], 0
+            for n in range(args.callbacks):
+                i = random.randrange(size)
+                request = factory.post("/api/payments/mpesa/callback/", callback_body(i, n % 2), format="json")
+                with CaptureQueriesContext(connection) as ctx:
+                    elapsed, response = timed(view, request)
+                assert response.status_code == 200, response.data
+                samples.append(elapsed)
+                queries += len(ctx.captured_queries)
+            emit({
+                "benchmark": "callback_lookup",
+                "vendor": connection.vendor,
+                "rows": size,
+                "queries_per_callback": round(queries / args.callbacks, 2),
+                **summarize(samples),
+            })
+
+
+if __name__ == "__main__":
+    main()
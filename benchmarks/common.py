@@ -0,0 +1,78 @@
+"""
+Shared plumbing for the benchmark scripts in this directory.
+
+Each script boots Django against a throwaway test database (created from
+DATABASE_URL, or an in-memory SQLite database when it is unset), seeds it,
+and prints one JSON object per measurement so runs can be diffed between
+commits.
+"""
+import json
+import math
+import os
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django():
+    if str(BASE_DIR) not in sys.path:
+        sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+    os.environ.setdefault("DATABASE_URL", "sqlite://:memory:")
+    os.environ.setdefault("DEBUG", "True")
+
+    import django
+    django.setup()
+
+
+@contextmanager
+def benchmark_database(sqlite_file=None):
+    """
+    Create (and afterwards drop) a migrated test database. ``sqlite_file``
+    puts a SQLite test database on disk instead of in memory, which
+    multi-threaded servers need.
+    """
+    from django.db import connection
+
+    old_name = connection.settings_dict["NAME"]
+    if sqlite_file and connection.vendor == "sqlite":
+        connection.settings_dict.setdefault("TEST", {})["NAME"] = sqlite_file
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def percentile(sorted_samples, pct):
+    if not sorted_samples:
+        return 0.0
+    rank = max(0, math.ceil(pct / 100 * len(sorted_samples)) - 1)
+    return sorted_samples[rank]
+
+
+def summarize(samples_ms):
+    ordered = sorted(samples_ms)
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered), 3) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 50), 3),
+        "p95_ms": round(percentile(ordered, 95), 3),
+        "p99_ms": round(percentile(ordered, 99), 3),
+        "max_ms": round(ordered[-1], 3) if ordered else 0.0,
+    }
+
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return (time.perf_counter() - started) * 1000, result
+
+
+def emit(record, stream=None):
+    stream = stream or sys.stdout
+    stream.write(json.dumps(record, default=str) + "\n")
+    stream.flush()
@@ -0,0 +1,52 @@
+"""
+Diff two ``benchmarks.api_load`` reports.
+
+    python -m benchmarks.compare base.json head.json [--threshold 10]
+
+Prints the per-route change in p50/p95/p99, throughput and queries, and
+exits 1 when any p95 regressed by more than ``--threshold`` percent.
+"""
+import argparse
+import json
+import sys
+
+METRICS = ("p50_ms", "p95_ms", "p99_ms", "throughput_rps", "queries_mean", "errors")
+
+
+def pct(old, new):
+    if not old:
+        return 0.0
+    return (new - old) / old * 100
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed p95 regression in percent.")
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+
+    print(f"base {base['meta'].get('commit')}  ->  head {head['meta'].get('commit')}")
+    regressed = []
+    for route, new in head["routes"].items():
+        old = base["routes"].get(route)
+        if old is None:
+            print(f"{route:20s} (new route)")
+            continue
+        cells = [f"{m}={old[m]}->{new[m]} ({pct(old[m], new[m]):+.0f}%)" for m in METRICS]
+        print(f"{route:20s} " + "  ".join(cells))
+        if pct(old["p95_ms"], new["p95_ms"]) > args.threshold:
+            regressed.append(route)
+
+    if regressed:
+        print(f"p95 regressed beyond {args.threshold}% on: {', '.join(regressed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
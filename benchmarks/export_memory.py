@@ -0,0 +1,81 @@
+"""
+Peak RSS of the streaming export on a large payments table.
+
+    python -m benchmarks.export_memory --rows 500000 --max-rss-growth-mb 64
+
+Seeds ``--rows`` MpesaPayment rows (with provider JSON), streams the
+export to /dev/null through the same code path as
+``manage.py export_data`` and reports how far peak RSS grew while
+exporting. Exits non-zero when growth exceeds ``--max-rss-growth-mb``,
+so it can gate CI on a machine with enough disk for the fixture.
+"""
+import argparse
+import resource
+import sys
+import time
+
+from benchmarks.common import benchmark_database, emit, setup_django
+
+BATCH = 5000
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS.
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def seed(rows):
+    from payments.models import MpesaPayment
+    from payments.payloads import save_payloads
+
+    payload = {"Body": {"stkCallback": {"ResultCode": 0, "ResultDesc": "ok " * 40}}}
+    for start in range(0, rows, BATCH):
+        save_payloads(MpesaPayment.objects.bulk_create([
+            MpesaPayment(phone="2547%08d" % i, amount=100, status="completed",
+                         checkout_request_id=f"ws_CO_{i:012d}", mpesa_response=payload)
+            for i in range(start, min(start + BATCH, rows))
+        ]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--format", default="csv")
+    parser.add_argument("--max-rss-growth-mb", type=float, default=64)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from exports.streaming import encode, export_rows
+
+    with benchmark_database():
+        seed(args.rows)
+        baseline = peak_rss_mb()
+        started = time.perf_counter()
+        columns, rows = export_rows("mpesa", include_payload=True)
+        stream, _ = encode(args.format, columns, rows)
+        written = 0
+        with open("/dev/null", "w") as sink:
+            for line in stream:
+                written += len(line)
+                sink.write(line)
+        elapsed = time.perf_counter() - started
+        growth = peak_rss_mb() - baseline
+        emit({
+            "benchmark": "export_memory",
+            "vendor": connection.vendor,
+            "rows": args.rows,
+            "format": args.format,
+            "seconds": round(elapsed, 2),
+            "rows_per_sec": round(args.rows / elapsed),
+            "bytes": written,
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "rss_growth_mb": round(growth, 1),
+        })
+    if growth > args.max_rss_growth_mb:
+        sys.exit(f"RSS grew {growth:.1f} MiB during export (limit {args.max_rss_growth_mb} MiB)")
+
+
+if __name__ == "__main__":
+    main()
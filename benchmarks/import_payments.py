@@ -0,0 +1,81 @@
+"""
+Statement import: one ``create`` per row vs ``import_payments``.
+
+    python -m benchmarks.import_payments --rows 200000 --workers 4
+
+Writes a Daraja-style CSV of ``--rows`` payments, times the old ad-hoc
+script (``MpesaPayment.objects.create`` per parsed row) on the first
+``--baseline-rows`` of it, then times ``StatementImport`` over the whole
+file with parsing in this process and in ``--workers`` processes, and
+re-runs the import over the now-existing rows to time the update path.
+"""
+import argparse
+import csv
+import os
+import tempfile
+
+from benchmarks.common import benchmark_database, emit, setup_django, timed
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["CheckoutRequestID", "MerchantRequestID", "ResultCode", "Amount",
+                         "MpesaReceiptNumber", "TransactionDate", "PhoneNumber"])
+        for i in range(rows):
+            writer.writerow([f"ws_CO_{i}", f"m-{i}", i % 5 and "0" or "1032", 10 + i % 990,
+                             f"RK{i:08d}", f"202601{1 + i % 28:02d}{i % 24:02d}0000", f"2547{i % 100000000:08d}"])
+
+
+def per_row(path, limit):
+    from django.conf import settings
+    from payments.models import MpesaPayment
+    from payments.statements import parse_chunk, resolve_columns
+
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        columns = resolve_columns("mpesa", reader.fieldnames)
+        for number, row in enumerate(reader, start=1):
+            if number > limit:
+                break
+            records, _ = parse_chunk("mpesa", columns, [row], number, settings.TIME_ZONE)
+            for record in records:
+                payload = record.pop("payload")
+                MpesaPayment.objects.create(mpesa_response=payload, **record)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--baseline-rows", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from payments.importing import StatementImport
+    from payments.models import MpesaPayment
+
+    with tempfile.TemporaryDirectory() as tmp, benchmark_database():
+        path = os.path.join(tmp, "statement.csv")
+        write_csv(path, args.rows)
+
+        baseline = min(args.baseline_rows, args.rows)
+        elapsed, _ = timed(per_row, path, baseline)
+        emit({"benchmark": "import_payments", "vendor": connection.vendor, "path": "create_per_row",
+              "rows": baseline, "elapsed_ms": round(elapsed, 3), "rows_per_sec": round(baseline / (elapsed / 1000))})
+        MpesaPayment.objects.all().delete()
+
+        for label, workers in (("insert_inline", 0), ("insert_pool", args.workers), ("update_pool", args.workers)):
+            if label == "insert_pool":
+                MpesaPayment.objects.all().delete()
+            job = StatementImport(path, batch_size=args.batch_size, workers=workers)
+            elapsed, totals = timed(job.run)
+            emit({"benchmark": "import_payments", "vendor": connection.vendor, "path": label, "workers": workers,
+                  "rows": args.rows, **totals, "elapsed_ms": round(elapsed, 3),
+                  "rows_per_sec": round(args.rows / (elapsed / 1000))})
+
+
+if __name__ == "__main__":
+    main()
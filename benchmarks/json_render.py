@@ -0,0 +1,93 @@
+"""
+JSON render/parse cost for large list payloads: stock DRF vs orjson.
+
+    python -m benchmarks.json_render --rows 10000 --repeat 20
+
+Builds ``--rows`` unsaved ``MpesaPayment`` rows carrying a Daraja-sized
+``mpesa_response`` blob and times, per renderer/parser pair, rendering
+the serializer output, rendering the same rows as raw ``values()`` dicts
+(bare Decimals and datetimes) and parsing the rendered body back. No
+database is needed.
+"""
+import argparse
+import datetime
+import io
+from decimal import Decimal
+
+from benchmarks.common import emit, setup_django, summarize, timed
+
+
+def build_rows(n):
+    from payments.models import MpesaPayment
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    rows = []
+    for i in range(n):
+        checkout_id = f"ws_CO_{i:012d}"
+        rows.append(MpesaPayment(
+            id=i + 1,
+            phone="2547%08d" % i,
+            amount=Decimal("1234.50"),
+            checkout_request_id=checkout_id,
+            merchant_request_id=f"merchant-{i}",
+            status="completed",
+            created_at=now - datetime.timedelta(seconds=i),
+            updated_at=now,
+            mpesa_response={"Body": {"stkCallback": {
+                "MerchantRequestID": f"merchant-{i}",
+                "CheckoutRequestID": checkout_id,
+                "ResultCode": 0,
+                "ResultDesc": "The service request is processed successfully.",
+                "CallbackMetadata": {"Item": [
+                    {"Name": "Amount", "Value": 1234.5},
+                    {"Name": "MpesaReceiptNumber", "Value": f"NLJ7RT{i:06d}"},
+                    {"Name": "TransactionDate", "Value": 20240101120000},
+                    {"Name": "PhoneNumber", "Value": 254700000000 + i},
+                ]},
+            }}},
+        ))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.forms.models import model_to_dict
+    from rest_framework.parsers import JSONParser
+    from backend.renderers import FastJSONParser, FastJSONRenderer, TimedJSONRenderer, orjson
+    from payments.serializers import MpesaTransactionSerializer
+
+    rows = build_rows(args.rows)
+    serialized = MpesaTransactionSerializer(rows, many=True).data
+    raw = [dict(model_to_dict(row), created_at=row.created_at, updated_at=row.updated_at,
+                mpesa_response=row.mpesa_response) for row in rows]
+
+    pairs = [("stdlib", TimedJSONRenderer(), JSONParser())]
+    if orjson is not None:
+        pairs.append(("orjson", FastJSONRenderer(), FastJSONParser()))
+    else:
+        emit({"benchmark": "json_render", "warning": "orjson is not installed; only the stdlib path was timed"})
+
+    for name, renderer, json_parser in pairs:
+        for payload_name, payload in (("serializer", serialized), ("values", raw)):
+            samples = []
+            for _ in range(args.repeat):
+                elapsed, body = timed(renderer.render, payload)
+                samples.append(elapsed)
+            emit({"benchmark": "json_render", "impl": name, "op": f"render_{payload_name}",
+                  "rows": args.rows, "bytes": len(body), **summarize(samples)})
+
+        samples = []
+        for _ in range(args.repeat):
+            elapsed, _ = timed(json_parser.parse, io.BytesIO(body), "application/json", {})
+            samples.append(elapsed)
+        emit({"benchmark": "json_render", "impl": name, "op": "parse", "rows": args.rows,
+              "bytes": len(body), **summarize(samples)})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Per-page latency of the cursor-paginated list endpoints.
+
+    python -m benchmarks.list_pagination --rows 100000 --page-size 50
+
+Seeds ``--rows`` contacts, volunteers and partners, then walks each list
+endpoint with ``?page_size=`` and reports latency at increasing page
+depths. With keyset pagination page N should cost about the same as
+page 1; ``--full-list`` also times the old unpaginated GET for contrast.
+"""
+import argparse
+from datetime import timedelta
+
+from benchmarks.common import benchmark_database, emit, setup_django, summarize, timed
+
+BATCH = 5000
+ROUTES = ("/api/contacts/", "/api/volunteers/", "/api/partners/")
+
+
+def seed(rows, start=0):
+    from django.utils import timezone
+    from contacts.models import Contact
+    from partnerApplications.models import Partners
+    from volunteers.models import Volunteer
+
+    now = timezone.now()
+    for start in range(start, rows, BATCH):
+        stop = min(start + BATCH, rows)
+        Contact.objects.bulk_create([
+            Contact(name=f"Person {i}", email=f"p{i}@example.com", message="Hello " * 20)
+            for i in range(start, stop)
+        ])
+        Volunteer.objects.bulk_create([
+            Volunteer(full_name=f"Volunteer {i}", email=f"v{i}@example.com", phone="0700000000",
+                      skills="First aid, logistics", date_applied=now - timedelta(minutes=i))
+            for i in range(start, stop)
+        ])
+        Partners.objects.bulk_create([
+            Partners(organization_name=f"Org {i}", contact_person="Jane", phone="0700000000",
+                     email=f"o{i}@example.com", message="Partnership " * 10)
+            for i in range(start, stop)
+        ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--depths", default="1,10,100,1000")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--full-list", action="store_true")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from django.test import Client
+
+    client = Client()
+    depths = sorted(int(d) for d in args.depths.split(","))
+
+    with benchmark_database():
+        seed(args.rows)
+        for route in ROUTES:
+            url, page = f"{route}?page_size={args.page_size}", 1
+            for depth in depths:
+                while page < depth and url:
+                    url = client.get(url, secure=True).json()["next"]
+                    page += 1
+                if not url:
+                    break
+                samples = []
+                for _ in range(args.repeat):
+                    elapsed, response = timed(client.get, url, secure=True)
+                    assert response.status_code == 200
+                    samples.append(elapsed)
+                emit({"benchmark": "list_pagination", "vendor": connection.vendor, "route": route,
+                      "rows": args.rows, "page": depth, "page_size": args.page_size, **summarize(samples)})
+            if args.full_list:
+                elapsed, response = timed(client.get, route, secure=True)
+                emit({"benchmark": "list_full", "vendor": connection.vendor, "route": route,
+                      "rows": args.rows, "bytes": len(response.content), **summarize([elapsed])})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Full-list serialization cost: ModelSerializer vs the ``.values()`` read path.
+
+    python -m benchmarks.list_serialization --sizes 10000,100000
+
+Seeds contacts, volunteers and partners up to each size and times turning
+the whole ordered table into response data both ways -- the
+``ModelSerializer(many=True)`` path the list endpoints used to take and
+``backend.serializers.ValuesReader`` -- checking the outputs are equal.
+Query time is included; JSON rendering is not.
+"""
+import argparse
+
+from benchmarks.common import benchmark_database, emit, setup_django, summarize, timed
+from benchmarks.list_pagination import seed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="10000,100000")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from backend.serializers import ValuesReader
+    from contacts.models import Contact
+    from contacts.serializers import ContactSerializer
+    from partnerApplications.models import Partners
+    from partnerApplications.serializers import PartnersSerializer
+    from volunteers.models import Volunteer
+    from volunteers.serializers import VolunteerSerializer
+
+    endpoints = (
+        (Contact, ContactSerializer, ("-id",)),
+        (Volunteer, VolunteerSerializer, ("-date_applied", "-id")),
+        (Partners, PartnersSerializer, ("-date_applied", "-id")),
+    )
+
+    with benchmark_database():
+        seeded = 0
+        for size in sorted(int(s) for s in args.sizes.split(",")):
+            seed(size, seeded)
+            seeded = size
+            for model, serializer_class, ordering in endpoints:
+                queryset = model.objects.order_by(*ordering)
+                reader = ValuesReader(serializer_class)
+
+                def model_serializer():
+                    return serializer_class(queryset.all(), many=True).data
+
+                def values_reader():
+                    return reader.to_representation(reader.values(queryset.all()))
+
+                results = {}
+                for name, fn in (("model_serializer", model_serializer), ("values_reader", values_reader)):
+                    samples = []
+                    for _ in range(args.repeat):
+                        elapsed, data = timed(fn)
+                        samples.append(elapsed)
+                    results[name] = (summarize(samples), data)
+                assert [dict(r) for r in results["model_serializer"][1]] == results["values_reader"][1]
+
+                before, after = results["model_serializer"][0], results["values_reader"][0]
+                for name, (stats, _) in results.items():
+                    emit({"benchmark": "list_serialization", "vendor": connection.vendor,
+                          "model": model._meta.label, "rows": size, "path": name, **stats})
+                emit({"benchmark": "list_serialization", "model": model._meta.label, "rows": size,
+                      "speedup_p50": round(before["p50_ms"] / after["p50_ms"], 2) if after["p50_ms"] else None})
+
+
+if __name__ == "__main__":
+    main()
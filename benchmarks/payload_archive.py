@@ -0,0 +1,147 @@
+"""
+Payment payloads inline vs in their own table, and archived to segments.
+
+    python -m benchmarks.payload_archive --rows 100000
+
+Seeds ``--rows`` M-Pesa payments with callback-sized payloads, then builds
+``bench_inline_mpesa``: the same table and rows with the payload back in
+a column, as it was before. Reports both tables' on-disk size (``dbstat`` on
+SQLite, ``pg_total_relation_size`` on Postgres) and times what an admin
+list page and a scan fetch from each, both as plain SQL: the newest 100
+rows by id, and every completed row. Finally archives the payloads of the older half and
+reports the segment bytes against what the payload table shed.
+"""
+import argparse
+import datetime
+import os
+import tempfile
+
+from benchmarks.common import benchmark_database, emit, setup_django, summarize, timed
+
+BATCH = 5000
+COLUMNS = ("id", "phone", "amount", "checkout_request_id", "merchant_request_id", "status", "batch_id",
+           "created_at", "updated_at")
+
+
+def payload(i):
+    return {"Body": {"stkCallback": {
+        "MerchantRequestID": f"merchant-{i}", "CheckoutRequestID": f"ws_CO_{i:012d}", "ResultCode": 0,
+        "ResultDesc": "The service request is processed successfully.",
+        "CallbackMetadata": {"Item": [
+            {"Name": "Amount", "Value": 100 + i % 900}, {"Name": "MpesaReceiptNumber", "Value": f"NLJ7RT{i:06d}"},
+            {"Name": "TransactionDate", "Value": 20260101120000}, {"Name": "PhoneNumber", "Value": 254700000000 + i},
+        ]},
+    }}}
+
+
+def seed(rows):
+    from django.utils import timezone
+    from payments.models import MpesaPayment
+    from payments.payloads import save_payloads
+
+    now = timezone.now()
+    for start in range(0, rows, BATCH):
+        objs = MpesaPayment.objects.bulk_create([
+            MpesaPayment(phone="2547%08d" % i, amount=100 + i % 900, status="completed" if i % 4 else "failed",
+                         checkout_request_id=f"ws_CO_{i:012d}", merchant_request_id=f"merchant-{i}",
+                         mpesa_response=payload(i))
+            for i in range(start, min(start + BATCH, rows))
+        ])
+        save_payloads(objs)
+        # Spread over the last year, oldest first.
+        for obj in objs:
+            obj.created_at = now - datetime.timedelta(minutes=(rows - obj.pk) * 5)
+        MpesaPayment.objects.bulk_update(objs, ["created_at"])
+
+
+def build_inline(connection):
+    """A copy of the payment table, same declared types, with the payload column put back."""
+    table = "payments_mpesapayment"
+    columns = ", ".join(COLUMNS)
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(f"CREATE TABLE bench_inline_mpesa (LIKE {table} INCLUDING DEFAULTS INCLUDING INDEXES)")
+            cursor.execute("ALTER TABLE bench_inline_mpesa ADD COLUMN mpesa_response jsonb NULL")
+        else:
+            cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = %s", [table])
+            cursor.execute(cursor.fetchone()[0].replace(f'"{table}"', "bench_inline_mpesa", 1))
+            cursor.execute("ALTER TABLE bench_inline_mpesa ADD COLUMN mpesa_response text NULL")
+        cursor.execute(
+            f"INSERT INTO bench_inline_mpesa ({columns}, mpesa_response) "
+            f"SELECT {', '.join(f'p.{c}' for c in COLUMNS)}, pp.body FROM {table} p "
+            "LEFT JOIN payments_paymentpayload pp ON pp.provider = 'mpesa' AND pp.payment_id = p.id"
+        )
+
+
+def table_bytes(connection, table):
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT pg_total_relation_size(%s)", [table])
+        else:
+            cursor.execute("SELECT SUM(pgsize) FROM dbstat WHERE name = %s OR name IN "
+                           "(SELECT name FROM sqlite_master WHERE tbl_name = %s)", [table, table])
+        return cursor.fetchone()[0] or 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from django.test.utils import override_settings
+    from django.utils import timezone
+    from payments.models import MpesaPayment, PaymentPayload
+    from payments.payloads import archive
+
+    with tempfile.TemporaryDirectory() as tmp, override_settings(PAYMENT_ARCHIVE_DIR=tmp), benchmark_database():
+        seed(args.rows)
+        build_inline(connection)
+        sizes = {
+            "inline_table": table_bytes(connection, "bench_inline_mpesa"),
+            "payment_table": table_bytes(connection, MpesaPayment._meta.db_table),
+            "payload_table": table_bytes(connection, PaymentPayload._meta.db_table),
+        }
+        emit({"benchmark": "payload_table_size", "vendor": connection.vendor, "rows": args.rows, **sizes})
+
+        def fetch(sql):
+            with connection.cursor() as cursor:
+                cursor.execute(sql)
+                return len(cursor.fetchall())
+
+        # Every column, as a model fetch selects them.
+        tables = {"inline": ("bench_inline_mpesa", ", ".join(COLUMNS) + ", mpesa_response"),
+                  "payload_table": (MpesaPayment._meta.db_table, ", ".join(COLUMNS))}
+        queries = {"list_page": "SELECT {} FROM {} ORDER BY id DESC LIMIT 100",
+                   "scan_completed": "SELECT {} FROM {} WHERE status = 'completed'"}
+        for name, template in queries.items():
+            results = {}
+            for path, (table, columns) in tables.items():
+                samples = []
+                for _ in range(args.repeat):
+                    elapsed, _ = timed(fetch, template.format(columns, table))
+                    samples.append(elapsed)
+                results[path] = summarize(samples)
+                emit({"benchmark": "payload_list", "vendor": connection.vendor, "query": name, "path": path,
+                      "rows": args.rows, **results[path]})
+            emit({"benchmark": "payload_list", "query": name, "speedup_p50": round(
+                results["inline"]["p50_ms"] / results["payload_table"]["p50_ms"], 2)
+                if results["payload_table"]["p50_ms"] else None})
+
+        # Payments are 5 minutes apart, so this archives the older half.
+        cutoff = timezone.now() - datetime.timedelta(minutes=args.rows * 5 // 2)
+        before_archive = table_bytes(connection, PaymentPayload._meta.db_table)
+        elapsed, (archived, written) = timed(archive, "mpesa", cutoff)
+        with connection.cursor() as cursor:
+            # Emptied bodies leave free pages behind until the table is vacuumed.
+            cursor.execute("VACUUM FULL payments_paymentpayload" if connection.vendor == "postgresql" else "VACUUM")
+        emit({"benchmark": "payload_archive", "vendor": connection.vendor, "archived": archived,
+              "elapsed_ms": round(elapsed, 3), "segments": sum(len(files) for _, _, files in os.walk(tmp)),
+              "segment_bytes": written, "payload_table_before": before_archive,
+              "payload_table_after": table_bytes(connection, PaymentPayload._meta.db_table)})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Payment stats from daily rollups vs aggregating the payment tables.
+
+    python -m benchmarks.payment_stats --rows 500000 --days 365
+
+Seeds ``--rows`` M-Pesa and PayPal payments spread over ``--days`` days
+(``bulk_create``, so no rollup deltas), times ``backfill`` building the
+rollups, then times a full-range by-day/channel/currency/status query
+both ways and checks they agree.
+"""
+import argparse
+import datetime
+import random
+from decimal import Decimal
+
+from benchmarks.common import benchmark_database, emit, setup_django, summarize, timed
+
+BATCH = 5000
+
+
+def seed(rows, days):
+    from django.utils import timezone
+    from payments.models import MpesaPayment, PaypalPayment
+
+    rng = random.Random(42)
+    now = timezone.now()
+    for start in range(0, rows, BATCH):
+        mpesa, paypal = [], []
+        for i in range(start, min(start + BATCH, rows)):
+            created = now - datetime.timedelta(seconds=rng.randrange(days * 86400))
+            status = rng.choice(("completed", "completed", "failed", "pending"))
+            if i % 4:
+                mpesa.append(MpesaPayment(phone="254700000000", amount=Decimal(rng.randrange(10, 5000)),
+                                          status=status, created_at=created))
+            else:
+                paypal.append(PaypalPayment(order_id=f"ORDER-{i}", amount=Decimal(rng.randrange(1, 500)),
+                                            currency=rng.choice(("USD", "EUR")), status=status.upper(),
+                                            created_at=created))
+        # created_at is auto_now_add; bulk_create overwrites it, so set it afterwards.
+        for model, objs in ((MpesaPayment, mpesa), (PaypalPayment, paypal)):
+            stamps = [o.created_at for o in objs]
+            created = model.objects.bulk_create(objs)
+            for obj, stamp in zip(created, stamps):
+                obj.created_at = stamp
+            model.objects.bulk_update(created, ["created_at"])
+
+
+def direct(start, end):
+    """The same answer computed from the payment tables."""
+    from django.db.models import Count, Sum
+    from django.db.models.functions import TruncDate
+    from payments.models import MpesaPayment, PaypalPayment
+    from payments.rollups import day_bounds
+
+    since, until = day_bounds(start, end)
+    rows = {}
+    for channel, model in (("mpesa", MpesaPayment), ("paypal", PaypalPayment)):
+        group = ("day", "currency", "status") if model is PaypalPayment else ("day", "status")
+        queryset = model.objects.filter(created_at__gte=since, created_at__lt=until).annotate(day=TruncDate("created_at"))
+        for row in queryset.values(*group).annotate(n=Count("pk"), summed=Sum("amount")).order_by():
+            rows[(row["day"], channel, row.get("currency", "KES"), row["status"])] = (row["n"], row["summed"])
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from django.utils import timezone
+    from payments.models import DailyPaymentRollup
+    from payments.rollups import backfill, stats
+
+    with benchmark_database():
+        seed(args.rows, args.days)
+        end = timezone.localdate()
+        start = end - datetime.timedelta(days=args.days)
+        elapsed, _ = timed(backfill, start, end)
+        rollup_rows = DailyPaymentRollup.objects.count()
+        emit({"benchmark": "payment_stats_backfill", "vendor": connection.vendor, "payments": args.rows,
+              "rollup_rows": rollup_rows, "elapsed_ms": round(elapsed, 3),
+              "payments_per_sec": round(args.rows / (elapsed / 1000)) if elapsed else None})
+
+        results = {}
+        for name, fn in (("payment_tables", direct), ("rollups", stats)):
+            samples = []
+            for _ in range(args.repeat):
+                ms, data = timed(fn, start, end)
+                samples.append(ms)
+            results[name] = (summarize(samples), data)
+            emit({"benchmark": "payment_stats", "vendor": connection.vendor, "path": name,
+                  "payments": args.rows, "days": args.days, **results[name][0]})
+
+        from_rollups = {(r["day"], r["channel"], r["currency"], r["status"]): (r["count"], Decimal(r["total"]))
+                        for r in results["rollups"][1]}
+        assert from_rollups == results["payment_tables"][1]
+        before, after = results["payment_tables"][0], results["rollups"][0]
+        emit({"benchmark": "payment_stats", "payments": args.rows,
+              "speedup_p50": round(before["p50_ms"] / after["p50_ms"], 2) if after["p50_ms"] else None})
+
+
+if __name__ == "__main__":
+    main()
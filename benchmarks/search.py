@@ -0,0 +1,70 @@
+"""
+Submission search: the admin's ``icontains`` scan vs the full-text index.
+
+    python -m benchmarks.search --rows 100000
+
+Seeds ``--rows`` contacts, volunteers and partners, builds the search
+index (timed), then for a few terms times what an admin search page
+costs both ways: the result count plus the first page of 50 rows. The
+``icontains`` path is ``ModelAdmin.get_search_results`` over the model's
+``search_fields``, as before the index; the indexed path is
+``search.index.search`` ordered by rank.
+"""
+import argparse
+
+from benchmarks.common import benchmark_database, emit, setup_django, summarize, timed
+from benchmarks.list_pagination import seed
+
+TERMS = {
+    "contacts.Contact": ("Person 4242", "p4242@example.com", "hello", "nomatch"),
+    "volunteers.Volunteer": ("Volunteer 4242", "logistics", "nomatch"),
+    "partnerApplications.Partners": ("Org 4242", "partnership", "nomatch"),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib import admin
+    from django.db import connection
+    from search.index import INDEXED, rebuild, search
+
+    with benchmark_database():
+        seed(args.rows)
+        for model in INDEXED:
+            elapsed, count = timed(rebuild, model)
+            emit({"benchmark": "search_index_build", "vendor": connection.vendor, "model": model._meta.label,
+                  "rows": count, "elapsed_ms": round(elapsed, 3)})
+
+        for model in INDEXED:
+            model_admin = admin.site._registry[model]
+
+            def icontains(term):
+                queryset, _ = admin.ModelAdmin.get_search_results(model_admin, None, model.objects.all(), term)
+                return queryset.count(), list(queryset.order_by("-pk")[:50])
+
+            def indexed(term):
+                queryset = search(model.objects.all(), term)
+                return queryset.count(), list(queryset.order_by("-search_rank", "-pk")[:50])
+
+            for term in TERMS[model._meta.label]:
+                results = {}
+                for name, fn in (("icontains", icontains), ("index", indexed)):
+                    samples = []
+                    for _ in range(args.repeat):
+                        elapsed, (count, _) = timed(fn, term)
+                        samples.append(elapsed)
+                    results[name] = summarize(samples)
+                    emit({"benchmark": "search", "vendor": connection.vendor, "model": model._meta.label,
+                          "rows": args.rows, "term": term, "path": name, "matches": count, **results[name]})
+                before, after = results["icontains"], results["index"]
+                emit({"benchmark": "search", "model": model._meta.label, "term": term,
+                      "speedup_p50": round(before["p50_ms"] / after["p50_ms"], 2) if after["p50_ms"] else None})
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,11 @@
 from django.contrib import admin
+from backend.admin import PerformanceAdminMixin
+from search.admin import FullTextSearchMixin
 from .models import Contact
 
 @admin.register(Contact)
-class ContactAdmin(admin.ModelAdmin):
+class ContactAdmin(PerformanceAdminMixin, FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('name', 'email', 'created_at')
     list_filter = ('created_at',)
+    ordering = ('-created_at',)
     search_fields = ('name', 'email', 'message')
@@ -7,5 +7,10 @@ class Contact(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=10, default="Unread")
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="contact_created_idx"),
+        ]
+
     def __str__(self):
         return f"{self.name} - {self.email}"
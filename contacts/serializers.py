@@ -1,7 +1,8 @@
 from rest_framework import serializers
+from backend.serializers import SparseFieldsMixin
 from .models import Contact
 
-class ContactSerializer(serializers.ModelSerializer):
+class ContactSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Contact
         fields = '__all__'
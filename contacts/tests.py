@@ -1,3 +1,244 @@
-from django.test import TestCase
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import serializers
+from rest_framework.test import APIClient
+
+from backend import caching, throttling
+from backend.admin import EstimatedCountPaginator
+from backend.serializers import ValuesReader
+
+from .models import Contact
+from .serializers import ContactSerializer
+
+
+class ContactListTests(TestCase):
+    def setUp(self):
+        caching.get_cache().clear()
+        throttling.get_cache().clear()
+        self.client = APIClient()
+        Contact.objects.bulk_create([
+            Contact(name=f"Person {i}", email=f"p{i}@example.com", message="Hello")
+            for i in range(25)
+        ])
+
+    def get(self, url):
+        return self.client.get(url, secure=True)
+
+    def test_unpaginated_list_is_unchanged(self):
+        res = self.get("/api/contacts/")
+        self.assertEqual(res.status_code, 200)
+        self.assertIsInstance(res.data, list)
+        self.assertEqual(len(res.data), 25)
+        self.assertEqual(res.data[0]["name"], "Person 24")
+
+    def test_cursor_pages_cover_every_row_once(self):
+        seen, url = [], "/api/contacts/?page_size=10"
+        while url:
+            res = self.get(url)
+            seen.extend(row["id"] for row in res.data["results"])
+            url = res.data["next"]
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(seen, sorted(seen, reverse=True))
+
+    def test_sparse_fieldset(self):
+        res = self.get("/api/contacts/?fields=id,name&page_size=5")
+        self.assertEqual(set(res.data["results"][0]), {"id", "name"})
+
+    def test_values_reader(self):
+        reader = ValuesReader(ContactSerializer)
+        rows = reader.to_representation(reader.values(Contact.objects.order_by("-id")))
+        self.assertEqual(rows, [dict(r) for r in ContactSerializer(Contact.objects.order_by("-id"), many=True).data])
+
+        class WithMethod(ContactSerializer):
+            initials = serializers.SerializerMethodField()
+
+            def get_initials(self, obj):
+                return obj.name[:1]
+
+        self.assertFalse(ValuesReader(WithMethod).supported)
+
+    def test_post_ignores_fields_param(self):
+        res = self.client.post(
+            "/api/contacts/?fields=id",
+            {"name": "New", "email": "new@example.com", "message": "Hi"},
+            format="json",
+            secure=True,
+        )
+        self.assertEqual(res.status_code, 201)
+        self.assertIn("email", res.data)
+
+
+class ContactResponseCacheTests(TestCase):
+    def setUp(self):
+        caching.get_cache().clear()
+        throttling.get_cache().clear()
+        self.client = APIClient()
+        self.contact = Contact.objects.create(name="First", email="first@example.com", message="Hello")
+
+    def get(self, url="/api/contacts/", **headers):
+        return self.client.get(url, secure=True, **headers)
+
+    def test_repeat_gets_skip_the_database(self):
+        first = self.get()
+        with self.assertNumQueries(0):
+            second = self.get()
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second["ETag"], first["ETag"])
+        self.assertIn("Last-Modified", second)
+        self.assertEqual(self.get("/api/contacts/?fields=id").json(), [{"id": self.contact.id}])
+
+    def test_conditional_get(self):
+        etag = self.get()["ETag"]
+        res = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.content, b"")
+
+    def test_saves_invalidate(self):
+        etag = self.get()["ETag"]
+        self.client.post("/api/contacts/", {"name": "Second", "email": "s@example.com", "message": "Hi"},
+                         format="json", secure=True)
+        res = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([row["name"] for row in res.json()], ["Second", "First"])
+
+        self.client.patch(f"/api/contacts/{self.contact.id}/status/", {"status": "Read"}, format="json", secure=True)
+        self.assertEqual(self.get().json()[1]["status"], "Read")
+
+        self.contact.delete()
+        self.assertEqual(len(self.get().json()), 1)
+
+    def test_hit_ratio(self):
+        before = caching.stats().get("contacts.contact", {"hits": 0, "misses": 0})
+        for _ in range(3):
+            self.get()
+        after = caching.stats()["contacts.contact"]
+        self.assertEqual(after["misses"] - before["misses"], 1)
+        self.assertEqual(after["hits"] - before["hits"], 2)
+
+    @override_settings(RESPONSE_CACHE_ENABLED=False)
+    def test_can_be_disabled(self):
+        self.get()
+        with self.assertNumQueries(1):
+            self.get()
+
+    def test_changes_reach_other_workers_only_through_a_shared_cache(self):
+        def seen_by(worker, writer):
+            """Whether ``worker`` sees a change that another process, on ``writer``, made."""
+            with mock.patch.object(caching, "get_cache", return_value=worker):
+                before = caching.generation("contacts.contact")
+            with mock.patch.object(caching, "get_cache", return_value=writer), \
+                    mock.patch.object(caching.time, "time", return_value=before + 1):
+                caching.invalidate("contacts.contact")
+            with mock.patch.object(caching, "get_cache", return_value=worker):
+                return caching.generation("contacts.contact") != before
+
+        with tempfile.TemporaryDirectory() as tmp:
+            self.assertTrue(seen_by(FileBasedCache(tmp, {}), FileBasedCache(tmp, {})))
+        self.assertFalse(seen_by(LocMemCache("worker-1", {}), LocMemCache("worker-2", {})))
+
+    def test_several_workers_need_a_shared_cache(self):
+        caching.check_shared(1)
+        with self.assertRaises(ImproperlyConfigured):
+            caching.check_shared(4)
+        with override_settings(RESPONSE_CACHE_ENABLED=False):
+            caching.check_shared(4)
+        shared = {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": "/tmp/responses"}
+        with override_settings(CACHES={**settings.CACHES, "responses": shared}):
+            caching.check_shared(4)
+
+
+@override_settings(THROTTLE_RATES={"contact_submit": {"ip": "2/min"}})
+class ContactThrottleTests(TestCase):
+    def setUp(self):
+        throttling.get_cache().clear()
+        self.client = APIClient()
+
+    def submit(self, **extra):
+        return self.client.post("/api/contacts/", {"name": "Amina", "email": "a@example.com", "message": "Hi"},
+                                format="json", secure=True, **extra)
+
+    def test_rejects_over_the_rate_without_touching_the_database(self):
+        self.assertEqual([self.submit().status_code for _ in range(2)], [201, 201])
+        with self.assertNumQueries(0):
+            res = self.submit()
+        self.assertEqual(res.status_code, 429)
+        self.assertEqual(res["Retry-After"], "30")
+        self.assertEqual(Contact.objects.count(), 2)
+        # Other clients and reads are unaffected.
+        self.assertEqual(self.submit(REMOTE_ADDR="10.0.0.2").status_code, 201)
+        self.assertEqual(self.client.get("/api/contacts/", secure=True).status_code, 200)
+
+    @override_settings(THROTTLE_ENABLED=False)
+    def test_can_be_disabled(self):
+        self.assertEqual({self.submit().status_code for _ in range(3)}, {201})
+
+
+class ContactAdminTests(TestCase):
+    url = "/admin/contacts/contact/"
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_superuser("admin", "admin@example.com", "pw"))
+
+    def add(self, count):
+        Contact.objects.bulk_create([
+            Contact(name=f"Person {i}", email=f"p{i}@example.com", message="Long message " * 50)
+            for i in range(Contact.objects.count(), Contact.objects.count() + count)
+        ])
+
+    def changelist(self, url=None):
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(url or self.url, secure=True)
+        self.assertEqual(res.status_code, 200)
+        return res, queries.captured_queries
+
+    def results_sql(self, queries):
+        return next(q["sql"] for q in queries if q["sql"].startswith('SELECT "contacts_contact"."id"'))
+
+    def test_fixed_query_count_without_message(self):
+        self.add(3)
+        _, few = self.changelist()
+        self.add(250)
+        res, many = self.changelist()
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(len(res.context["cl"].result_list), 100)
+        self.assertEqual(res.context["cl"].result_list[0].name, "Person 252")
+        self.assertNotIn('"message"', self.results_sql(many))
+        # The change form still has it.
+        res = self.client.get(f"{self.url}{Contact.objects.first().pk}/change/", secure=True)
+        self.assertContains(res, "Long message")
+
+    def test_estimated_count_skips_count_query(self):
+        self.add(5)
+        with mock.patch.object(EstimatedCountPaginator, "estimate", return_value=2_000_000):
+            res, queries = self.changelist()
+        self.assertEqual(res.context["cl"].result_count, 2_000_000)
+        self.assertFalse(any("COUNT(" in q["sql"] for q in queries))
+        # Below the threshold it counts exactly.
+        with mock.patch.object(EstimatedCountPaginator, "estimate", return_value=5):
+            res, _ = self.changelist()
+        self.assertEqual(res.context["cl"].result_count, 5)
+
+    def test_estimate_only_for_unfiltered_postgres_tables(self):
+        self.add(2)
+        contacts = Contact.objects.order_by("-id")
+        if connection.vendor != "postgresql":
+            self.assertIsNone(EstimatedCountPaginator(contacts, 10).estimate())
+        self.assertIsNone(EstimatedCountPaginator(contacts.filter(status="Read"), 10).estimate())
+        self.assertEqual(EstimatedCountPaginator(contacts, 10).count, 2)
+
+    @override_settings(ADMIN_PERFORMANCE_MODE=False)
+    def test_can_be_disabled(self):
+        self.add(3)
+        res, queries = self.changelist()
+        self.assertEqual(res.context["cl"].full_result_count, 3)
+        self.assertIn('"message"', self.results_sql(queries))
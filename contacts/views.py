@@ -1,24 +1,30 @@
-from rest_framework.decorators import api_view
+from django.db import transaction
+from rest_framework.decorators import api_view, throttle_classes
 from rest_framework.response import Response
 from rest_framework import status
+from backend.caching import cache_response
+from backend.pagination import list_response
+from backend.throttling import ContactSubmitThrottle
 from .models import Contact
 from .serializers import ContactSerializer
 
 
+@cache_response(Contact)
 @api_view(['GET', 'POST'])
+@throttle_classes([ContactSubmitThrottle])
 def contact_list_create(request):
     """
     Handles both GET and POST for Contacts
     """
     if request.method == 'GET':
-        contacts = Contact.objects.all().order_by('-id')
-        serializer = ContactSerializer(contacts, many=True)
-        return Response(serializer.data)
+        return list_response(request, Contact.objects.all(), ContactSerializer, ordering=('-id',))
 
     elif request.method == 'POST':
         serializer = ContactSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            # The outbox message (see outbox.signals) commits with the row.
+            with transaction.atomic():
+                serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
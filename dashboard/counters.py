@@ -0,0 +1,117 @@
+from django.core.cache import cache
+from django.db.models import Count, F, Sum
+
+from backend.deltas import ZERO, DeltaTracker
+from contacts.models import Contact
+from partnerApplications.models import Partners
+from payments.models import MpesaPayment, PaypalPayment
+from volunteers.models import Volunteer
+
+from .models import Counter
+
+CACHE_KEY = "dashboard:counts"
+
+
+# ----------- What each row contributes to the counters -----------
+def _contact(obj):
+    contributions = {"contacts": (1, ZERO)}
+    if obj.status == "Unread":
+        contributions["contacts:unread"] = (1, ZERO)
+    return contributions
+
+def _mpesa(obj):
+    return {f"mpesa:{obj.status}": (1, obj.amount or ZERO)}
+
+def _paypal(obj):
+    return {f"paypal:{obj.status}": (1, obj.amount or ZERO)}
+
+TRACKED = {
+    Partners: (lambda obj: {"partners": (1, ZERO)}, ()),
+    Volunteer: (lambda obj: {"volunteers": (1, ZERO)}, ()),
+    Contact: (_contact, ("status",)),
+    MpesaPayment: (_mpesa, ("status", "amount")),
+    PaypalPayment: (_paypal, ("status", "amount")),
+}
+
+
+def contributions(instance):
+    contribute, _ = TRACKED[type(instance)]
+    return contribute(instance)
+
+
+def apply_deltas(deltas):
+    if not deltas:
+        return
+    # Sorted, so concurrent transactions lock the Counter rows in one order
+    # and cannot deadlock each other.
+    for name, (count, total) in sorted(deltas.items()):
+        updated = Counter.objects.filter(name=name).update(value=F("value") + count, total=F("total") + total)
+        if not updated:
+            Counter.objects.get_or_create(name=name)
+            Counter.objects.filter(name=name).update(value=F("value") + count, total=F("total") + total)
+    cache.delete(CACHE_KEY)
+
+
+# Connected in DashboardConfig.ready.
+tracker = DeltaTracker("counter", {model: fields for model, (_, fields) in TRACKED.items()},
+                       contributions, apply_deltas)
+
+
+# ----------- Full recount -----------
+def compute_all():
+    """Recount everything from the source tables (used by reconcile_counters)."""
+    counts = {
+        "partners": (Partners.objects.count(), ZERO),
+        "volunteers": (Volunteer.objects.count(), ZERO),
+        "contacts": (Contact.objects.count(), ZERO),
+        "contacts:unread": (Contact.objects.filter(status="Unread").count(), ZERO),
+    }
+    for prefix, model in (("mpesa", MpesaPayment), ("paypal", PaypalPayment)):
+        for row in model.objects.values("status").annotate(n=Count("id"), amount=Sum("amount")).order_by():
+            counts[f"{prefix}:{row['status']}"] = (row["n"], row["amount"] or ZERO)
+    return counts
+
+
+def reconcile():
+    """Overwrite the stored counters with a fresh recount; returns the names that drifted."""
+    fresh = compute_all()
+    drifted = []
+    existing = {c.name: c for c in Counter.objects.all()}
+    for name, counter in existing.items():
+        if name not in fresh and (counter.value or counter.total):
+            fresh[name] = (0, ZERO)
+    for name, (value, total) in fresh.items():
+        counter = existing.get(name)
+        if counter is None:
+            Counter.objects.create(name=name, value=value, total=total)
+            drifted.append(name)
+        elif counter.value != value or counter.total != total:
+            counter.value, counter.total = value, total
+            counter.save(update_fields=["value", "total", "updated_at"])
+            drifted.append(name)
+    cache.delete(CACHE_KEY)
+    return drifted
+
+
+# ----------- Read side -----------
+def snapshot():
+    counters = {c["name"]: c for c in Counter.objects.values("name", "value", "total", "updated_at")}
+
+    def value(name):
+        return counters[name]["value"] if name in counters else 0
+
+    payments = {"mpesa": {}, "paypal": {}}
+    for name, c in counters.items():
+        prefix, _, status = name.partition(":")
+        if prefix in payments:
+            payments[prefix][status] = {"count": c["value"], "total": str(c["total"])}
+
+    updated = [c["updated_at"] for c in counters.values()]
+    return {
+        "partners": value("partners"),
+        "volunteers": value("volunteers"),
+        "contacts": value("contacts"),
+        "unread_contacts": value("contacts:unread"),
+        "payments": payments,
+        "as_of": max(updated).isoformat() if updated else None,
+    }
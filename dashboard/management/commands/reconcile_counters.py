@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from dashboard.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = "Recount dashboard counters from the source tables and fix any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval", type=int, default=0,
+            help="Keep running and reconcile every N seconds (default: run once).",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            drifted = reconcile()
+            if drifted:
+                self.stdout.write(self.style.WARNING(f"Corrected {len(drifted)} counter(s): {', '.join(sorted(drifted))}"))
+            else:
+                self.stdout.write(self.style.SUCCESS("Counters are in sync"))
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,37 @@
+from django.db import migrations
+from django.db.models import Count, Sum
+
+
+def seed_counters(apps, schema_editor):
+    Counter = apps.get_model('dashboard', 'Counter')
+    Partners = apps.get_model('partnerApplications', 'Partners')
+    Volunteer = apps.get_model('volunteers', 'Volunteer')
+    Contact = apps.get_model('contacts', 'Contact')
+    MpesaPayment = apps.get_model('payments', 'MpesaPayment')
+    PaypalPayment = apps.get_model('payments', 'PaypalPayment')
+
+    counters = [
+        Counter(name='partners', value=Partners.objects.count()),
+        Counter(name='volunteers', value=Volunteer.objects.count()),
+        Counter(name='contacts', value=Contact.objects.count()),
+        Counter(name='contacts:unread', value=Contact.objects.filter(status='Unread').count()),
+    ]
+    for prefix, model in (('mpesa', MpesaPayment), ('paypal', PaypalPayment)):
+        for row in model.objects.values('status').annotate(n=Count('id'), amount=Sum('amount')).order_by():
+            counters.append(Counter(name=f"{prefix}:{row['status']}", value=row['n'], total=row['amount'] or 0))
+    Counter.objects.bulk_create(counters, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+        ('contacts', '0003_contact_status'),
+        ('partnerApplications', '0003_date_applied_index'),
+        ('payments', '0004_processedevent'),
+        ('volunteers', '0002_date_applied_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,12 @@
+from django.db import models
+
+
+class Counter(models.Model):
+    # Running total kept in step with the tracked tables (see dashboard/counters.py)
+    name = models.CharField(max_length=64, unique=True)  # e.g. contacts, contacts:unread, mpesa:completed
+    value = models.BigIntegerField(default=0)
+    total = models.DecimalField(max_digits=16, decimal_places=2, default=0)  # summed amount, payments only
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
@@ -0,0 +1,76 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+
+from contacts.models import Contact
+from payments.models import MpesaPayment
+from volunteers.models import Volunteer
+
+from .counters import reconcile
+from .models import Counter
+
+
+class DashboardCountsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def get(self, **headers):
+        return self.client.get("/api/dashboard-counts/", secure=True, **headers)
+
+    def value(self, name):
+        counter = Counter.objects.filter(name=name).first()
+        return counter.value if counter else 0
+
+    def test_counters_follow_saves_and_deletes(self):
+        contact = Contact.objects.create(name="A", email="a@example.com", message="hi")
+        Contact.objects.create(name="B", email="b@example.com", message="hi")
+        self.assertEqual(self.value("contacts"), 2)
+        self.assertEqual(self.value("contacts:unread"), 2)
+
+        contact.status = "Read"
+        contact.save()
+        self.assertEqual(self.value("contacts:unread"), 1)
+
+        contact.delete()
+        self.assertEqual(self.value("contacts"), 1)
+        self.assertEqual(self.value("contacts:unread"), 1)
+
+    def test_payment_totals_move_between_statuses(self):
+        payment = MpesaPayment.objects.create(phone="254700000000", amount=Decimal("150.00"))
+        payment.status = "completed"
+        payment.save()
+        completed = Counter.objects.get(name="mpesa:completed")
+        self.assertEqual((completed.value, completed.total), (1, Decimal("150.00")))
+        self.assertEqual(self.value("mpesa:pending"), 0)
+
+    def test_endpoint_serves_counts_without_scanning(self):
+        Volunteer.objects.create(full_name="V", email="v@example.com", phone="0700", skills="x")
+        res = self.get()
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()["volunteers"], 1)
+        self.assertIn("max-age", res["Cache-Control"])
+
+        with self.assertNumQueries(0):
+            cached = self.get(HTTP_IF_NONE_MATCH=res["ETag"])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_payment_figures_are_for_staff_only(self):
+        MpesaPayment.objects.create(phone="254700000000", amount=Decimal("150.00"))
+        public = self.get()
+        self.assertNotIn("payments", public.json())
+        self.assertIn("contacts", public.json())
+
+        self.client.force_login(get_user_model().objects.create_user("staff", password="pw", is_staff=True))
+        staff = self.get(HTTP_IF_NONE_MATCH=public["ETag"])
+        self.assertEqual(staff.status_code, 200)
+        self.assertEqual(staff.json()["payments"]["mpesa"]["pending"], {"count": 1, "total": "150.00"})
+        self.assertIn("Cookie", staff["Vary"])
+
+    def test_reconcile_fixes_bulk_operation_drift(self):
+        Contact.objects.bulk_create([Contact(name="C", email="c@example.com", message="hi")])
+        self.assertEqual(self.value("contacts"), 0)
+        self.assertIn("contacts", reconcile())
+        self.assertEqual(self.value("contacts"), 1)
+        self.assertEqual(reconcile(), [])
@@ -0,0 +1,41 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponseNotModified, JsonResponse
+from django.utils.cache import patch_vary_headers
+
+from .counters import CACHE_KEY, snapshot
+
+
+def _entry(data):
+    body = json.dumps(data, sort_keys=True)
+    return {"data": data, "etag": '"%s"' % hashlib.md5(body.encode()).hexdigest()}
+
+
+def dashboard_counts(request):
+    """
+    Totals for the admin dashboard, served from the Counter table (kept
+    current by signals) through the cache instead of COUNT(*) scans.
+    Payment counts and totals are for staff only, as /api/payments/stats/
+    is; everyone else gets the submission counts.
+    """
+    cached = cache.get(CACHE_KEY)
+    if cached is None:
+        data = snapshot()
+        cached = {
+            "staff": _entry(data),
+            "public": _entry({name: value for name, value in data.items() if name != "payments"}),
+        }
+        cache.set(CACHE_KEY, cached, getattr(settings, "DASHBOARD_COUNTS_CACHE_SECONDS", 30))
+
+    entry = cached["staff" if request.user.is_active and request.user.is_staff else "public"]
+    if entry["etag"] in request.headers.get("If-None-Match", ""):
+        response = HttpResponseNotModified()
+    else:
+        response = JsonResponse(entry["data"])
+    response["ETag"] = entry["etag"]
+    response["Cache-Control"] = f"private, max-age={getattr(settings, 'DASHBOARD_COUNTS_MAX_AGE', 10)}"
+    patch_vary_headers(response, ["Cookie"])
+    return response
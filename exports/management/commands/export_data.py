@@ -0,0 +1,46 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from exports.streaming import DATASETS, DEFAULT_CHUNK_SIZE, FORMATS, ExportError, encode, export_rows
+
+
+class Command(BaseCommand):
+    help = "Stream a payments or submissions dataset to CSV/NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=sorted(DATASETS))
+        parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+        parser.add_argument("--start", help="First day to include (YYYY-MM-DD).")
+        parser.add_argument("--end", help="Last day to include (YYYY-MM-DD).")
+        parser.add_argument("--status", help="Only rows with this status.")
+        parser.add_argument("--payloads", action="store_true", help="Include raw provider JSON columns.")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument("--output", "-o", help="File to write (default: stdout).")
+
+    def handle(self, *args, **options):
+        try:
+            columns, rows = export_rows(
+                options["dataset"],
+                start=options["start"],
+                end=options["end"],
+                status=options["status"],
+                include_payload=options["payloads"],
+                chunk_size=options["chunk_size"],
+            )
+            stream, _ = encode(options["format"], columns, rows)
+        except ExportError as exc:
+            raise CommandError(str(exc))
+
+        out = open(options["output"], "w", newline="", encoding="utf-8") if options["output"] else sys.stdout
+        started, lines = time.monotonic(), 0
+        try:
+            for line in stream:
+                out.write(line)
+                lines += 1
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        if options["output"]:
+            self.stderr.write(f"Wrote {lines} line(s) to {options['output']} in {time.monotonic() - started:.1f}s")
@@ -0,0 +1,148 @@
+import csv
+import datetime
+import json
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from contacts.models import Contact
+from partnerApplications.models import Partners
+from payments import payloads
+from payments.models import MpesaPayment, PaypalPayment
+from volunteers.models import Volunteer
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+class ExportError(ValueError):
+    pass
+
+
+class Dataset:
+    def __init__(self, model, fields, date_field, payload_field=None, has_status=False):
+        self.model = model
+        self.fields = fields
+        self.date_field = date_field
+        self.payload_field = payload_field
+        self.has_status = has_status
+
+    def columns(self, include_payload=False):
+        if include_payload and self.payload_field:
+            return self.fields + (self.payload_field,)
+        return self.fields
+
+
+DATASETS = {
+    "mpesa": Dataset(
+        MpesaPayment,
+        ("id", "phone", "amount", "status", "checkout_request_id", "merchant_request_id", "created_at", "updated_at"),
+        "created_at", payload_field="mpesa_response", has_status=True,
+    ),
+    "paypal": Dataset(
+        PaypalPayment,
+        ("id", "order_id", "payer_id", "amount", "currency", "status", "created_at", "updated_at"),
+        "created_at", payload_field="raw_payload", has_status=True,
+    ),
+    "contacts": Dataset(
+        Contact, ("id", "name", "email", "message", "status", "created_at"), "created_at", has_status=True,
+    ),
+    "volunteers": Dataset(
+        Volunteer, ("id", "full_name", "email", "phone", "skills", "availability", "date_applied"), "date_applied",
+    ),
+    "partners": Dataset(
+        Partners,
+        ("id", "organization_name", "contact_person", "phone", "email", "address", "message", "date_applied"),
+        "date_applied",
+    ),
+}
+
+
+def _day_start(value, name):
+    try:
+        day = parse_date(value) if isinstance(value, str) else value
+    except ValueError:
+        day = None
+    if day is None:
+        raise ExportError(f"{name} must be a date (YYYY-MM-DD)")
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def export_rows(name, start=None, end=None, status=None, include_payload=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield one tuple per row of dataset ``name``, oldest first.
+
+    Rows come from ``values_list().iterator(chunk_size)`` (a server-side
+    cursor on Postgres), so only one chunk is ever held in memory.
+    Payloads live outside the payment tables and are fetched a chunk at
+    a time. ``end`` is inclusive.
+    """
+    dataset = DATASETS.get(name)
+    if dataset is None:
+        raise ExportError(f"Unknown dataset {name!r}; choose from {', '.join(DATASETS)}")
+
+    qs = dataset.model.objects.all()
+    if start:
+        qs = qs.filter(**{f"{dataset.date_field}__gte": _day_start(start, "start")})
+    if end:
+        qs = qs.filter(**{f"{dataset.date_field}__lt": _day_start(end, "end") + datetime.timedelta(days=1)})
+    if status:
+        if not dataset.has_status:
+            raise ExportError(f"{name} has no status to filter on")
+        qs = qs.filter(status=status)
+
+    rows = qs.order_by("pk").values_list(*dataset.fields).iterator(chunk_size=chunk_size)
+    if include_payload and dataset.payload_field:
+        rows = _with_payloads(dataset.model, rows, chunk_size)
+    return dataset.columns(include_payload), rows
+
+
+def _with_payloads(model, rows, chunk_size):
+    """Append each row's payload (rows start with the id), one ``payloads.bodies`` call per chunk."""
+    provider = payloads.PROVIDERS[model]
+    for chunk in iter(lambda: list(islice(rows, chunk_size)), []):
+        found = payloads.bodies(provider, [row[0] for row in chunk])
+        for row in chunk:
+            yield row + (found.get(row[0]),)
+
+
+# ----------- Encoders -----------
+class _Echo:
+    """File-like object whose write() hands the line straight back."""
+
+    def write(self, value):
+        return value
+
+
+def _cell(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, cls=DjangoJSONEncoder)
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+def iter_csv(columns, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([_cell(v) for v in row])
+
+
+def iter_ndjson(columns, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder) + "\n"
+
+
+FORMATS = {
+    "csv": (iter_csv, "text/csv"),
+    "ndjson": (iter_ndjson, "application/x-ndjson"),
+}
+
+
+def encode(fmt, columns, rows):
+    if fmt not in FORMATS:
+        raise ExportError(f"Unknown format {fmt!r}; choose csv or ndjson")
+    encoder, content_type = FORMATS[fmt]
+    return encoder(columns, rows), content_type
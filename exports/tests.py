@@ -0,0 +1,82 @@
+import csv
+import io
+import json
+import os
+import tempfile
+import tracemalloc
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from contacts.models import Contact
+from payments.models import MpesaPayment
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        staff = get_user_model().objects.create_user("finance", password="pw", is_staff=True)
+        self.client.force_login(staff)
+        old = MpesaPayment.objects.create(phone="254700000001", amount=Decimal("10.00"), status="completed")
+        MpesaPayment.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=40))
+        MpesaPayment.objects.create(phone="254700000002", amount=Decimal("20.00"), status="completed",
+                                    mpesa_response={"ResultCode": 0})
+        MpesaPayment.objects.create(phone="254700000003", amount=Decimal("30.00"), status="failed")
+
+    def export(self, url):
+        res = self.client.get(url, secure=True)
+        self.assertEqual(res.status_code, 200)
+        return b"".join(res.streaming_content).decode()
+
+    def test_requires_staff(self):
+        self.client.logout()
+        res = self.client.get("/api/exports/mpesa/", secure=True)
+        self.assertEqual(res.status_code, 302)
+
+    def test_csv_with_filters(self):
+        since = (timezone.localdate() - timedelta(days=7)).isoformat()
+        rows = list(csv.reader(io.StringIO(self.export(f"/api/exports/mpesa/?start={since}&status=completed"))))
+        self.assertEqual(rows[0][:3], ["id", "phone", "amount"])
+        self.assertEqual([r[1] for r in rows[1:]], ["254700000002"])
+
+    def test_ndjson_with_payloads(self):
+        lines = self.export("/api/exports/mpesa/?format=ndjson&payloads=1").splitlines()
+        records = [json.loads(line) for line in lines]
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[1]["mpesa_response"], {"ResultCode": 0})
+        self.assertEqual(records[1]["amount"], "20.00")
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.client.get("/api/exports/nope/", secure=True).status_code, 400)
+        self.assertEqual(self.client.get("/api/exports/volunteers/?status=x", secure=True).status_code, 400)
+        self.assertEqual(self.client.get("/api/exports/mpesa/?start=2024-13-40", secure=True).status_code, 400)
+
+    def test_management_command(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "contacts.csv")
+            Contact.objects.create(name="A", email="a@example.com", message="hi")
+            call_command("export_data", "contacts", output=path, stderr=io.StringIO())
+            with open(path, newline="") as f:
+                self.assertEqual(len(list(csv.reader(f))), 2)
+
+    def test_memory_stays_flat_as_rows_grow(self):
+        def peak_for(rows):
+            existing = Contact.objects.count()
+            Contact.objects.bulk_create(
+                [Contact(name=f"P{i}", email=f"p{i}@example.com", message="x" * 200) for i in range(existing, rows)],
+                batch_size=1000,
+            )
+            tracemalloc.start()
+            res = self.client.get("/api/exports/contacts/", secure=True)
+            for _ in res.streaming_content:
+                pass
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return peak
+
+        small, large = peak_for(2000), peak_for(10000)
+        # Five times the rows must not mean anywhere near five times the memory.
+        self.assertLess(large, small * 2)
@@ -0,0 +1,33 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from .streaming import ExportError, encode, export_rows
+
+
+@staff_member_required
+def export_dataset(request, dataset):
+    """
+    Stream a dataset as CSV or NDJSON without loading it into memory.
+    Staff only (admin session). Query params: format, start, end, status,
+    payloads=1 to include the raw provider JSON.
+    """
+    params = request.GET
+    fmt = params.get("format", "csv")
+    try:
+        columns, rows = export_rows(
+            dataset,
+            start=params.get("start"),
+            end=params.get("end"),
+            status=params.get("status"),
+            include_payload=params.get("payloads") in ("1", "true"),
+        )
+        stream, content_type = encode(fmt, columns, rows)
+    except ExportError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+
+    response = StreamingHttpResponse(stream, content_type=content_type)
+    filename = f"{dataset}-{timezone.now():%Y%m%d%H%M%S}.{fmt}"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    response["Cache-Control"] = "no-store"
+    return response
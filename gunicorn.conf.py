@@ -0,0 +1,25 @@
+"""
+Gunicorn settings for the Procfile's `web` process.
+
+ASGI_MODE=True serves backend.asgi on uvicorn workers, where a worker
+awaits provider calls instead of blocking on them; otherwise the WSGI app
+runs on the default sync workers.
+
+Workers only see each other's response cache invalidations through a
+shared cache, so startup fails when several would run on locmem.
+"""
+import os
+
+import decouple
+
+if decouple.config('ASGI_MODE', default=False, cast=bool):
+    wsgi_app = 'backend.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'backend.wsgi:application'
+
+
+def on_starting(server):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    from backend.caching import check_shared
+    check_shared(server.cfg.workers)
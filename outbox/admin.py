@@ -0,0 +1,17 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import OutboxMessage
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ("id", "topic", "status", "attempts", "available_at", "created_at", "processed_at")
+    list_filter = ("status", "topic")
+    readonly_fields = ("created_at", "processed_at", "claimed_at")
+    actions = ["requeue"]
+
+    @admin.action(description="Requeue selected messages")
+    def requeue(self, request, queryset):
+        updated = queryset.exclude(status="running").update(status="pending", attempts=0, available_at=timezone.now())
+        self.message_user(request, f"Requeued {updated} message(s).")
@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+
+
+class OutboxConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'outbox'
+
+    def ready(self):
+        from backend.metrics import register_collector
+        from . import signals  # noqa: F401
+        from .metrics import collect
+
+        register_collector("outbox", collect)
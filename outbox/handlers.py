@@ -0,0 +1,29 @@
+"""
+Outbox message handlers.
+
+``OUTBOX_HANDLERS`` maps a topic to dotted paths of callables taking the
+``OutboxMessage``. Delivery is at-least-once (a worker can die after a
+handler ran but before the message was marked done), so handlers must be
+idempotent. Raising marks the message for retry.
+"""
+import logging
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+_resolved = {}
+
+
+def handlers_for(topic):
+    paths = tuple(getattr(settings, "OUTBOX_HANDLERS", {}).get(topic, ()))
+    key = (topic, paths)
+    if key not in _resolved:
+        _resolved[key] = [import_string(path) for path in paths]
+    return _resolved[key]
+
+
+def log_message(message):
+    """Default handler: record the submission in the application log."""
+    logger.info("Outbox %s: %s", message.topic, message.payload)
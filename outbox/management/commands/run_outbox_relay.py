@@ -0,0 +1,34 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from backend.metrics import serve_metrics
+from outbox.relay import backlog, relay
+
+
+class Command(BaseCommand):
+    help = "Deliver outbox messages (side effects of form submissions) to their handlers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Messages delivered concurrently.")
+        parser.add_argument("--batch-size", type=int, default=100, help="Messages claimed per batch.")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds to sleep when the outbox is empty.")
+        parser.add_argument("--once", action="store_true", help="Exit once the outbox is empty.")
+        parser.add_argument("--metrics-port", type=int, default=None, help="Serve Prometheus metrics on this port.")
+
+    def handle(self, *args, **options):
+        relay.workers = options["workers"]
+        relay.batch_size = options["batch_size"]
+        relay.poll_interval = options["poll_interval"]
+        if options["metrics_port"]:
+            serve_metrics(options["metrics_port"])
+        signal.signal(signal.SIGTERM, lambda *_: relay.stop())
+        try:
+            relay.run(once=options["once"])
+        except KeyboardInterrupt:
+            relay.stop()
+        stats = relay.stats
+        self.stdout.write(self.style.SUCCESS(
+            f"Delivered {stats['delivered']} message(s), {stats['retried']} to retry, "
+            f"{stats['dead']} dead-lettered; backlog {backlog()}"
+        ))
@@ -0,0 +1,21 @@
+"""Outbox metrics for ``/metrics`` (see ``backend.metrics``)."""
+from backend.metrics import Metric
+
+from .relay import backlog, dead_letters, lag_seconds, relay
+
+
+def collect():
+    stats = relay.stats
+    messages = Metric("outbox_messages_total", "counter", "Outbox messages processed by this relay, by outcome.")
+    for outcome in ("delivered", "retried", "dead"):
+        messages.add(stats[outcome], outcome=outcome)
+    return [
+        messages,
+        Metric("outbox_batches_total", "counter", "Outbox batches processed.").add(stats["batches"]),
+        Metric("outbox_last_batch_rate", "gauge", "Messages per second in the last batch.")
+        .add(stats["last_batch_rate"]),
+        Metric("outbox_backlog", "gauge", "Outbox messages not yet delivered.").add(backlog()),
+        Metric("outbox_dead_letters", "gauge", "Outbox messages that exhausted their retries.").add(dead_letters()),
+        Metric("outbox_lag_seconds", "gauge", "Age of the oldest due, undelivered outbox message.")
+        .add(round(lag_seconds(), 3)),
+    ]
@@ -0,0 +1,24 @@
+from django.db import models
+from django.utils import timezone
+
+
+class OutboxMessage(models.Model):
+    # Side effect recorded in the same transaction as the row that caused it,
+    # delivered later by `manage.py run_outbox_relay`
+    topic = models.CharField(max_length=100)  # e.g. contacts.contact.created
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=16, default="pending")  # pending / running / done / dead
+    attempts = models.PositiveSmallIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "available_at"], name="outbox_status_available_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} #{self.pk} ({self.status})"
@@ -0,0 +1,156 @@
+"""
+Transactional outbox relay.
+
+``enqueue`` writes an ``OutboxMessage`` in the caller's transaction, so a
+side effect is recorded if and only if the change that caused it commits.
+``OutboxRelay`` claims due messages in batches (``skip_locked``, so
+several relay processes can share the table), runs their handlers on a
+thread pool and writes the outcomes back with one ``bulk_update`` per
+batch. Failures are retried with jittered exponential backoff; after
+``OUTBOX_MAX_ATTEMPTS`` a message is parked as ``dead`` for inspection in
+the admin. Messages left ``running`` by a crashed relay are put back after
+``OUTBOX_CLAIM_TIMEOUT`` seconds.
+"""
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from .handlers import handlers_for
+from .models import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(topic, payload):
+    return OutboxMessage.objects.create(topic=topic, payload=payload)
+
+
+# ----------- Queue operations -----------
+def recover_stale(now=None):
+    """Put back messages claimed by a relay that never reported back."""
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=getattr(settings, "OUTBOX_CLAIM_TIMEOUT", 300))
+    return OutboxMessage.objects.filter(status="running", claimed_at__lt=cutoff).update(status="pending")
+
+
+def claim_messages(limit):
+    now = timezone.now()
+    with transaction.atomic():
+        messages = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True)
+            .filter(status="pending", available_at__lte=now)
+            .order_by("available_at", "id")[:limit]
+        )
+        if messages:
+            OutboxMessage.objects.filter(id__in=[m.id for m in messages]).update(status="running", claimed_at=now)
+    return messages
+
+
+def lag_seconds(now=None):
+    """Age of the oldest message that is due but undelivered."""
+    now = now or timezone.now()
+    oldest = OutboxMessage.objects.filter(status__in=("pending", "running"), available_at__lte=now) \
+        .aggregate(oldest=Min("created_at"))["oldest"]
+    return max(0.0, (now - oldest).total_seconds()) if oldest else 0.0
+
+
+def backlog():
+    return OutboxMessage.objects.filter(status__in=("pending", "running")).count()
+
+
+def dead_letters():
+    return OutboxMessage.objects.filter(status="dead").count()
+
+
+# ----------- Worker pool -----------
+class OutboxRelay:
+    """Drains the outbox on a thread pool, one batch at a time."""
+
+    def __init__(self, workers=4, batch_size=100, poll_interval=1.0):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.stats = {
+            "batches": 0, "delivered": 0, "retried": 0, "dead": 0,
+            "last_batch_seconds": 0.0, "last_batch_rate": 0.0,
+        }
+
+    def stop(self):
+        self._stop.set()
+
+    def _deliver(self, message):
+        try:
+            for handler in handlers_for(message.topic):
+                handler(message)
+            return None
+        except Exception as exc:
+            logger.warning("Outbox message %s (%s) failed: %s", message.id, message.topic, exc)
+            return exc
+        finally:
+            close_old_connections()
+
+    def process(self, executor, messages):
+        """Deliver ``messages`` and store their outcomes; returns how many were delivered."""
+        max_attempts = getattr(settings, "OUTBOX_MAX_ATTEMPTS", 5)
+        now = timezone.now()
+        counts = {"delivered": 0, "retried": 0, "dead": 0}
+        for message, error in zip(messages, executor.map(self._deliver, messages)):
+            message.attempts += 1
+            if error is None:
+                message.status, message.processed_at, message.last_error = "done", now, ""
+                counts["delivered"] += 1
+            elif message.attempts >= max_attempts:
+                message.status, message.last_error = "dead", str(error)
+                counts["dead"] += 1
+            else:
+                delay = random.uniform(0, min(3600, 2 ** message.attempts))
+                message.status, message.last_error = "pending", str(error)
+                message.available_at = now + timedelta(seconds=delay)
+                counts["retried"] += 1
+        OutboxMessage.objects.bulk_update(
+            messages, ["status", "attempts", "available_at", "last_error", "processed_at"],
+        )
+        with self._lock:
+            for key, value in counts.items():
+                self.stats[key] += value
+        return counts["delivered"]
+
+    def drain_once(self, executor):
+        started = time.monotonic()
+        messages = claim_messages(self.batch_size)
+        if not messages:
+            return 0
+        self.process(executor, messages)
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self.stats["batches"] += 1
+            self.stats["last_batch_seconds"] = round(elapsed, 3)
+            self.stats["last_batch_rate"] = round(len(messages) / elapsed, 2) if elapsed else 0.0
+        return len(messages)
+
+    def run(self, once=False):
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="outbox") as executor:
+            while not self._stop.is_set():
+                recovered = recover_stale()
+                if recovered:
+                    logger.warning("Requeued %d outbox message(s) from a stalled relay", recovered)
+                claimed = self.drain_once(executor)
+                if once and not claimed:
+                    break
+                if not claimed:
+                    self._stop.wait(self.poll_interval)
+        return self.stats["delivered"]
+
+
+# Process-wide instance, so its stats show up in the outbox metrics.
+relay = OutboxRelay()
@@ -0,0 +1,20 @@
+from django.db.models.signals import post_save
+
+from contacts.models import Contact
+from partnerApplications.models import Partners
+from volunteers.models import Volunteer
+
+from .relay import enqueue
+
+SUBMISSIONS = (Contact, Volunteer, Partners)
+
+
+def record_submission(sender, instance, created, raw=False, **kwargs):
+    # Runs inside the caller's transaction, so the message commits (or rolls
+    # back) with the submission itself.
+    if created and not raw:
+        enqueue(f"{sender._meta.label_lower}.created", {"id": instance.pk})
+
+
+for model in SUBMISSIONS:
+    post_save.connect(record_submission, sender=model, dispatch_uid=f"outbox-{model._meta.label_lower}")
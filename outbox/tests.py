@@ -0,0 +1,92 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from backend import throttling
+from contacts.models import Contact
+
+from .metrics import collect
+from .models import OutboxMessage
+from .relay import OutboxRelay, enqueue, lag_seconds, recover_stale
+
+delivered = []
+
+
+def record(message):
+    delivered.append((message.topic, message.payload))
+
+
+def explode(message):
+    raise RuntimeError("CRM is down")
+
+
+class OutboxWriteTests(TestCase):
+    def setUp(self):
+        throttling.get_cache().clear()
+
+    def test_submission_writes_a_message(self):
+        res = APIClient().post("/api/contacts/", {"name": "Amina", "email": "a@example.com", "message": "Hi"},
+                               format="json", secure=True)
+        self.assertEqual(res.status_code, 201)
+        message = OutboxMessage.objects.get()
+        self.assertEqual((message.topic, message.payload), ("contacts.contact.created", {"id": res.data["id"]}))
+
+    def test_message_rolls_back_with_the_submission(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Contact.objects.create(name="Amina", email="a@example.com", message="Hi")
+            raise RuntimeError
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_updates_do_not_write_messages(self):
+        contact = Contact.objects.create(name="Amina", email="a@example.com", message="Hi")
+        contact.status = "Read"
+        contact.save()
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+
+
+class OutboxRelayTests(TestCase):
+    def setUp(self):
+        delivered.clear()
+
+    @override_settings(OUTBOX_HANDLERS={"test.topic": ["outbox.tests.record"]})
+    def test_relay_delivers_in_batches(self):
+        for i in range(5):
+            enqueue("test.topic", {"n": i})
+        relay = OutboxRelay(workers=2, batch_size=2)
+        self.assertEqual(relay.run(once=True), 5)
+        self.assertEqual(sorted(p["n"] for _, p in delivered), [0, 1, 2, 3, 4])
+        self.assertEqual(relay.stats["batches"], 3)
+        self.assertFalse(OutboxMessage.objects.exclude(status="done").exists())
+        self.assertEqual(lag_seconds(), 0.0)
+
+    @override_settings(OUTBOX_HANDLERS={"test.topic": ["outbox.tests.explode"]}, OUTBOX_MAX_ATTEMPTS=2)
+    def test_failures_retry_then_dead_letter(self):
+        message = enqueue("test.topic", {})
+        relay = OutboxRelay(workers=1)
+        relay.run(once=True)
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts, message.last_error), ("pending", 1, "CRM is down"))
+        self.assertGreater(message.available_at, timezone.now() - timedelta(seconds=1))
+
+        OutboxMessage.objects.update(available_at=timezone.now())
+        relay.run(once=True)
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), ("dead", 2))
+        self.assertEqual((relay.stats["retried"], relay.stats["dead"]), (1, 1))
+
+    def test_stalled_claims_are_recovered(self):
+        message = enqueue("test.topic", {})
+        OutboxMessage.objects.update(status="running", claimed_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(recover_stale(), 1)
+        message.refresh_from_db()
+        self.assertEqual(message.status, "pending")
+
+    def test_metrics_report_lag(self):
+        enqueue("test.topic", {})
+        OutboxMessage.objects.update(created_at=timezone.now() - timedelta(minutes=2))
+        metrics = {metric.name: metric for metric in collect()}
+        self.assertGreaterEqual(metrics["outbox_lag_seconds"].samples[0][1], 120)
+        self.assertEqual(metrics["outbox_backlog"].samples[0][1], 1)
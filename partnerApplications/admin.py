@@ -1,8 +1,11 @@
 from django.contrib import admin
+from backend.admin import PerformanceAdminMixin
+from search.admin import FullTextSearchMixin
 from .models import Partners
 
 @admin.register(Partners)
-class PartnersAdmin(admin.ModelAdmin):
+class PartnersAdmin(PerformanceAdminMixin, FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('organization_name', 'contact_person', 'email', 'phone', 'date_applied')
     list_filter = ('date_applied',)
-    search_fields = ('organization_name', 'contact_person', 'email')
\ No newline at end of file
+    search_fields = ('organization_name', 'contact_person', 'email')
+    ordering = ('-date_applied',)
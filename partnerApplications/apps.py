@@ -4,3 +4,7 @@ class PartnerApplicationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'partnerApplications'
 
+    def ready(self):
+        from backend.caching import track_model
+
+        track_model(self.get_model("Partners"))
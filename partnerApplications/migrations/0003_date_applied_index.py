@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('partnerApplications', '0002_alter_partners_address'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='partners',
+            index=models.Index(fields=['date_applied', 'id'], name='partners_date_applied_idx'),
+        ),
+    ]
@@ -9,5 +9,10 @@ class Partners(models.Model):
     message = models.TextField(blank=True, null=True)
     date_applied = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["date_applied", "id"], name="partners_date_applied_idx"),
+        ]
+
     def __str__(self):
         return self.organization_name
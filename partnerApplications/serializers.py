@@ -1,7 +1,8 @@
 from rest_framework import serializers
+from backend.serializers import SparseFieldsMixin
 from .models import Partners
 
-class PartnersSerializer(serializers.ModelSerializer):
+class PartnersSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Partners
         fields = '__all__'
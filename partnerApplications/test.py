@@ -0,0 +1,22 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from .models import Partners
+
+
+class PartnersListTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        for i in range(3):
+            Partners.objects.create(
+                organization_name=f"Org {i}", contact_person="Jane", phone="0700000000", email=f"o{i}@example.com",
+            )
+
+    def test_sparse_fieldset_without_pagination(self):
+        res = self.client.get("/api/partners/?fields=organization_name", secure=True)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data, [{"organization_name": f"Org {i}"} for i in (2, 1, 0)])
+
+    def test_unknown_fields_return_everything(self):
+        res = self.client.get("/api/partners/?fields=nope", secure=True)
+        self.assertIn("email", res.data[0])
@@ -1,10 +1,10 @@
 from rest_framework.decorators import api_view
-from rest_framework.response import Response
+from backend.caching import cache_response
+from backend.pagination import list_response
 from .models import Partners
 from .serializers import PartnersSerializer
 
+@cache_response(Partners)
 @api_view(['GET'])
 def get_partners(request):
-    partners = Partners.objects.all().order_by('-date_applied')
-    serializer = PartnersSerializer(partners, many=True)
-    return Response(serializer.data)
+    return list_response(request, Partners.objects.all(), PartnersSerializer, ordering=('-date_applied', '-id'))
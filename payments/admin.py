@@ -1,14 +1,81 @@
+import json
+
 from django.contrib import admin
-from .models import MpesaPayment, PaypalPayment
+from django.utils.html import format_html
+
+from backend.admin import PerformanceAdminMixin
+
+from .models import DailyPaymentRollup, MpesaPayment, PaypalPayment, StkPushBatch
+
+
+def pretty_payload(value):
+    # Only the change page shows payloads; list pages never load them.
+    return format_html("<pre>{}</pre>", json.dumps(value, indent=2, sort_keys=True, default=str))
+
+class RollupStatusFilter(admin.SimpleListFilter):
+    """
+    Filter by status, offering the statuses seen in the daily rollups rather
+    than running SELECT DISTINCT over the payment table on every page.
+    """
+    title = "status"
+    parameter_name = "status"
+    channel = None
+
+    def lookups(self, request, model_admin):
+        statuses = (DailyPaymentRollup.objects.filter(channel=self.channel)
+                    .order_by("status").values_list("status", flat=True).distinct())
+        return [(status, status) for status in statuses]
+
+    def queryset(self, request, queryset):
+        return queryset.filter(status=self.value()) if self.value() else queryset
+
+class MpesaStatusFilter(RollupStatusFilter):
+    channel = "mpesa"
+
+class PaypalStatusFilter(RollupStatusFilter):
+    channel = "paypal"
+
 # Register your models here.
 @admin.register(MpesaPayment)
-class MpesaPaymentAdmin(admin.ModelAdmin):
+class MpesaPaymentAdmin(PerformanceAdminMixin, admin.ModelAdmin):
     list_display = ("phone", "amount", "status", "checkout_request_id", "created_at")
+    list_filter = (MpesaStatusFilter, "created_at")
+    ordering = ("-created_at",)
     search_fields = ("phone", "checkout_request_id", "merchant_request_id")
-    readonly_fields = ("created_at","updated_at")
+    readonly_fields = ("created_at","updated_at","payload")
+    raw_id_fields = ("batch",)
+
+    @admin.display(description="M-Pesa response")
+    def payload(self, obj):
+        return pretty_payload(obj.mpesa_response)
 
 @admin.register(PaypalPayment)
-class PaypalPaymentAdmin(admin.ModelAdmin):
+class PaypalPaymentAdmin(PerformanceAdminMixin, admin.ModelAdmin):
     list_display = ("order_id", "amount", "currency", "status", "created_at")
+    list_filter = (PaypalStatusFilter, "created_at")
+    ordering = ("-created_at",)
     search_fields = ("order_id",)
-    readonly_fields = ("created_at","updated_at")
+    readonly_fields = ("created_at","updated_at","payload")
+
+    @admin.display(description="Raw payload")
+    def payload(self, obj):
+        return pretty_payload(obj.raw_payload)
+
+@admin.register(StkPushBatch)
+class StkPushBatchAdmin(admin.ModelAdmin):
+    list_display = ("id", "campaign", "total", "created_at")
+    search_fields = ("campaign",)
+    readonly_fields = ("created_at",)
+
+@admin.register(DailyPaymentRollup)
+class DailyPaymentRollupAdmin(admin.ModelAdmin):
+    list_display = ("day", "channel", "currency", "status", "count", "total", "updated_at")
+    list_filter = ("channel", "currency", "status")
+    date_hierarchy = "day"
+
+    # Maintained by payments/rollups.py; fix drift with backfill_payment_rollups.
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
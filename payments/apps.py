@@ -3,3 +3,12 @@ from django.apps import AppConfig
 class PaymentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'payments'
+
+    def ready(self):
+        from backend.metrics import register_collector
+        from . import payloads, rollups
+        from .metrics import collect
+
+        register_collector("payments", collect)
+        rollups.tracker.connect()
+        payloads.connect()
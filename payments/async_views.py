@@ -0,0 +1,148 @@
+"""
+Async versions of the provider-bound payment views, routed in place of the
+DRF views when ``ASGI_MODE`` is on (see ``payments/urls.py``).
+
+They await Safaricom/PayPal on the async HTTP client instead of holding a
+worker thread for the round trip, so one uvicorn worker can keep hundreds
+of pushes in flight. Request and response bodies match the DRF views.
+Steps that need a transaction run through ``sync_to_async``, since the
+async ORM has none.
+"""
+import json
+import math
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from backend import instrumentation, throttling
+
+from .breaker import ProviderUnavailable, get_breaker
+from .idempotency import deduplicator, mpesa_event_key, paypal_event_keys
+from .models import MpesaPayment
+from .mpesa import asend_stk_push
+from .paypal import averify_webhook
+from .serializers import MpesaTransactionSerializer
+from .views import process_mpesa_callback, queue_stk_push, store_paypal_event, unavailable_body
+
+
+def json_response(data, status=200):
+    with instrumentation.timer("render"):
+        return JsonResponse(data, status=status)
+
+
+def unavailable_response(exc):
+    response = json_response(unavailable_body(exc), status=503)
+    response["Retry-After"] = str(exc.retry_after)
+    return response
+
+
+def throttled_response(wait):
+    response = json_response({"detail": f"Request was throttled. Expected available in {math.ceil(wait)} seconds."},
+                             status=429)
+    response["Retry-After"] = str(math.ceil(wait))
+    return response
+
+
+def parse_body(request):
+    """JSON or form data, like DRF's ``request.data``. Raises ValueError on bad JSON."""
+    if request.content_type == "application/json":
+        return json.loads(request.body or b"{}")
+    return request.POST.dict()
+
+
+def any_seen(provider, keys):
+    return any(deduplicator.seen(provider, key) for key in keys)
+
+
+# ----------- M-Pesa STK Push -----------
+@method_decorator(csrf_exempt, name="dispatch")
+class MpesaStkPushView(View):
+    async def post(self, request):
+        try:
+            data = parse_body(request)
+        except ValueError as exc:
+            return json_response({"detail": f"JSON parse error - {exc}"}, status=400)
+        # Same buckets as the DRF view, checked before any validation.
+        throttle = throttling.StkPushThrottle()
+        phone = data.get("phone") if isinstance(data, dict) else None
+        wait = await sync_to_async(throttling.check)(throttle.scope, throttle.get_ident(request), phone)
+        if wait:
+            return throttled_response(wait)
+        serializer = MpesaTransactionSerializer(data=data)
+        if not await sync_to_async(serializer.is_valid)():
+            return json_response(serializer.errors, status=400)
+        phone = serializer.validated_data['phone']
+        amount = serializer.validated_data['amount']
+
+        if getattr(settings, "MPESA_STK_ASYNC", False):
+            return json_response(await sync_to_async(queue_stk_push)(phone, amount), status=202)
+
+        try:
+            get_breaker("mpesa").check()
+        except ProviderUnavailable as exc:
+            return unavailable_response(exc)
+
+        mpesa_obj = await MpesaPayment.objects.acreate(phone=phone, amount=amount, status="pending")
+
+        try:
+            stk_data = await asend_stk_push(mpesa_obj)
+            return json_response({"success": True, "response": stk_data})
+
+        except ProviderUnavailable as exc:
+            mpesa_obj.status = "failed"
+            mpesa_obj.mpesa_response = {"error": str(exc)}
+            await mpesa_obj.asave()
+            return unavailable_response(exc)
+        except Exception as e:
+            mpesa_obj.status = "failed"
+            mpesa_obj.mpesa_response = {"error": str(e)}
+            await mpesa_obj.asave()
+            return json_response({"success": False, "error": str(e)}, status=500)
+
+
+# ----------- M-Pesa Callback -----------
+@method_decorator(csrf_exempt, name="dispatch")
+class MpesaCallbackView(View):
+    async def post(self, request):
+        try:
+            payload = parse_body(request)
+            event_key = mpesa_event_key(payload)
+            if (await sync_to_async(deduplicator.seen)("mpesa", event_key)
+                    or not await sync_to_async(process_mpesa_callback)(payload, event_key)):
+                return json_response({"success": True, "duplicate": True})
+            return json_response({"success": True})
+        except Exception as exc:
+            return json_response({"success": False, "error": str(exc)}, status=400)
+
+
+# ----------- PayPal Webhook Verification -----------
+@method_decorator(csrf_exempt, name="dispatch")
+class PaypalWebhookVerifyView(View):
+    async def post(self, request):
+        raw_body = request.body
+        try:
+            event = parse_body(request)
+        except ValueError as exc:
+            return json_response({"detail": f"JSON parse error - {exc}"}, status=400)
+        headers = request.headers
+        event_keys = paypal_event_keys(event, headers)
+        if await sync_to_async(any_seen)("paypal", event_keys):
+            return json_response({"success": True, "verified": True, "duplicate": True})
+
+        try:
+            verified, verify_data = await averify_webhook(headers, raw_body, event)
+
+            if verified:
+                if not await sync_to_async(store_paypal_event)(event, event_keys):
+                    return json_response({"success": True, "verified": True, "duplicate": True})
+                return json_response({"success": True, "verified": True})
+            else:
+                return json_response({"success": False, "verified": False, "detail": verify_data}, status=400)
+        except ProviderUnavailable as exc:
+            return unavailable_response(exc)
+        except Exception as exc:
+            return json_response({"success": False, "error": str(exc)}, status=500)
@@ -0,0 +1,177 @@
+"""
+Per-provider circuit breaker and bulkhead for outbound payment calls.
+
+Every request made through ``payments.clients`` passes through its
+provider's ``CircuitBreaker``:
+
+* closed -- calls go through; outcomes are kept for ``window`` seconds and
+  the circuit opens once at least ``min_calls`` have been seen and the
+  share of failures (connection errors, timeouts, 5xx, 429) reaches
+  ``failure_rate``;
+* open -- calls fail immediately with ``ProviderUnavailable`` for
+  ``open_seconds``;
+* half-open -- up to ``half_open_calls`` probes go through; a successful
+  probe closes the circuit, a failed one re-opens it.
+
+Independently, at most ``max_concurrent`` calls per provider may be in
+flight in a worker process; extra calls fail fast instead of queueing.
+"""
+import math
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class ProviderUnavailable(Exception):
+    """The provider call was refused locally (open circuit or full bulkhead)."""
+
+    def __init__(self, provider, reason, retry_after=1.0):
+        self.provider = provider
+        self.reason = reason  # circuit_open / bulkhead_full
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(f"{provider} is temporarily unavailable ({reason.replace('_', ' ')})")
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_rate=0.5, min_calls=10, window=30.0, open_seconds=30.0,
+                 half_open_calls=1, max_concurrent=50, clock=time.monotonic):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.max_concurrent = max_concurrent
+        self.clock = clock
+
+        self.state = CLOSED
+        self.in_flight = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._outcomes = deque()  # (timestamp, ok)
+        self._lock = threading.Lock()
+        self.counters = {"opened": 0, "rejected_circuit_open": 0, "rejected_bulkhead_full": 0}
+
+    # ----- public API -----
+    def check(self):
+        """Raise ``ProviderUnavailable`` if a call would be refused right now."""
+        with self._lock:
+            self._refuse_if_open(self.clock())
+
+    def before_call(self):
+        """Admit a call or raise ``ProviderUnavailable``. Returns True for a half-open probe."""
+        with self._lock:
+            now = self.clock()
+            self._refuse_if_open(now)
+            if self.in_flight >= self.max_concurrent:
+                self.counters["rejected_bulkhead_full"] += 1
+                raise ProviderUnavailable(self.name, "bulkhead_full")
+            probe = self.state == HALF_OPEN
+            if probe:
+                self._probes += 1
+            self.in_flight += 1
+            return probe
+
+    def after_call(self, ok, probe=False):
+        """Release a call admitted by ``before_call``; ``ok=None`` records no outcome."""
+        with self._lock:
+            now = self.clock()
+            self.in_flight -= 1
+            if probe:
+                self._probes -= 1
+            if ok is None:
+                return
+            if probe:
+                if ok:
+                    self.state = CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._open(now)
+                return
+            if self.state != CLOSED:
+                return  # Started before the circuit tripped; its result no longer matters.
+            self._outcomes.append((now, ok))
+            self._trim(now)
+            calls = len(self._outcomes)
+            if calls >= self.min_calls:
+                failures = sum(1 for _, success in self._outcomes if not success)
+                if failures / calls >= self.failure_rate:
+                    self._open(now)
+
+    def snapshot(self):
+        with self._lock:
+            now = self.clock()
+            self._trim(now)
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            return {
+                "state": self.state,
+                "in_flight": self.in_flight,
+                "window_calls": len(self._outcomes),
+                "window_failures": failures,
+                **self.counters,
+            }
+
+    def reset(self):
+        with self._lock:
+            self.state = CLOSED
+            self._outcomes.clear()
+            self._probes = 0
+
+    # ----- internals -----
+    def _refuse_if_open(self, now):
+        if self.state == OPEN:
+            remaining = self._opened_at + self.open_seconds - now
+            if remaining > 0:
+                self.counters["rejected_circuit_open"] += 1
+                raise ProviderUnavailable(self.name, "circuit_open", remaining)
+            self.state = HALF_OPEN
+            self._probes = 0
+        if self.state == HALF_OPEN and self._probes >= self.half_open_calls:
+            self.counters["rejected_circuit_open"] += 1
+            raise ProviderUnavailable(self.name, "circuit_open")
+
+    def _open(self, now):
+        self.state = OPEN
+        self._opened_at = now
+        self._outcomes.clear()
+        self.counters["opened"] += 1
+
+    def _trim(self, now):
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            self._outcomes.popleft()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    """The process-wide breaker for provider ``name`` ("mpesa", "paypal")."""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                breaker = _breakers[name] = CircuitBreaker(
+                    name,
+                    failure_rate=getattr(settings, "PAYMENT_BREAKER_FAILURE_RATE", 0.5),
+                    min_calls=getattr(settings, "PAYMENT_BREAKER_MIN_CALLS", 10),
+                    window=getattr(settings, "PAYMENT_BREAKER_WINDOW", 30),
+                    open_seconds=getattr(settings, "PAYMENT_BREAKER_OPEN_SECONDS", 30),
+                    half_open_calls=getattr(settings, "PAYMENT_BREAKER_HALF_OPEN_CALLS", 1),
+                    max_concurrent=getattr(settings, "PAYMENT_BULKHEAD_MAX_CONCURRENT", 50),
+                )
+    return breaker
+
+
+def breaker_stats():
+    return {name: breaker.snapshot() for name, breaker in list(_breakers.items())}
+
+
+def reset_breakers():
+    for breaker in list(_breakers.values()):
+        breaker.reset()
@@ -0,0 +1,104 @@
+"""
+Bulk STK pushes for fundraising campaigns.
+
+``create_batch`` inserts a campaign's payments with ``bulk_create`` (and,
+for the dispatcher, their jobs). ``BulkSender`` pushes a batch directly on a
+thread pool, reusing one cached OAuth token and holding to the shared
+``stk_rate_limiter``, and yields each outcome as it completes.
+"""
+import csv
+import io
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.db import close_old_connections, transaction
+
+from .dispatch import stk_rate_limiter
+from .models import MpesaPayment, StkPushBatch, StkPushJob
+from .mpesa import mpesa_token_manager, send_stk_push
+from .signals import rows_bulk_created
+
+BULK_CREATE_BATCH_SIZE = 500
+
+
+def read_csv(text):
+    """
+    ``phone,amount`` rows as dicts. A header row is optional; when present
+    it may name the columns in any order.
+    """
+    rows = [row for row in csv.reader(io.StringIO(text)) if any(cell.strip() for cell in row)]
+    if not rows:
+        return []
+    header = [cell.strip().lower() for cell in rows[0]]
+    if "phone" in header and "amount" in header:
+        phone_col, amount_col = header.index("phone"), header.index("amount")
+        rows = rows[1:]
+    else:
+        phone_col, amount_col = 0, 1
+    return [
+        {
+            "phone": row[phone_col].strip() if len(row) > phone_col else "",
+            "amount": row[amount_col].strip() if len(row) > amount_col else "",
+        }
+        for row in rows
+    ]
+
+
+def create_batch(items, campaign="", queue=True):
+    """
+    Insert one pending payment per ``{"phone", "amount"}`` item. With
+    ``queue`` each also gets a ``StkPushJob`` for ``run_stk_dispatcher``.
+    """
+    with transaction.atomic():
+        batch = StkPushBatch.objects.create(campaign=campaign, total=len(items))
+        payments = MpesaPayment.objects.bulk_create(
+            [MpesaPayment(phone=item["phone"], amount=item["amount"], status="pending", batch=batch) for item in items],
+            batch_size=BULK_CREATE_BATCH_SIZE,
+        )
+        rows_bulk_created.send(sender=MpesaPayment, objs=payments)
+        if queue:
+            StkPushJob.objects.bulk_create(
+                [StkPushJob(payment=payment) for payment in payments],
+                batch_size=BULK_CREATE_BATCH_SIZE,
+            )
+    return batch, payments
+
+
+def outcome(payment, result, error=""):
+    return {
+        "payment_id": payment.id,
+        "phone": payment.phone,
+        "amount": str(payment.amount),
+        "result": result,  # sent / failed
+        "checkout_request_id": payment.checkout_request_id,
+        "error": error,
+    }
+
+
+class BulkSender:
+    def __init__(self, workers=8, limiter=stk_rate_limiter):
+        self.workers = workers
+        self.limiter = limiter
+
+    def send(self, payments):
+        """Push every payment; yields ``outcome`` dicts in completion order."""
+        if not payments:
+            return
+        # Fetch the token once up front so the workers all hit the cache.
+        mpesa_token_manager.get_token()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="stk-bulk") as pool:
+            futures = [pool.submit(self._push, payment) for payment in payments]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def _push(self, payment):
+        self.limiter.acquire()
+        try:
+            send_stk_push(payment)
+            return outcome(payment, "sent")
+        except Exception as exc:
+            payment.status = "failed"
+            payment.mpesa_response = {"error": str(exc)}
+            payment.save(update_fields=["status", "updated_at"])
+            return outcome(payment, "failed", str(exc))
+        finally:
+            close_old_connections()
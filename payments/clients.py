@@ -0,0 +1,228 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+import weakref
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from backend import instrumentation
+from backend.metrics import LatencyHistogram
+
+from .breaker import get_breaker
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+DEFAULT_TIMEOUT = (3.05, 15)
+
+
+# ----------- Pooled provider client -----------
+class _BaseClient:
+    def __init__(self, name, max_retries=2, backoff_base=0.2, backoff_max=2.0, histograms=None, breaker=None):
+        self.name = name
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.histograms = {} if histograms is None else histograms
+        self.breaker = breaker or get_breaker(name)
+        self._lock = threading.Lock()
+
+    def _attempts(self, method, idempotent):
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        return self.max_retries + 1 if idempotent else 1
+
+    def _backoff(self, attempt):
+        # "Full jitter": spread retries uniformly so callers don't stampede.
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _observe(self, endpoint, started, error=False):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        histogram = self.histograms.get(endpoint)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(endpoint, LatencyHistogram())
+        histogram.observe(elapsed_ms, error=error)
+        instrumentation.record("http", elapsed_ms)
+
+    @staticmethod
+    def healthy(response):
+        # 4xx are our mistakes; only overload and server errors count against the provider.
+        return response.status_code < 500 and response.status_code != 429
+
+    def stats(self):
+        return {endpoint: h.snapshot() for endpoint, h in self.histograms.items()}
+
+
+class ProviderClient(_BaseClient):
+    """
+    A keep-alive ``requests.Session`` for one payment provider.
+
+    Connections are pooled per host, every call is tagged with an endpoint
+    name that selects its ``(connect, read)`` timeout from
+    ``PAYMENT_HTTP_TIMEOUTS`` and the histogram it is recorded in, and
+    idempotent calls are retried with jittered exponential backoff. Every
+    attempt goes through the provider's circuit breaker (``payments.breaker``);
+    pass ``healthy`` to judge responses the default (no 5xx/429) gets wrong.
+    """
+
+    def __init__(self, name, pool_connections=10, pool_maxsize=10, max_retries=2,
+                 backoff_base=0.2, backoff_max=2.0, breaker=None):
+        super().__init__(name, max_retries, backoff_base, backoff_max, breaker=breaker)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, url, endpoint, **kwargs):
+        return self.request("GET", url, endpoint, **kwargs)
+
+    def post(self, url, endpoint, **kwargs):
+        return self.request("POST", url, endpoint, **kwargs)
+
+    def request(self, method, url, endpoint, idempotent=None, healthy=None, **kwargs):
+        method = method.upper()
+        kwargs.setdefault("timeout", get_timeout(endpoint))
+        attempts = self._attempts(method, idempotent)
+        healthy = healthy or self.healthy
+
+        for attempt in range(attempts):
+            last = attempt == attempts - 1
+            probe = self.breaker.before_call()
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self._observe(endpoint, started, error=True)
+                self.breaker.after_call(False, probe)
+                if last:
+                    raise
+            except BaseException:
+                self.breaker.after_call(None, probe)
+                raise
+            else:
+                self._observe(endpoint, started, error=response.status_code >= 500)
+                self.breaker.after_call(healthy(response), probe)
+                if last or response.status_code not in RETRY_STATUSES:
+                    return response
+                response.close()
+            delay = self._backoff(attempt)
+            logger.info("Retrying %s %s in %.2fs (attempt %d)", method, endpoint, delay, attempt + 2)
+            time.sleep(delay)
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncProviderClient(_BaseClient):
+    """
+    ``ProviderClient`` for async views: an ``httpx.AsyncClient`` with the same
+    timeouts, retry policy and (shared) histograms. An instance belongs to
+    the event loop it was created on; use ``get_async_client``.
+    """
+
+    def __init__(self, name, max_connections=100, max_keepalive=20, max_retries=2,
+                 backoff_base=0.2, backoff_max=2.0, histograms=None):
+        super().__init__(name, max_retries, backoff_base, backoff_max, histograms)
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive),
+        )
+
+    async def get(self, url, endpoint, **kwargs):
+        return await self.request("GET", url, endpoint, **kwargs)
+
+    async def post(self, url, endpoint, **kwargs):
+        return await self.request("POST", url, endpoint, **kwargs)
+
+    async def request(self, method, url, endpoint, idempotent=None, healthy=None, **kwargs):
+        method = method.upper()
+        connect, read = get_timeout(endpoint)
+        kwargs.setdefault("timeout", httpx.Timeout(read, connect=connect))
+        attempts = self._attempts(method, idempotent)
+        healthy = healthy or self.healthy
+
+        for attempt in range(attempts):
+            last = attempt == attempts - 1
+            probe = self.breaker.before_call()
+            started = time.perf_counter()
+            try:
+                response = await self.client.request(method, url, **kwargs)
+            except httpx.TransportError:
+                self._observe(endpoint, started, error=True)
+                self.breaker.after_call(False, probe)
+                if last:
+                    raise
+            except BaseException:
+                # Cancelled or a local bug: says nothing about the provider.
+                self.breaker.after_call(None, probe)
+                raise
+            else:
+                self._observe(endpoint, started, error=response.status_code >= 500)
+                self.breaker.after_call(healthy(response), probe)
+                if last or response.status_code not in RETRY_STATUSES:
+                    return response
+            delay = self._backoff(attempt)
+            logger.info("Retrying %s %s in %.2fs (attempt %d)", method, endpoint, delay, attempt + 2)
+            await asyncio.sleep(delay)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+def get_timeout(endpoint):
+    timeouts = getattr(settings, "PAYMENT_HTTP_TIMEOUTS", {})
+    return tuple(timeouts.get(endpoint, timeouts.get("default", DEFAULT_TIMEOUT)))
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(name):
+    """Return the process-wide client for ``name`` ("mpesa", "paypal")."""
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = ProviderClient(
+                    name,
+                    pool_connections=getattr(settings, "PAYMENT_HTTP_POOL_CONNECTIONS", 10),
+                    pool_maxsize=getattr(settings, "PAYMENT_HTTP_POOL_MAXSIZE", 10),
+                    max_retries=getattr(settings, "PAYMENT_HTTP_MAX_RETRIES", 2),
+                    backoff_base=getattr(settings, "PAYMENT_HTTP_BACKOFF", 0.2),
+                )
+    return client
+
+
+# httpx clients can't be shared between event loops, so keep one set per loop.
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client(name):
+    """Return the async client for ``name`` on the running event loop."""
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.setdefault(loop, {})
+    client = clients.get(name)
+    if client is None:
+        client = clients[name] = AsyncProviderClient(
+            name,
+            max_connections=getattr(settings, "PAYMENT_HTTP_ASYNC_MAX_CONNECTIONS", 100),
+            max_keepalive=getattr(settings, "PAYMENT_HTTP_POOL_MAXSIZE", 10),
+            max_retries=getattr(settings, "PAYMENT_HTTP_MAX_RETRIES", 2),
+            backoff_base=getattr(settings, "PAYMENT_HTTP_BACKOFF", 0.2),
+            # Share the sync client's histograms so both modes report together.
+            histograms=get_client(name).histograms,
+        )
+    return client
+
+
+def client_stats():
+    return {name: client.stats() for name, client in list(_clients.items())}
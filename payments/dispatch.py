@@ -0,0 +1,181 @@
+import logging
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from urllib3.exceptions import NewConnectionError
+
+from .breaker import ProviderUnavailable
+from .models import StkPushJob
+from .mpesa import send_stk_push
+from .ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Background pushes (queued and bulk) share one per-process quota.
+stk_rate_limiter = TokenBucket(
+    getattr(settings, "MPESA_STK_RATE_LIMIT", 5),
+    getattr(settings, "MPESA_STK_RATE_BURST", None),
+)
+
+
+# ----------- Queue operations -----------
+def claim_jobs(limit):
+    """
+    Atomically move up to ``limit`` due jobs from queued to running.
+
+    ``skip_locked`` lets several dispatcher processes drain the queue
+    without blocking on (or double-claiming) each other's rows on Postgres.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            StkPushJob.objects.select_for_update(skip_locked=True)
+            .filter(status="queued", available_at__lte=now)
+            .order_by("available_at")
+            .values_list("id", flat=True)[:limit]
+        )
+        if ids:
+            StkPushJob.objects.filter(id__in=ids).update(status="running", claimed_at=now, updated_at=now)
+    return ids
+
+
+def recover_stale(now=None):
+    """
+    Settle jobs left ``running`` by a dispatcher that died mid-batch.
+
+    A job whose payment already has a CheckoutRequestID got its push out
+    before the crash, so it is marked done and the callback or the pending
+    reconciler settles the payment; sending it again would prompt the
+    customer twice. The rest go back to the queue.
+    """
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=getattr(settings, "MPESA_DISPATCH_CLAIM_TIMEOUT", 300))
+    # Jobs claimed before claimed_at existed only have updated_at to go by.
+    stale = StkPushJob.objects.filter(
+        Q(claimed_at__lt=cutoff) | Q(claimed_at__isnull=True, updated_at__lt=cutoff), status="running",
+    )
+    sent = stale.filter(payment__checkout_request_id__isnull=False).update(status="done", updated_at=now)
+    requeued = stale.update(status="queued", updated_at=now)
+    return sent + requeued
+
+
+def is_transient(exc):
+    if isinstance(exc, (requests.ConnectionError, requests.Timeout)):
+        return True
+    response = getattr(exc, "response", None)
+    return response is not None and (response.status_code == 429 or response.status_code >= 500)
+
+
+def never_sent(exc):
+    """
+    Whether ``exc`` shows the push cannot have reached Safaricom: the
+    connection was never made, or it was the OAuth token fetch that failed.
+    """
+    if isinstance(exc, requests.ConnectTimeout):
+        return True
+    request = getattr(exc, "request", None)
+    if request is not None and request.method != "POST":
+        return True
+    reason = getattr(exc.args[0], "reason", None) if isinstance(exc, requests.ConnectionError) and exc.args else None
+    return isinstance(reason, NewConnectionError)  # Refused, or the name did not resolve.
+
+
+def rejected(exc):
+    """Whether Safaricom answered the push with a client error, i.e. did not accept it."""
+    response = getattr(exc, "response", None)
+    return response is not None and 400 <= response.status_code < 500 and response.status_code != 429
+
+
+def run_job(job_id):
+    job = StkPushJob.objects.select_related("payment").get(pk=job_id)
+    payment = job.payment
+    job.attempts += 1
+    stk_rate_limiter.acquire()
+    try:
+        send_stk_push(payment)
+    except ProviderUnavailable as exc:
+        # Refused before leaving the process: wait out the open circuit
+        # without using up one of the job's attempts.
+        job.attempts -= 1
+        job.status = "queued"
+        job.last_error = str(exc)
+        job.available_at = timezone.now() + timedelta(seconds=exc.retry_after)
+    except Exception as exc:
+        max_attempts = getattr(settings, "MPESA_DISPATCH_MAX_ATTEMPTS", 3)
+        job.last_error = str(exc)
+        if not never_sent(exc) and not rejected(exc):
+            # A read timeout, a dropped connection or a 5xx/429 can all follow
+            # Safaricom accepting the push. Sending it again would prompt the
+            # customer twice, and failing the payment would orphan their
+            # callback, so it stays pending for the callback to settle.
+            job.status = "done"
+            logger.warning("STK push for payment %s may have been sent (%s); left pending", payment.id, exc)
+        elif is_transient(exc) and job.attempts < max_attempts:
+            delay = random.uniform(0, 2 ** job.attempts)
+            job.status = "queued"
+            job.available_at = timezone.now() + timedelta(seconds=delay)
+            logger.info("STK push for payment %s failed (%s), retrying in %.1fs", payment.id, exc, delay)
+        else:
+            job.status = "failed"
+            payment.status = "failed"
+            payment.mpesa_response = {"error": str(exc)}
+            payment.save()
+            logger.warning("STK push for payment %s failed permanently: %s", payment.id, exc)
+    else:
+        job.status = "done"
+        job.last_error = ""
+    job.save()
+    return job.status
+
+
+# ----------- Worker pool -----------
+class StkDispatcher:
+    """Polls the job table and runs pushes on a thread pool."""
+
+    def __init__(self, workers=4, batch_size=None, poll_interval=1.0):
+        self.workers = workers
+        self.batch_size = batch_size or workers * 2
+        self.poll_interval = poll_interval
+        self.processed = 0
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self, job_id):
+        try:
+            return run_job(job_id)
+        except Exception:
+            logger.exception("STK dispatch job %s crashed", job_id)
+        finally:
+            close_old_connections()
+
+    def drain_once(self, executor):
+        ids = claim_jobs(self.batch_size)
+        for _ in executor.map(self._run, ids):
+            self.processed += 1
+        return len(ids)
+
+    def run(self, once=False):
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="stk-dispatch") as executor:
+            while not self._stop.is_set():
+                recovered = recover_stale()
+                if recovered:
+                    logger.warning("Recovered %d STK push job(s) from a stalled dispatcher", recovered)
+                claimed = self.drain_once(executor)
+                if once and not claimed:
+                    break
+                if not claimed:
+                    self._stop.wait(self.poll_interval)
+        return self.processed
+
+
+def queue_depth():
+    return StkPushJob.objects.filter(status="queued").count()
@@ -0,0 +1,97 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .models import ProcessedEvent
+
+
+# ----------- Callback / webhook deduplication -----------
+class EventDeduplicator:
+    """
+    Remembers which provider events were already processed.
+
+    ``seen()`` answers from an in-process LRU first and falls back to one
+    indexed lookup on ``ProcessedEvent``. ``claim()`` must run inside the
+    transaction that applies the event: it inserts the marker row, so a
+    concurrent duplicate either loses on the unique constraint or rolls
+    back together with the work it was guarding.
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"lru_hits": 0, "db_hits": 0, "misses": 0, "claims": 0, "races": 0}
+
+    def _count(self, key):
+        with self._lock:
+            self._counters[key] += 1
+
+    def _remember(self, provider, key):
+        with self._lock:
+            self._lru[(provider, key)] = True
+            self._lru.move_to_end((provider, key))
+            while len(self._lru) > self.maxsize:
+                self._lru.popitem(last=False)
+
+    def seen(self, provider, key):
+        if not key:
+            return False
+        with self._lock:
+            if (provider, key) in self._lru:
+                self._lru.move_to_end((provider, key))
+                self._counters["lru_hits"] += 1
+                return True
+        if ProcessedEvent.objects.filter(provider=provider, event_key=key).exists():
+            self._count("db_hits")
+            self._remember(provider, key)
+            return True
+        self._count("misses")
+        return False
+
+    def claim(self, provider, key):
+        """Return ``True`` if this caller is the first to process the event."""
+        if not key:
+            return True
+        try:
+            with transaction.atomic():
+                ProcessedEvent.objects.create(provider=provider, event_key=key)
+        except IntegrityError:
+            self._count("races")
+            self._remember(provider, key)
+            return False
+        self._count("claims")
+        transaction.on_commit(lambda: self._remember(provider, key))
+        return True
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["lru_size"] = len(self._lru)
+        lookups = stats["lru_hits"] + stats["db_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["lru_hits"] + stats["db_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+
+
+deduplicator = EventDeduplicator(maxsize=getattr(settings, "PAYMENTS_DEDUP_LRU_SIZE", 10000))
+
+
+def mpesa_event_key(payload):
+    callback = payload.get("Body", {}).get("stkCallback", payload)
+    return callback.get("CheckoutRequestID") or callback.get("MerchantRequestID")
+
+
+def paypal_event_keys(event, headers):
+    """PayPal keeps the event id across retries; the transmission id is a fallback."""
+    keys = []
+    if isinstance(event, dict) and event.get("id"):
+        keys.append(f"event:{event['id']}")
+    if headers.get("PayPal-Transmission-Id"):
+        keys.append(f"transmission:{headers['PayPal-Transmission-Id']}")
+    return keys
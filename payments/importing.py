@@ -0,0 +1,252 @@
+"""
+Bulk import of provider statements behind ``manage.py import_payments``.
+
+``StatementImport`` streams a CSV with ``csv.DictReader``, parses chunks of
+rows (``payments.statements``) and upserts them in file order, one
+transaction per chunk, with ``bulk_create(update_conflicts=True)`` on
+``checkout_request_id`` or ``order_id``. Parsing runs in this process
+unless ``workers`` asks for a process pool; spawning and pickling cost more
+than they save on ordinary statements (benchmarks/import_payments.py). At
+most a few chunks are in flight, so memory stays flat however large the
+file is.
+
+Existing rows a chunk touches are locked for its transaction, so a callback
+or the reconciler updating one waits its turn instead of being overwritten
+by values read before it ran, and a statement row still ``pending`` never
+undoes a status that has since settled.
+
+After each chunk commits, a JSON checkpoint next to the file records how
+many data rows are done; a rerun skips those rows and carries on. The
+checkpoint is removed once the file has been read to the end.
+
+``bulk_create`` skips the save signals, so each chunk sends
+``rows_bulk_created`` for new payments and ``rows_bulk_updated`` for the
+ones it changed, which keeps the dashboard counters and daily rollups in
+step.
+"""
+import csv
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import MpesaPayment, PaypalPayment
+from .payloads import save_payloads
+from .signals import rows_bulk_created, rows_bulk_updated
+from .statements import detect_format, parse_chunk, resolve_columns
+
+# format: (model, conflict key, payload field, fields an import may set)
+TARGETS = {
+    "mpesa": (MpesaPayment, "checkout_request_id", "mpesa_response",
+              ("phone", "amount", "status", "merchant_request_id")),
+    "paypal": (PaypalPayment, "order_id", "raw_payload", ("payer_id", "amount", "currency", "status")),
+}
+# Required columns a statement may lack, for payments it creates.
+NEW_ROW_DEFAULTS = {"mpesa": {"phone": "unknown"}, "paypal": {}}
+# Status of a payment that has not settled yet, as each format spells it.
+PENDING = {"mpesa": "pending", "paypal": "PENDING"}
+
+
+class CheckpointMismatch(Exception):
+    """The checkpoint was written for a different file or format."""
+
+
+# ----------- Upsert -----------
+def backdate(model, new):
+    """
+    created_at is auto_now_add, so bulk_create stamped new rows with now;
+    set the statement's time afterwards. One parameterised UPDATE run with
+    executemany: ``bulk_update`` builds a CASE over the whole batch, which
+    cost more than the insert itself.
+    """
+    rows = []
+    for obj, created_at in new:
+        if created_at is not None:
+            obj.created_at = created_at
+            rows.append((connection.ops.adapt_datetimefield_value(created_at), obj.pk))
+    if rows:
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"UPDATE {connection.ops.quote_name(model._meta.db_table)} SET created_at = %s "
+                f"WHERE {connection.ops.quote_name(model._meta.pk.column)} = %s",
+                rows,
+            )
+
+
+def upsert(kind, records):
+    """
+    Insert or update one chunk of parsed records in a transaction.
+    Returns ``(created, updated)``.
+    """
+    model, key, payload_field, fields = TARGETS[kind]
+    records = list({record[key]: record for record in records}.values())  # Last row wins.
+    if not records:
+        return 0, 0
+
+    with transaction.atomic():
+        # Locked in pk order, so concurrent imports cannot deadlock on them.
+        existing = {
+            getattr(obj, key): obj
+            for obj in model.objects.select_for_update().filter(**{f"{key}__in": [r[key] for r in records]})
+            .order_by("pk").only(key, "created_at", *fields)
+        }
+        objs, new = [], []
+        for record in records:
+            old = existing.get(record[key])
+            if old is not None and record.get("status") == PENDING[kind] != old.status:
+                record = {**record, "status": old.status}  # Settled since the statement was drawn.
+            obj = model(**{key: record[key]})
+            if old is None:
+                for name, value in NEW_ROW_DEFAULTS[kind].items():
+                    setattr(obj, name, value)
+                setattr(obj, payload_field, record["payload"])
+                new.append((obj, record.get("created_at")))
+            for name in fields:
+                if name in record:
+                    setattr(obj, name, record[name])
+                elif old is not None:
+                    setattr(obj, name, getattr(old, name))  # Columns the statement lacks keep what was stored.
+            objs.append(obj)
+
+        # The payload stays as the callback stored it on existing rows.
+        model.objects.bulk_create(objs, update_conflicts=True, unique_fields=[key],
+                                  update_fields=[*fields, "updated_at"])
+
+        backdate(model, new)
+        save_payloads([obj for obj, _ in new])
+
+        changed = []
+        for obj in objs:
+            old = existing.get(getattr(obj, key))
+            if old is not None and any(getattr(old, name) != getattr(obj, name) for name in fields):
+                for name in fields:
+                    setattr(old, name, getattr(obj, name))
+                changed.append(old)
+        rows_bulk_created.send(sender=model, objs=[obj for obj, _ in new])
+        rows_bulk_updated.send(sender=model, objs=changed)
+    return len(new), len(existing)
+
+
+# ----------- Checkpoints -----------
+def read_checkpoint(path, fingerprint):
+    try:
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return None
+    if {name: state.get(name) for name in fingerprint} != fingerprint:
+        raise CheckpointMismatch(f"{path} was written for a different file; pass --restart to start over")
+    return state
+
+
+def write_checkpoint(path, state):
+    # Written aside and renamed, so an interruption never leaves half a file.
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+# ----------- Pipeline -----------
+class InlineExecutor:
+    """``workers=0``: parse in this process, with the pool's interface."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+class StatementImport:
+    def __init__(self, path, kind=None, batch_size=2000, workers=0, checkpoint_path=None, restart=False):
+        self.path = Path(path)
+        self.batch_size = max(1, batch_size)
+        self.workers = workers
+        self.checkpoint_path = Path(checkpoint_path or f"{self.path}.checkpoint")
+        self.restart = restart
+        self.kind = kind
+        self.totals = {"rows": 0, "created": 0, "updated": 0, "rejected": 0}
+        self.errors = []  # (row number, message), the first ``max_errors``
+        self.max_errors = 50
+        self.resumed_from = 0
+        self.rows_this_run = 0
+        self.started = None
+
+    def fingerprint(self):
+        return {"source": str(self.path.resolve()), "size": self.path.stat().st_size, "format": self.kind}
+
+    def executor(self):
+        if self.workers <= 0:
+            return InlineExecutor()
+        # spawn, not fork: children must not share this process's database connection.
+        return ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    @property
+    def rows_per_sec(self):
+        elapsed = time.monotonic() - self.started if self.started else 0
+        return self.rows_this_run / elapsed if elapsed else 0.0
+
+    def run(self, progress=None):
+        """
+        Import the file; ``progress(self)`` is called after each committed
+        chunk. Returns ``self.totals``.
+        """
+        self.started = time.monotonic()
+        with open(self.path, newline="", encoding="utf-8-sig") as f:
+            reader = csv.DictReader(f)
+            self.kind = self.kind or detect_format(reader.fieldnames)
+            if self.kind is None:
+                raise ValueError("cannot tell the export format from its header; pass --format")
+            columns = resolve_columns(self.kind, reader.fieldnames)
+
+            if self.restart:
+                self.checkpoint_path.unlink(missing_ok=True)
+            state = read_checkpoint(self.checkpoint_path, self.fingerprint())
+            if state:
+                self.totals = {name: state[name] for name in self.totals}
+                self.resumed_from = state["rows"]
+                for _ in islice(reader, self.resumed_from):
+                    pass
+
+            tz_name = settings.TIME_ZONE
+            in_flight = deque()
+            with self.executor() as pool:
+                next_row = self.resumed_from + 1
+                while True:
+                    rows = list(islice(reader, self.batch_size))
+                    if rows:
+                        in_flight.append((len(rows), pool.submit(parse_chunk, self.kind, columns, rows, next_row, tz_name)))
+                        next_row += len(rows)
+                    # Keep the pool busy without reading far ahead of the database.
+                    while in_flight and (not rows or len(in_flight) > max(1, self.workers) * 2):
+                        count, future = in_flight.popleft()
+                        self.commit(count, *future.result())
+                        if progress:
+                            progress(self)
+                    if not rows:
+                        break
+        self.checkpoint_path.unlink(missing_ok=True)
+        return self.totals
+
+    def commit(self, count, records, errors):
+        created, updated = upsert(self.kind, records)
+        self.totals["rows"] += count
+        self.totals["created"] += created
+        self.totals["updated"] += updated
+        self.totals["rejected"] += len(errors)
+        self.errors.extend(errors[: self.max_errors - len(self.errors)])
+        self.rows_this_run += count
+        write_checkpoint(self.checkpoint_path, {**self.fingerprint(), **self.totals})
@@ -0,0 +1,44 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from payments.payloads import MODELS, archive, archive_dir
+
+
+class Command(BaseCommand):
+    help = (
+        "Move the raw payloads of payments older than --older-than days into compressed JSONL "
+        "segment files under PAYMENT_ARCHIVE_DIR, which must be set to persistent storage. "
+        "Archived payloads are still readable on demand."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than", type=int, default=None,
+                            help="Age in days (default PAYMENT_ARCHIVE_AFTER_DAYS).")
+        parser.add_argument("--provider", choices=sorted(MODELS), default=None, help="Only this provider.")
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Payments archived per transaction.")
+
+    def handle(self, *args, **options):
+        days = options["older_than"]
+        if days is None:
+            days = getattr(settings, "PAYMENT_ARCHIVE_AFTER_DAYS", 90)
+        if days < 0:
+            raise CommandError("--older-than must not be negative.")
+        before = timezone.now() - timedelta(days=days)
+        try:
+            archive_dir()
+        except ImproperlyConfigured as exc:
+            raise CommandError(str(exc))
+
+        started = time.monotonic()
+        for provider in [options["provider"]] if options["provider"] else sorted(MODELS):
+            archived, written = archive(provider, before, chunk_size=max(1, options["chunk_size"]))
+            self.stdout.write(f"{provider}: {archived} payload(s) archived, {written / 1024:.1f} KiB of segments")
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived payloads of payments created before {before:%Y-%m-%d %H:%M} "
+            f"in {time.monotonic() - started:.1f}s"
+        ))
@@ -0,0 +1,51 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from payments.models import MpesaPayment, PaypalPayment
+from payments.rollups import backfill
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild DailyPaymentRollup rows from the payment tables, one window of days at a time. "
+        "Writes to a day while it is being rebuilt can be lost, so prefer closed days or quiet hours."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", type=datetime.date.fromisoformat, default=None,
+                            help="First local day (YYYY-MM-DD); defaults to the day of the oldest payment.")
+        parser.add_argument("--end", type=datetime.date.fromisoformat, default=None,
+                            help="Last local day (YYYY-MM-DD); defaults to today.")
+        parser.add_argument("--window-days", type=int, default=31, help="Days rebuilt per transaction.")
+        parser.add_argument("--chunk-size", type=int, default=10000, help="Payment ids aggregated per query.")
+
+    def handle(self, *args, **options):
+        end = options["end"] or timezone.localdate()
+        start = options["start"] or self.oldest_day()
+        if start is None:
+            self.stdout.write(self.style.SUCCESS("No payments to roll up"))
+            return
+        if start > end:
+            raise CommandError("--start must not be after --end.")
+
+        started, rows = time.monotonic(), 0
+        window = datetime.timedelta(days=max(1, options["window_days"]))
+        day = start
+        while day <= end:
+            last = min(end, day + window - datetime.timedelta(days=1))
+            written = backfill(day, last, chunk_size=options["chunk_size"])
+            rows += written
+            self.stdout.write(f"{day}..{last}: {written} rollup row(s)")
+            day = last + datetime.timedelta(days=1)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {start}..{end}: {rows} rollup row(s) in {time.monotonic() - started:.1f}s"
+        ))
+
+    def oldest_day(self):
+        oldest = [m.objects.aggregate(first=Min("created_at"))["first"] for m in (MpesaPayment, PaypalPayment)]
+        oldest = [d for d in oldest if d is not None]
+        return timezone.localdate(min(oldest)) if oldest else None
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.importing import CheckpointMismatch, StatementImport
+
+
+class Command(BaseCommand):
+    help = (
+        "Import a Safaricom statement / Daraja transaction CSV or a PayPal activity export, "
+        "upserting payments by CheckoutRequestID or order id. Resumes from FILE.checkpoint if interrupted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV export to import.")
+        parser.add_argument("--format", choices=("mpesa", "paypal"), default=None,
+                            help="Export format (default: told from the header).")
+        parser.add_argument("--batch-size", type=int, default=2000, help="Rows parsed and upserted per transaction.")
+        parser.add_argument("--workers", type=int, default=0,
+                            help="Parser processes (default 0: parse in this process, usually the fastest).")
+        parser.add_argument("--checkpoint", default=None, help="Checkpoint file (default: PATH.checkpoint).")
+        parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint and start over.")
+        parser.add_argument("--progress-every", type=int, default=50000, help="Report progress every N rows.")
+
+    def handle(self, *args, **options):
+        job = StatementImport(
+            options["path"], kind=options["format"], batch_size=options["batch_size"],
+            workers=options["workers"], checkpoint_path=options["checkpoint"], restart=options["restart"],
+        )
+        every = max(1, options["progress_every"])
+        reported = {"rows": 0}
+
+        def progress(job):
+            if job.rows_this_run - reported["rows"] >= every:
+                reported["rows"] = job.rows_this_run
+                self.stdout.write(f"{job.totals['rows']} rows ({job.rows_per_sec:.0f} rows/s)")
+
+        try:
+            totals = job.run(progress)
+        except (OSError, CheckpointMismatch, ValueError) as exc:
+            raise CommandError(str(exc))
+
+        if job.resumed_from:
+            self.stdout.write(f"Resumed after row {job.resumed_from}")
+        for number, message in job.errors:
+            self.stderr.write(f"row {number}: {message}")
+        if totals["rejected"] > len(job.errors):
+            self.stderr.write(f"... and {totals['rejected'] - len(job.errors)} more rejected row(s)")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {totals['rows']} {job.kind} rows: {totals['created']} created, {totals['updated']} updated, "
+            f"{totals['rejected']} rejected ({job.rows_per_sec:.0f} rows/s)"
+        ))
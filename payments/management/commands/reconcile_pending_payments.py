@@ -0,0 +1,33 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from backend.metrics import serve_metrics
+from payments.reconcile import backlog, reconciler
+
+
+class Command(BaseCommand):
+    help = "Resolve M-Pesa payments stuck in pending (lost callbacks) with the STK Push Query API."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Concurrent STK queries.")
+        parser.add_argument("--batch-size", type=int, default=100, help="Payments loaded and updated per page.")
+        parser.add_argument("--interval", type=float, default=60, help="Seconds between passes.")
+        parser.add_argument("--once", action="store_true", help="Run a single pass and exit.")
+        parser.add_argument("--metrics-port", type=int, default=None, help="Serve Prometheus metrics on this port.")
+
+    def handle(self, *args, **options):
+        reconciler.workers = options["workers"]
+        reconciler.batch_size = options["batch_size"]
+        if options["metrics_port"]:
+            serve_metrics(options["metrics_port"])
+        signal.signal(signal.SIGTERM, lambda *_: reconciler.stop())
+        try:
+            reconciler.run(interval=options["interval"], once=options["once"])
+        except KeyboardInterrupt:
+            reconciler.stop()
+        stats = reconciler.stats
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {stats['checked']} payment(s): {stats['completed']} completed, {stats['failed']} failed, "
+            f"{stats['still_pending']} still pending; backlog {backlog()}"
+        ))
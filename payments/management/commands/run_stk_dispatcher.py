@@ -0,0 +1,29 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from payments.dispatch import StkDispatcher
+
+
+class Command(BaseCommand):
+    help = "Drain queued M-Pesa STK pushes (used when MPESA_STK_ASYNC is enabled)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Concurrent pushes in flight.")
+        parser.add_argument("--batch-size", type=int, default=None, help="Jobs claimed per poll.")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument("--once", action="store_true", help="Exit once the queue is empty.")
+
+    def handle(self, *args, **options):
+        dispatcher = StkDispatcher(
+            workers=options["workers"],
+            batch_size=options["batch_size"],
+            poll_interval=options["poll_interval"],
+        )
+        signal.signal(signal.SIGTERM, lambda *_: dispatcher.stop())
+        try:
+            processed = dispatcher.run(once=options["once"])
+        except KeyboardInterrupt:
+            dispatcher.stop()
+            processed = dispatcher.processed
+        self.stdout.write(self.style.SUCCESS(f"Dispatched {processed} STK push job(s)"))
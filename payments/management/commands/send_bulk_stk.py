@@ -0,0 +1,58 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.bulk import BulkSender, create_batch, read_csv
+from payments.dispatch import stk_rate_limiter
+from payments.ratelimit import TokenBucket
+from payments.serializers import BulkStkPushSerializer
+
+
+class Command(BaseCommand):
+    help = "Send STK pushes to every phone,amount row of a CSV file, streaming one JSON outcome per line."
+
+    def add_arguments(self, parser):
+        parser.add_argument("csv_path", help="CSV of phone,amount rows ('-' reads stdin).")
+        parser.add_argument("--campaign", default="", help="Label stored on the batch.")
+        parser.add_argument("--workers", type=int, default=8, help="Concurrent pushes in flight.")
+        parser.add_argument("--rate", type=float, default=None, help="Pushes per second (default MPESA_STK_RATE_LIMIT).")
+        parser.add_argument("--queue", action="store_true", help="Only queue the pushes for run_stk_dispatcher.")
+        parser.add_argument("--progress-every", type=int, default=100, help="Report progress every N pushes.")
+
+    def handle(self, *args, **options):
+        if options["csv_path"] == "-":
+            text = sys.stdin.read()
+        else:
+            try:
+                with open(options["csv_path"], encoding="utf-8-sig") as f:
+                    text = f.read()
+            except OSError as exc:
+                raise CommandError(str(exc))
+
+        serializer = BulkStkPushSerializer(data={"campaign": options["campaign"], "items": read_csv(text)})
+        if not serializer.is_valid():
+            item_errors = serializer.errors.get("items")
+            if isinstance(item_errors, dict):
+                for index, errors in item_errors.items():
+                    self.stderr.write(f"row {index + 1}: {json.dumps(errors)}")
+                raise CommandError(f"{len(item_errors)} invalid row(s); nothing was sent")
+            raise CommandError(f"Invalid input: {json.dumps(serializer.errors)}")
+
+        items = serializer.validated_data["items"]
+        batch, payments = create_batch(items, serializer.validated_data["campaign"], queue=options["queue"])
+        if options["queue"]:
+            self.stdout.write(self.style.SUCCESS(f"Queued batch {batch.id} with {batch.total} push(es)"))
+            return
+
+        limiter = TokenBucket(options["rate"]) if options["rate"] is not None else stk_rate_limiter
+        sender = BulkSender(workers=options["workers"], limiter=limiter)
+        counts = {"sent": 0, "failed": 0}
+        for done, result in enumerate(sender.send(payments), 1):
+            counts[result["result"]] += 1
+            self.stdout.write(json.dumps(result))
+            if done % options["progress_every"] == 0 or done == len(payments):
+                self.stderr.write(f"batch {batch.id}: {done}/{len(payments)} done ({counts['sent']} sent, {counts['failed']} failed)")
+        self.stderr.write(self.style.SUCCESS(
+            f"Batch {batch.id}: {counts['sent']} sent, {counts['failed']} failed"
+        ))
@@ -0,0 +1,70 @@
+"""Payment subsystem metrics for ``/metrics`` (see ``backend.metrics``)."""
+from backend.metrics import Metric, histogram_metric
+
+from .breaker import breaker_stats
+from .clients import _clients
+from .dispatch import queue_depth
+from .idempotency import deduplicator
+from .mpesa import mpesa_token_manager
+from .paypal import certificate_cache, paypal_token_manager
+from .reconcile import backlog, reconciler
+
+CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+def collect():
+    tokens = Metric("payments_token_events_total", "counter", "OAuth token cache events by provider.")
+    for manager in (mpesa_token_manager, paypal_token_manager):
+        for event, value in manager.stats().items():
+            if event != "expires_in":
+                tokens.add(value, provider=manager.name, event=event)
+
+    dedup = Metric("payments_dedup_events_total", "counter", "Callback/webhook de-duplication lookups.")
+    for event, value in deduplicator.stats().items():
+        if event not in ("lru_size", "hit_rate"):
+            dedup.add(value, event=event)
+
+    certs = Metric("payments_paypal_cert_events_total", "counter", "PayPal signing certificate cache events.")
+    for event, value in certificate_cache.stats().items():
+        if event != "cached":
+            certs.add(value, event=event)
+
+    latency = {}
+    for name, client in list(_clients.items()):
+        for endpoint, histogram in list(client.histograms.items()):
+            latency[(("provider", name), ("endpoint", endpoint))] = histogram
+
+    breaker_state = Metric("payments_circuit_state", "gauge", "Provider circuit state (0 closed, 1 half-open, 2 open).")
+    in_flight = Metric("payments_bulkhead_in_flight", "gauge", "Provider calls in flight in this process.")
+    opened = Metric("payments_circuit_opened_total", "counter", "Times a provider circuit has opened.")
+    rejected = Metric("payments_circuit_rejected_total", "counter", "Provider calls refused locally, by reason.")
+    for name, snapshot in breaker_stats().items():
+        breaker_state.add(CIRCUIT_STATES[snapshot["state"]], provider=name)
+        in_flight.add(snapshot["in_flight"], provider=name)
+        opened.add(snapshot["opened"], provider=name)
+        for reason in ("circuit_open", "bulkhead_full"):
+            rejected.add(snapshot[f"rejected_{reason}"], provider=name, reason=reason)
+
+    stats = reconciler.stats
+    reconcile = Metric("payments_reconcile_total", "counter", "Pending payments checked with STK Push Query, by outcome.")
+    for outcome in ("completed", "failed", "still_pending", "errors"):
+        reconcile.add(stats[outcome], outcome=outcome)
+
+    return [
+        tokens,
+        dedup,
+        certs,
+        histogram_metric("payments_provider_request_duration_seconds", "Outbound provider call latency.", latency),
+        breaker_state,
+        in_flight,
+        opened,
+        rejected,
+        Metric("payments_stk_queue_depth", "gauge", "Queued STK push jobs.").add(queue_depth()),
+        reconcile,
+        Metric("payments_reconcile_cycles_total", "counter", "Completed reconcile passes.").add(stats["cycles"]),
+        Metric("payments_reconcile_last_cycle_seconds", "gauge", "Duration of the last reconcile pass.")
+        .add(stats["last_cycle_seconds"]),
+        Metric("payments_reconcile_last_cycle_rate", "gauge", "Payments checked per second in the last pass.")
+        .add(stats["last_cycle_rate"]),
+        Metric("payments_reconcile_backlog", "gauge", "Pending payments due for an STK query.").add(backlog()),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+CHUNK = 2000
+PAYLOAD_FIELDS = (("mpesa", "MpesaPayment", "mpesa_response"), ("paypal", "PaypalPayment", "raw_payload"))
+
+
+def move_payloads(apps, schema_editor):
+    PaymentPayload = apps.get_model("payments", "PaymentPayload")
+    for provider, model_name, field in PAYLOAD_FIELDS:
+        rows = apps.get_model("payments", model_name).objects.filter(**{f"{field}__isnull": False}).order_by("pk")
+        last_pk = 0
+        while True:
+            chunk = list(rows.filter(pk__gt=last_pk).values_list("pk", field)[:CHUNK])
+            if not chunk:
+                break
+            last_pk = chunk[-1][0]
+            PaymentPayload.objects.bulk_create(
+                [PaymentPayload(provider=provider, payment_id=pk, body=body) for pk, body in chunk]
+            )
+
+
+def restore_payloads(apps, schema_editor):
+    # Payloads already archived to segment files stay there.
+    PaymentPayload = apps.get_model("payments", "PaymentPayload")
+    for provider, model_name, field in PAYLOAD_FIELDS:
+        model = apps.get_model("payments", model_name)
+        rows = PaymentPayload.objects.filter(provider=provider, segment="").order_by("pk")
+        last_pk = 0
+        while True:
+            chunk = list(rows.filter(pk__gt=last_pk).values_list("pk", "payment_id", "body")[:CHUNK])
+            if not chunk:
+                break
+            last_pk = chunk[-1][0]
+            payments = [model(pk=payment_id, **{field: body}) for _, payment_id, body in chunk]
+            model.objects.bulk_update(payments, [field])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0006_dailypaymentrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentPayload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(max_length=16)),
+                ('payment_id', models.BigIntegerField()),
+                ('body', models.JSONField(blank=True, null=True)),
+                ('segment', models.CharField(blank=True, default='', max_length=255)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('provider', 'payment_id'), name='payment_payload_unique')],
+            },
+        ),
+        migrations.RunPython(move_payloads, restore_payloads),
+        migrations.RemoveField(
+            model_name='mpesapayment',
+            name='mpesa_response',
+        ),
+        migrations.RemoveField(
+            model_name='paypalpayment',
+            name='raw_payload',
+        ),
+    ]
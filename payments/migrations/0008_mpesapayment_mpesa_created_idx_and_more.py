@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0007_paymentpayload'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mpesapayment',
+            index=models.Index(fields=['created_at', 'id'], name='mpesa_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paypalpayment',
+            index=models.Index(fields=['status', 'created_at'], name='paypal_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paypalpayment',
+            index=models.Index(fields=['created_at', 'id'], name='paypal_created_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0008_mpesapayment_mpesa_created_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stkpushjob',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,17 +1,54 @@
 from django.db import models
+from django.utils import timezone
+
+def payload_property(provider):
+    """
+    A payment's raw provider JSON, stored in PaymentPayload rather than on the
+    payment row (see payments/payloads.py): read on first access, written
+    after save() when set.
+    """
+    def fget(self):
+        if "_payload" not in self.__dict__:
+            from .payloads import load
+            self._payload = load(provider, self.pk) if self.pk is not None else None
+        return self._payload
+
+    def fset(self, value):
+        self._payload = value
+        self._payload_dirty = True
+
+    return property(fget, fset)
+
 
 # Create your models here.
+class StkPushBatch(models.Model):
+    # A campaign's bulk STK push; its payments point back here
+    campaign = models.CharField(max_length=100, blank=True, default="")
+    total = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"STK batch {self.pk} {self.campaign} ({self.total})"
+
+
 class MpesaPayment(models.Model):
     # STK Push initiated by server
     phone = models.CharField(max_length=13)  # e.g. 2547XXXXXXXX
     amount = models.DecimalField(max_digits=10, decimal_places=2)
-    checkout_request_id = models.CharField(max_length=255, blank=True, null=True)
-    merchant_request_id = models.CharField(max_length=255, blank=True, null=True)
+    checkout_request_id = models.CharField(max_length=255, blank=True, null=True, unique=True)
+    merchant_request_id = models.CharField(max_length=255, blank=True, null=True, db_index=True)
     status = models.CharField(max_length=32, default="pending")  # pending / completed / failed
-    mpesa_response = models.JSONField(null=True, blank=True)
+    mpesa_response = payload_property("mpesa")
+    batch = models.ForeignKey(StkPushBatch, null=True, blank=True, on_delete=models.SET_NULL, related_name="payments")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created_at"], name="mpesa_status_created_idx"),
+            models.Index(fields=["created_at", "id"], name="mpesa_created_idx"),
+        ]
+
     def __str__(self):
         return f"Mpesa {self.phone} {self.amount} ({self.status})"
 
@@ -23,9 +60,86 @@ class PaypalPayment(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     currency = models.CharField(max_length=10, default="USD")
     status = models.CharField(max_length=64, default="pending")  # CREATED / COMPLETED / FAILED
-    raw_payload = models.JSONField(null=True, blank=True)
+    raw_payload = payload_property("paypal")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created_at"], name="paypal_status_created_idx"),
+            models.Index(fields=["created_at", "id"], name="paypal_created_idx"),
+        ]
+
     def __str__(self):
         return f"PayPal {self.order_id} {self.amount} ({self.status})"
+
+
+class PaymentPayload(models.Model):
+    # Raw provider JSON of one payment; ``body`` is emptied once it is archived to ``segment``
+    provider = models.CharField(max_length=16)  # mpesa / paypal
+    payment_id = models.BigIntegerField()
+    body = models.JSONField(null=True, blank=True)
+    segment = models.CharField(max_length=255, blank=True, default="")  # archive file, relative to PAYMENT_ARCHIVE_DIR
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["provider", "payment_id"], name="payment_payload_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.provider} payload {self.payment_id}"
+
+
+class StkPushJob(models.Model):
+    # Queued STK push, drained by `manage.py run_stk_dispatcher`
+    payment = models.OneToOneField(MpesaPayment, on_delete=models.CASCADE, related_name="dispatch_job")
+    status = models.CharField(max_length=16, default="queued")  # queued / running / done / failed
+    attempts = models.PositiveSmallIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)  # when a dispatcher took it
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "available_at"], name="stkjob_status_available_idx"),
+        ]
+
+    def __str__(self):
+        return f"STK job {self.payment_id} ({self.status})"
+
+
+class ProcessedEvent(models.Model):
+    # Callback / webhook already handled, so provider retries can be acked cheaply
+    provider = models.CharField(max_length=16)  # mpesa / paypal
+    event_key = models.CharField(max_length=255)  # CheckoutRequestID, PayPal event or transmission id
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["provider", "event_key"], name="processed_event_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.provider} {self.event_key}"
+
+
+class DailyPaymentRollup(models.Model):
+    # Payments per day, channel, currency and status, kept in step by payments/rollups.py
+    day = models.DateField()
+    channel = models.CharField(max_length=16)  # mpesa / paypal
+    currency = models.CharField(max_length=10)
+    status = models.CharField(max_length=64)
+    count = models.BigIntegerField(default=0)
+    total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "channel", "currency", "status"], name="payment_rollup_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.channel} {self.currency} {self.status}: {self.count} / {self.total}"
@@ -0,0 +1,199 @@
+import base64
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.utils import timezone
+from .clients import ProviderClient, get_async_client, get_client
+from .models import MpesaPayment
+from .tokens import TokenManager
+
+# ----------- Helpers: M-Pesa endpoints & tokens -----------
+def get_mpesa_urls():
+    base = getattr(settings, "MPESA_BASE_URL", "")
+    if not base:
+        base = "https://api.safaricom.co.ke" if getattr(settings, "MPESA_ENV", "sandbox") == "production" else "https://sandbox.safaricom.co.ke"
+    base = base.rstrip("/")
+    return {
+        "oauth": f"{base}/oauth/v1/generate?grant_type=client_credentials",
+        "stkpush": f"{base}/mpesa/stkpush/v1/processrequest",
+        "stkquery": f"{base}/mpesa/stkpushquery/v1/query",
+    }
+
+def fetch_mpesa_token():
+    urls = get_mpesa_urls()
+    consumer_key = settings.MPESA_CONSUMER_KEY
+    consumer_secret = settings.MPESA_CONSUMER_SECRET
+    resp = get_client("mpesa").get(urls["oauth"], "mpesa.oauth", auth=(consumer_key, consumer_secret))
+    resp.raise_for_status()
+    return resp.json()
+
+mpesa_token_manager = TokenManager(
+    "mpesa",
+    fetch_mpesa_token,
+    refresh_margin=getattr(settings, "MPESA_TOKEN_REFRESH_MARGIN", 60),
+    proactive_window=getattr(settings, "MPESA_TOKEN_PROACTIVE_WINDOW", 300),
+    cache_alias=getattr(settings, "MPESA_TOKEN_CACHE_ALIAS", None),
+)
+
+def get_mpesa_token():
+    return mpesa_token_manager.get_token()
+
+def generate_mpesa_password(shortcode, passkey, timestamp):
+    data = f"{shortcode}{passkey}{timestamp}"
+    return base64.b64encode(data.encode()).decode()
+
+def build_stk_payload(phone, amount):
+    shortcode = settings.MPESA_SHORTCODE
+    passkey = settings.MPESA_PASSKEY
+    timestamp = timezone.now().strftime("%Y%m%d%H%M%S")
+    password = generate_mpesa_password(shortcode, passkey, timestamp)
+
+    return {
+        "BusinessShortCode": shortcode,
+        "Password": password,
+        "Timestamp": timestamp,
+        "TransactionType": "CustomerPayBillOnline",
+        "Amount": str(amount),
+        "PartyA": phone,
+        "PartyB": shortcode,
+        "PhoneNumber": phone,
+        "CallBackURL": settings.MPESA_CALLBACK_URL,
+        "AccountReference": "EPICARE",
+        "TransactionDesc": "Donation"
+    }
+
+# ----------- STK Push -----------
+def send_stk_push(mpesa_obj):
+    """
+    Send the STK prompt for ``mpesa_obj`` and store Safaricom's reply on it.
+
+    Raises on any provider error; the caller decides whether to retry or
+    mark the payment failed.
+    """
+    token = get_mpesa_token()
+    urls = get_mpesa_urls()
+    payload = build_stk_payload(mpesa_obj.phone, mpesa_obj.amount)
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+
+    stk_res = get_client("mpesa").post(urls["stkpush"], "mpesa.stkpush", json=payload, headers=headers)
+    if stk_res.status_code == 401:
+        # Token was revoked early; make the next push fetch a new one.
+        mpesa_token_manager.invalidate()
+    stk_res.raise_for_status()
+    stk_data = stk_res.json()
+
+    record_stk_response(mpesa_obj, stk_data)
+    mpesa_obj.save()
+    return stk_data
+
+async def asend_stk_push(mpesa_obj):
+    """``send_stk_push`` on the async HTTP client and async ORM."""
+    token = await mpesa_token_manager.aget_token()
+    urls = get_mpesa_urls()
+    payload = build_stk_payload(mpesa_obj.phone, mpesa_obj.amount)
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+
+    stk_res = await get_async_client("mpesa").post(urls["stkpush"], "mpesa.stkpush", json=payload, headers=headers)
+    if stk_res.status_code == 401:
+        mpesa_token_manager.invalidate()
+    stk_res.raise_for_status()
+    stk_data = stk_res.json()
+
+    record_stk_response(mpesa_obj, stk_data)
+    await mpesa_obj.asave()
+    return stk_data
+
+def record_stk_response(mpesa_obj, stk_data):
+    mpesa_obj.mpesa_response = stk_data
+    mpesa_obj.checkout_request_id = stk_data.get("CheckoutRequestID")
+    mpesa_obj.merchant_request_id = stk_data.get("MerchantRequestID")
+
+# ----------- STK Push Query -----------
+# Safaricom answers a query for a push the customer has not acted on yet
+# with an error instead of a ResultCode.
+STK_QUERY_PROCESSING_CODES = {"500.001.1001"}
+
+def query_stk_push(checkout_id):
+    """
+    Ask Safaricom for the outcome of a push. Returns the query response
+    (with ``ResultCode``), or ``None`` while the push is still in progress.
+    """
+    shortcode = settings.MPESA_SHORTCODE
+    timestamp = timezone.now().strftime("%Y%m%d%H%M%S")
+    payload = {
+        "BusinessShortCode": shortcode,
+        "Password": generate_mpesa_password(shortcode, settings.MPESA_PASSKEY, timestamp),
+        "Timestamp": timestamp,
+        "CheckoutRequestID": checkout_id,
+    }
+    headers = {"Authorization": f"Bearer {get_mpesa_token()}", "Content-Type": "application/json"}
+
+    # A query has no side effects, so it is safe to retry.
+    res = get_client("mpesa").post(get_mpesa_urls()["stkquery"], "mpesa.stkquery", json=payload, headers=headers,
+                                   idempotent=True, healthy=stk_query_healthy)
+    if res.status_code == 401:
+        mpesa_token_manager.invalidate()
+    if still_processing(res):
+        return None
+    res.raise_for_status()
+    return res.json()
+
+def still_processing(res):
+    if res.status_code < 400:
+        return False
+    try:
+        return res.json().get("errorCode") in STK_QUERY_PROCESSING_CODES
+    except ValueError:
+        return False
+
+def stk_query_healthy(res):
+    # Daraja answers "still processing" with a 500; that's not an outage.
+    return ProviderClient.healthy(res) or still_processing(res)
+
+# ----------- Callback reconciliation -----------
+def find_payment_for_callback(checkout_id, merchant_id, for_update=False):
+    """
+    Single indexed lookup by CheckoutRequestID or MerchantRequestID,
+    preferring a CheckoutRequestID match. Returns ``None`` when neither
+    id is present or nothing matches.
+    """
+    lookup = Q()
+    if checkout_id:
+        lookup |= Q(checkout_request_id=checkout_id)
+    if merchant_id:
+        lookup |= Q(merchant_request_id=merchant_id)
+    if not lookup:
+        return None
+
+    qs = MpesaPayment.objects.filter(lookup)
+    if for_update:
+        qs = qs.select_for_update()
+    if checkout_id and merchant_id:
+        qs = qs.order_by(Case(
+            When(checkout_request_id=checkout_id, then=Value(0)),
+            default=Value(1),
+            output_field=IntegerField(),
+        ))
+    return qs.first()
+
+
+def apply_stk_callback(payload):
+    """
+    Record a Safaricom STK callback on its payment. The row is locked for
+    the duration so concurrent duplicate callbacks apply one after another.
+    """
+    callback = payload.get("Body", {}).get("stkCallback", payload)
+    checkout_id = callback.get("CheckoutRequestID")
+    result_code = callback.get("ResultCode", 1)
+    merchant_id = callback.get("MerchantRequestID")
+    new_status = "completed" if int(result_code) == 0 else "failed"
+
+    with transaction.atomic():
+        mpesa_obj = find_payment_for_callback(checkout_id, merchant_id, for_update=True)
+        if mpesa_obj:
+            mpesa_obj.mpesa_response = payload
+            mpesa_obj.status = new_status
+            mpesa_obj.save(update_fields=["status", "updated_at"])
+        else:
+            mpesa_obj = MpesaPayment.objects.create(phone="unknown", amount=0, status="failed", mpesa_response=payload)
+    return mpesa_obj
@@ -0,0 +1,198 @@
+"""
+Raw provider payloads, kept out of the payment tables.
+
+``MpesaPayment.mpesa_response`` and ``PaypalPayment.raw_payload`` are
+properties over ``PaymentPayload``. A payload is read on first access, one
+indexed lookup, and written by a post_save handler when it was set, so
+admin lists and ORM fetches of payments never carry the JSON. Bulk paths
+write with ``save_payloads`` and read with ``prefetch`` or ``bodies``.
+
+``archive`` moves the payloads of payments created before a cutoff into
+compressed JSONL segment files under PAYMENT_ARCHIVE_DIR (zstd when
+``zstandard`` is installed, gzip otherwise), one file per provider, local
+day and chunk. Each row keeps its segment's name and an empty body, so the
+segment is the only copy: the directory must be set explicitly to
+persistent storage, and bodies are only emptied once their segment has
+been synced to disk and read back whole.
+Archived payloads still load, by reading through their segment, which is
+fine for a detail page or an export but not for a list.
+"""
+import gzip
+import json
+import os
+import uuid
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from .models import MpesaPayment, PaymentPayload, PaypalPayment
+
+try:
+    import zstandard
+except ImportError:  # Optional: new segments are gzip without it.
+    zstandard = None
+
+PROVIDERS = {MpesaPayment: "mpesa", PaypalPayment: "paypal"}
+MODELS = {provider: model for model, provider in PROVIDERS.items()}
+
+
+def archive_dir():
+    location = getattr(settings, "PAYMENT_ARCHIVE_DIR", "")
+    if not location:
+        raise ImproperlyConfigured(
+            "PAYMENT_ARCHIVE_DIR is not set; point it at persistent storage before archiving payloads"
+        )
+    return Path(location)
+
+
+# ----------- Reading -----------
+def bodies(provider, ids):
+    """``{payment_id: payload}`` for ``ids``; ids without a stored payload are left out."""
+    found, archived = {}, defaultdict(set)
+    rows = PaymentPayload.objects.filter(provider=provider, payment_id__in=list(ids))
+    for payment_id, body, segment in rows.values_list("payment_id", "body", "segment"):
+        if segment:
+            archived[segment].add(payment_id)
+        else:
+            found[payment_id] = body
+    for segment, wanted in archived.items():
+        found.update(read_segment(segment, wanted))
+    return found
+
+
+def load(provider, payment_id):
+    return bodies(provider, [payment_id]).get(payment_id)
+
+
+def prefetch(objs):
+    """Load the payloads of ``objs`` (payments of either provider) with one query per provider."""
+    pending = defaultdict(list)
+    for obj in objs:
+        if "_payload" not in obj.__dict__ and obj.pk is not None:
+            pending[PROVIDERS[type(obj)]].append(obj)
+    for provider, group in pending.items():
+        found = bodies(provider, [obj.pk for obj in group])
+        for obj in group:
+            obj._payload = found.get(obj.pk)
+    return objs
+
+
+# ----------- Writing -----------
+def save_payloads(objs):
+    """Store the payloads set on ``objs`` since they were loaded; ``save()`` does this by itself."""
+    rows = [
+        PaymentPayload(provider=PROVIDERS[type(obj)], payment_id=obj.pk, body=obj._payload)
+        for obj in objs
+        if obj.__dict__.pop("_payload_dirty", False)
+    ]
+    # A rewrite brings an archived payload back into the table.
+    PaymentPayload.objects.bulk_create(rows, update_conflicts=True, unique_fields=["provider", "payment_id"],
+                                       update_fields=["body", "segment", "updated_at"])
+    return len(rows)
+
+
+def payload_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created and instance.__dict__.get("_payload") is None:
+        instance.__dict__.pop("_payload_dirty", None)
+        instance._payload = None  # Nothing stored; later reads needn't look.
+        return
+    save_payloads([instance])
+
+
+def payload_delete(sender, instance, **kwargs):
+    PaymentPayload.objects.filter(provider=PROVIDERS[sender], payment_id=instance.pk).delete()
+
+
+def connect():
+    for model in PROVIDERS:
+        post_save.connect(payload_save, sender=model, dispatch_uid=f"payloads-save-{model.__name__}")
+        post_delete.connect(payload_delete, sender=model, dispatch_uid=f"payloads-delete-{model.__name__}")
+
+
+# ----------- Segments -----------
+def open_segment(path, mode):
+    if str(path).endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"{path} is zstd-compressed; install zstandard to read it")
+        return zstandard.open(path, mode, encoding="utf-8")
+    return gzip.open(path, mode, encoding="utf-8")
+
+
+def write_segment(name, entries):
+    """Write ``(payment_id, payload)`` pairs to segment ``name``; returns its size in bytes."""
+    path = archive_dir() / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Written aside and renamed, so a segment is either complete or absent.
+    tmp = path.with_name(f".tmp-{path.name}")
+    with open_segment(tmp, "wt") as f:
+        for payment_id, body in entries:
+            f.write(json.dumps({"id": payment_id, "body": body}, cls=DjangoJSONEncoder) + "\n")
+    with open(tmp, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    # And the rename itself, so the segment survives a crash right after.
+    directory = os.open(path.parent, os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+    return path.stat().st_size
+
+
+def read_segment(name, wanted=None):
+    """``{payment_id: payload}`` from segment ``name``, only for ``wanted`` ids if given."""
+    found = {}
+    with open_segment(archive_dir() / name, "rt") as f:
+        for line in f:
+            entry = json.loads(line)
+            if wanted is None or entry["id"] in wanted:
+                found[entry["id"]] = entry["body"]
+    return found
+
+
+def segment_name(provider, day):
+    suffix = "jsonl.zst" if zstandard is not None else "jsonl.gz"
+    return f"{provider}/{day:%Y/%m}/{day.isoformat()}-{uuid.uuid4().hex[:12]}.{suffix}"
+
+
+# ----------- Archival -----------
+def archive(provider, before, chunk_size=5000):
+    """
+    Move the payloads of ``provider`` payments created before ``before`` into
+    segment files. Returns ``(payloads archived, bytes written)``.
+    """
+    payments = MODELS[provider].objects.filter(created_at__lt=before).order_by("pk")
+    archived = written = 0
+    last_pk = 0
+    while True:
+        chunk = list(payments.filter(pk__gt=last_pk).values_list("pk", "created_at")[:chunk_size])
+        if not chunk:
+            return archived, written
+        last_pk = chunk[-1][0]
+        days = {pk: timezone.localdate(created_at) for pk, created_at in chunk}
+
+        with transaction.atomic():
+            # Locked, so a payload rewritten meanwhile is not emptied unarchived.
+            hot = (PaymentPayload.objects.select_for_update()
+                   .filter(provider=provider, payment_id__in=list(days), segment=""))
+            by_day = defaultdict(list)
+            for payment_id, body in hot.values_list("payment_id", "body"):
+                by_day[days[payment_id]].append((payment_id, body))
+            for day, entries in sorted(by_day.items()):
+                name = segment_name(provider, day)
+                written += write_segment(name, entries)
+                # The bodies are only emptied once the segment can stand in for them.
+                if read_segment(name) != dict(entries):
+                    (archive_dir() / name).unlink(missing_ok=True)
+                    raise RuntimeError(f"segment {name} did not read back as written; nothing was archived")
+                PaymentPayload.objects.filter(provider=provider, payment_id__in=[pk for pk, _ in entries]).update(
+                    body=None, segment=name, updated_at=timezone.now())
+                archived += len(entries)
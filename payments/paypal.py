@@ -0,0 +1,294 @@
+import base64
+import datetime
+import hashlib
+import logging
+import threading
+import zlib
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+from urllib.parse import urlparse
+
+from asgiref.sync import sync_to_async
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+from django.conf import settings
+
+from .clients import get_async_client, get_client
+from .tokens import TokenManager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CERT_HOSTS = (
+    "api.paypal.com",
+    "api-m.paypal.com",
+    "api.sandbox.paypal.com",
+    "api-m.sandbox.paypal.com",
+)
+
+
+class VerificationError(Exception):
+    """The webhook signature is present but does not verify."""
+
+
+class VerificationUnavailable(Exception):
+    """Local verification could not be attempted (missing headers, cert fetch failed...)."""
+
+
+# ----------- Helpers: PayPal endpoints & tokens -----------
+def get_paypal_base():
+    base = getattr(settings, "PAYPAL_BASE_URL", "")
+    if base:
+        return base.rstrip("/")
+    return "https://api.paypal.com" if getattr(settings, "PAYPAL_ENV", "sandbox") == "production" else "https://api.sandbox.paypal.com"
+
+def fetch_paypal_token():
+    res = get_client("paypal").post(
+        f"{get_paypal_base()}/v1/oauth2/token",
+        "paypal.oauth",
+        auth=(settings.PAYPAL_CLIENT_ID, getattr(settings, "PAYPAL_CLIENT_SECRET", settings.PAYPAL_SECRET)),
+        data={"grant_type": "client_credentials"},
+        idempotent=True,
+    )
+    res.raise_for_status()
+    return res.json()
+
+paypal_token_manager = TokenManager("paypal", fetch_paypal_token)
+
+
+# ----------- Certificate cache -----------
+class CertificateCache:
+    """
+    PayPal signing certificates keyed by ``PayPal-Cert-Url``.
+
+    Certificates are only downloaded over https from an allow-listed host,
+    kept in memory and in ``cache_dir`` (so restarts and sibling workers skip
+    the download) and dropped once past their ``notAfter`` date.
+    """
+
+    def __init__(self, cache_dir=None, allowed_hosts=DEFAULT_CERT_HOSTS, fetch=None):
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.allowed_hosts = set(allowed_hosts)
+        self.fetch = fetch or self._download
+        self._certs = {}
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "downloads": 0}
+
+    def check_url(self, url):
+        parsed = urlparse(url or "")
+        if parsed.scheme != "https" or parsed.hostname not in self.allowed_hosts:
+            raise VerificationError(f"Certificate URL not allowed: {url!r}")
+
+    def get(self, url):
+        self.check_url(url)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        cert = self._certs.get(url)
+        if cert is not None and cert.not_valid_after_utc > now:
+            self._counters["memory_hits"] += 1
+            return cert
+
+        with self._lock:
+            cert = self._certs.get(url)
+            if cert is None or cert.not_valid_after_utc <= now:
+                cert = self._load_disk(url, now)
+            if cert is None:
+                cert = self.store(url, self.fetch(url))
+                self._counters["downloads"] += 1
+        if cert.not_valid_after_utc <= now or cert.not_valid_before_utc > now:
+            raise VerificationError(f"Certificate {url!r} is not currently valid")
+        return cert
+
+    def store(self, url, pem):
+        cert = x509.load_pem_x509_certificate(pem)
+        self._certs[url] = cert
+        if self.cache_dir is not None:
+            try:
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                self._path(url).write_bytes(pem)
+            except OSError as exc:
+                logger.warning("Could not write PayPal certificate cache: %s", exc)
+        return cert
+
+    def stats(self):
+        return dict(self._counters, cached=len(self._certs))
+
+    def _path(self, url):
+        return self.cache_dir / (hashlib.sha256(url.encode()).hexdigest() + ".pem")
+
+    def _load_disk(self, url, now):
+        if self.cache_dir is None:
+            return None
+        try:
+            cert = x509.load_pem_x509_certificate(self._path(url).read_bytes())
+        except (OSError, ValueError):
+            return None
+        if cert.not_valid_after_utc <= now:
+            return None
+        self._certs[url] = cert
+        self._counters["disk_hits"] += 1
+        return cert
+
+    @staticmethod
+    def _download(url):
+        try:
+            res = get_client("paypal").get(url, "paypal.cert")
+            res.raise_for_status()
+        except Exception as exc:
+            raise VerificationUnavailable(f"Could not download certificate: {exc}") from exc
+        return res.content
+
+
+certificate_cache = CertificateCache(
+    cache_dir=getattr(settings, "PAYPAL_CERT_CACHE_DIR", None),
+    allowed_hosts=getattr(settings, "PAYPAL_CERT_HOSTS", DEFAULT_CERT_HOSTS),
+)
+
+
+# ----------- Webhook verification -----------
+def expected_message(transmission_id, transmission_time, webhook_id, raw_body):
+    crc = zlib.crc32(raw_body) & 0xFFFFFFFF
+    return f"{transmission_id}|{transmission_time}|{webhook_id}|{crc}".encode()
+
+
+def verify_webhook_locally(headers, raw_body, webhook_id, cache=None):
+    """
+    Check a webhook's SHA256withRSA transmission signature without calling
+    PayPal. Raises ``VerificationError`` on a bad signature and
+    ``VerificationUnavailable`` when the check cannot be made.
+    """
+    cache = cache or certificate_cache
+    transmission_id = headers.get("PayPal-Transmission-Id")
+    transmission_time = headers.get("PayPal-Transmission-Time")
+    signature = headers.get("PayPal-Transmission-Sig")
+    auth_algo = headers.get("PayPal-Auth-Algo")
+    cert_url = headers.get("PayPal-Cert-Url")
+
+    if not all([transmission_id, transmission_time, signature, cert_url, webhook_id]):
+        raise VerificationUnavailable("Missing PayPal transmission headers or PAYPAL_WEBHOOK_ID")
+    if auth_algo and auth_algo.upper() != "SHA256WITHRSA":
+        raise VerificationUnavailable(f"Unsupported PayPal-Auth-Algo {auth_algo!r}")
+
+    cert = cache.get(cert_url)
+    message = expected_message(transmission_id, transmission_time, webhook_id, raw_body)
+    try:
+        cert.public_key().verify(base64.b64decode(signature), message, padding.PKCS1v15(), hashes.SHA256())
+    except (InvalidSignature, ValueError) as exc:
+        raise VerificationError("PayPal transmission signature mismatch") from exc
+    return True
+
+
+def _remote_verify_payload(headers, event, webhook_id):
+    return {
+        "transmission_id": headers.get("PayPal-Transmission-Id"),
+        "transmission_time": headers.get("PayPal-Transmission-Time"),
+        "cert_url": headers.get("PayPal-Cert-Url"),
+        "auth_algo": headers.get("PayPal-Auth-Algo"),
+        "transmission_sig": headers.get("PayPal-Transmission-Sig"),
+        "webhook_id": webhook_id,
+        "webhook_event": event,
+    }
+
+
+def verify_webhook_remote(headers, event, webhook_id):
+    verify_res = get_client("paypal").post(
+        f"{get_paypal_base()}/v1/notifications/verify-webhook-signature",
+        "paypal.verify",
+        headers={"Content-Type": "application/json", "Authorization": f"Bearer {paypal_token_manager.get_token()}"},
+        json=_remote_verify_payload(headers, event, webhook_id),
+        idempotent=True,
+    )
+    if verify_res.status_code == 401:
+        paypal_token_manager.invalidate()
+    verify_res.raise_for_status()
+    return verify_res.json()
+
+
+async def averify_webhook_remote(headers, event, webhook_id):
+    token = await paypal_token_manager.aget_token()
+    verify_res = await get_async_client("paypal").post(
+        f"{get_paypal_base()}/v1/notifications/verify-webhook-signature",
+        "paypal.verify",
+        headers={"Content-Type": "application/json", "Authorization": f"Bearer {token}"},
+        json=_remote_verify_payload(headers, event, webhook_id),
+        idempotent=True,
+    )
+    if verify_res.status_code == 401:
+        paypal_token_manager.invalidate()
+    verify_res.raise_for_status()
+    return verify_res.json()
+
+
+def webhook_order_id(event):
+    """The PayPal order a webhook event belongs to (falls back to the event id)."""
+    resource = event.get("resource") or {}
+    related = (resource.get("supplementary_data") or {}).get("related_ids") or {}
+    return related.get("order_id") or resource.get("id") or event.get("id") or ""
+
+
+def payload_amount(payload):
+    """
+    ``(amount, currency)`` from a webhook event or order payload: a capture's
+    ``amount``, an order's first purchase unit, or a v1 sale's ``total``.
+    Either part is ``None`` when it can't be found.
+    """
+    resource = payload.get("resource", payload) if isinstance(payload, dict) else {}
+    amount = resource.get("amount") if isinstance(resource, dict) else None
+    if not amount and isinstance(resource, dict):
+        units = resource.get("purchase_units") or [{}]
+        amount = units[0].get("amount") if isinstance(units[0], dict) else None
+    if not isinstance(amount, dict):
+        return None, None
+    currency = amount.get("currency_code") or amount.get("currency")
+    try:
+        value = Decimal(str(amount.get("value", amount.get("total"))))
+    except InvalidOperation:
+        return None, currency
+    return (value if value.is_finite() else None), currency
+
+
+def verify_webhook(headers, raw_body, event):
+    """
+    Returns ``(verified, detail)``. ``PAYPAL_WEBHOOK_VERIFY_MODE`` picks the
+    strategy: "local", "remote", or "local_with_fallback" (local, using the
+    remote API only when the local check cannot be made).
+    """
+    mode = getattr(settings, "PAYPAL_WEBHOOK_VERIFY_MODE", "local_with_fallback")
+    webhook_id = getattr(settings, "PAYPAL_WEBHOOK_ID", None)
+
+    if mode != "remote":
+        result = _verify_local_result(headers, raw_body, webhook_id, mode)
+        if result is not None:
+            return result
+
+    verify_data = verify_webhook_remote(headers, event, webhook_id)
+    return verify_data.get("verification_status") == "SUCCESS", verify_data
+
+
+async def averify_webhook(headers, raw_body, event):
+    """``verify_webhook`` for async views; the remote call uses the async client."""
+    mode = getattr(settings, "PAYPAL_WEBHOOK_VERIFY_MODE", "local_with_fallback")
+    webhook_id = getattr(settings, "PAYPAL_WEBHOOK_ID", None)
+
+    if mode != "remote":
+        # May download the signing cert on a cold cache, so keep it off the loop.
+        result = await sync_to_async(_verify_local_result, thread_sensitive=False)(headers, raw_body, webhook_id, mode)
+        if result is not None:
+            return result
+
+    verify_data = await averify_webhook_remote(headers, event, webhook_id)
+    return verify_data.get("verification_status") == "SUCCESS", verify_data
+
+
+def _verify_local_result(headers, raw_body, webhook_id, mode):
+    """``(verified, detail)`` from the local check, or ``None`` to fall back to the API."""
+    try:
+        verify_webhook_locally(headers, raw_body, webhook_id)
+        return True, {"verification_status": "SUCCESS", "method": "local"}
+    except VerificationError as exc:
+        return False, {"verification_status": "FAILURE", "method": "local", "error": str(exc)}
+    except VerificationUnavailable as exc:
+        if mode == "local":
+            return False, {"verification_status": "FAILURE", "method": "local", "error": str(exc)}
+        logger.info("Local PayPal verification unavailable (%s); using remote API", exc)
+    return None
@@ -0,0 +1,42 @@
+import threading
+import time
+
+
+# ----------- Token bucket -----------
+class TokenBucket:
+    """
+    Allows ``rate`` operations per second with bursts of up to ``burst``.
+
+    Shared by every thread in the process; with several dispatcher
+    processes, split the provider quota between them.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or max(rate, 1))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self):
+        """Take a token if one is available; otherwise return the seconds until one is."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        """Block until a token is available. A rate of 0 disables the limit."""
+        if self.rate <= 0:
+            return
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            time.sleep(wait)
@@ -0,0 +1,158 @@
+"""
+Re-check M-Pesa payments whose callback never arrived.
+
+``PendingReconciler`` walks payments still pending after
+``MPESA_RECONCILE_AFTER_SECONDS`` (via the ``(status, created_at)`` index,
+in keyset pages so rows that stay unresolved never block newer ones),
+asks the STK Push Query API about each page on a bounded thread pool that
+shares the cached OAuth token, and writes the outcomes back with one
+``bulk_update`` per page.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import MpesaPayment
+from .mpesa import mpesa_token_manager, query_stk_push
+from .payloads import save_payloads
+from .signals import rows_bulk_updated
+
+logger = logging.getLogger(__name__)
+
+
+def stale_pending(now=None):
+    """Pending payments with a CheckoutRequestID inside the reconcile window."""
+    now = now or timezone.now()
+    after = timedelta(seconds=getattr(settings, "MPESA_RECONCILE_AFTER_SECONDS", 120))
+    max_age = timedelta(hours=getattr(settings, "MPESA_RECONCILE_MAX_AGE_HOURS", 48))
+    return MpesaPayment.objects.filter(
+        status="pending",
+        created_at__lt=now - after,
+        created_at__gte=now - max_age,
+        checkout_request_id__isnull=False,
+    )
+
+
+def backlog():
+    return stale_pending().count()
+
+
+def result_status(result):
+    return "completed" if str(result.get("ResultCode")) == "0" else "failed"
+
+
+class PendingReconciler:
+    def __init__(self, workers=4, batch_size=100):
+        self.workers = workers
+        self.batch_size = batch_size
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.stats = {
+            "cycles": 0,
+            "checked": 0,
+            "completed": 0,
+            "failed": 0,
+            "still_pending": 0,
+            "errors": 0,
+            "last_cycle_seconds": 0.0,
+            "last_cycle_rate": 0.0,
+        }
+
+    def stop(self):
+        self._stop.set()
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def _query(self, payment):
+        """``(payment, result)``; result is None while in progress and False on error."""
+        try:
+            return payment, query_stk_push(payment.checkout_request_id)
+        except Exception as exc:
+            logger.info("STK query for payment %s failed: %s", payment.id, exc)
+            return payment, False
+        finally:
+            close_old_connections()
+
+    def reconcile_page(self, executor, payments):
+        resolved = []
+        for payment, result in executor.map(self._query, payments):
+            if result is False:
+                self._count("errors")
+            elif result is None:
+                self._count("still_pending")
+            else:
+                payment.status = result_status(result)
+                payment.mpesa_response = result
+                resolved.append(payment)
+        self._count("checked", len(payments))
+        if not resolved:
+            return 0
+
+        now = timezone.now()
+        with transaction.atomic():
+            # A callback may have landed while we were querying; it wins.
+            still_pending = set(
+                MpesaPayment.objects.select_for_update()
+                .filter(id__in=[p.id for p in resolved], status="pending")
+                .values_list("id", flat=True)
+            )
+            resolved = [p for p in resolved if p.id in still_pending]
+            for payment in resolved:
+                payment.updated_at = now
+            MpesaPayment.objects.bulk_update(resolved, ["status", "updated_at"])
+            save_payloads(resolved)
+            rows_bulk_updated.send(sender=MpesaPayment, objs=resolved)
+        for payment in resolved:
+            self._count(payment.status)
+        return len(resolved)
+
+    def run_once(self):
+        """One pass over every stale pending payment; returns how many were resolved."""
+        started = time.monotonic()
+        checked_before = self.stats["checked"]
+        resolved = 0
+        queryset = stale_pending().order_by("created_at", "id")
+        cursor = None
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="stk-reconcile") as executor:
+            while not self._stop.is_set():
+                page = queryset
+                if cursor is not None:
+                    created_at, pk = cursor
+                    page = page.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk))
+                payments = list(page[:self.batch_size])
+                if not payments:
+                    break
+                if cursor is None:
+                    # One token fetch up front; the workers then share the cache.
+                    mpesa_token_manager.get_token()
+                cursor = (payments[-1].created_at, payments[-1].id)
+                resolved += self.reconcile_page(executor, payments)
+
+        elapsed = time.monotonic() - started
+        checked = self.stats["checked"] - checked_before
+        with self._lock:
+            self.stats["cycles"] += 1
+            self.stats["last_cycle_seconds"] = round(elapsed, 3)
+            self.stats["last_cycle_rate"] = round(checked / elapsed, 2) if elapsed and checked else 0.0
+        return resolved
+
+    def run(self, interval=60, once=False):
+        while not self._stop.is_set():
+            resolved = self.run_once()
+            logger.info("Reconciled %d pending M-Pesa payment(s)", resolved)
+            if once:
+                break
+            self._stop.wait(interval)
+
+
+# Process-wide instance, so its stats show up in the payments metrics.
+reconciler = PendingReconciler()
@@ -0,0 +1,149 @@
+"""
+Daily payment rollups behind ``GET /api/payments/stats/``.
+
+Each ``DailyPaymentRollup`` row holds the count and summed amount of the
+payments created on one (local) day for a channel, currency and status.
+Saves, deletes and the bulk paths adjust the affected rows by delta in
+the writer's transaction (``backend.deltas``, shared with
+``dashboard.counters``), so a payment moving from pending to completed
+shifts one unit between two rows. ``backfill_payment_rollups`` rebuilds a date range from the
+payment tables in pk-range chunks.
+
+M-Pesa is always KES. PayPal amounts are read from the ``amount`` column,
+which webhooks now fill from the payload; the backfill also lifts them
+out of the stored payload for older rows.
+"""
+from datetime import datetime, time as dt_time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from backend.deltas import ZERO, DeltaTracker, merge
+
+from .models import DailyPaymentRollup, MpesaPayment, PaypalPayment
+from .payloads import prefetch
+from .paypal import payload_amount
+
+CENTS = Decimal("0.01")
+DIMENSIONS = ("day", "channel", "currency", "status")
+CHANNELS = {MpesaPayment: "mpesa", PaypalPayment: "paypal"}
+MPESA_CURRENCY = "KES"
+
+# Fields whose change moves a payment between rollup rows.
+TRACKED_FIELDS = {
+    MpesaPayment: ("status", "amount", "created_at"),
+    PaypalPayment: ("status", "amount", "currency", "created_at"),
+}
+
+
+# ----------- What each payment contributes -----------
+def rollup_key(obj):
+    currency = MPESA_CURRENCY if isinstance(obj, MpesaPayment) else obj.currency
+    return (timezone.localdate(obj.created_at), CHANNELS[type(obj)], currency, obj.status)
+
+
+def contributions(obj):
+    if obj.created_at is None:
+        return {}
+    return {rollup_key(obj): (1, obj.amount or ZERO)}
+
+
+def apply_deltas(deltas):
+    # Sorted, so concurrent writers lock the rollup rows in one order and
+    # cannot deadlock each other.
+    for (day, channel, currency, status), (count, total) in sorted(deltas.items()):
+        lookup = {"day": day, "channel": channel, "currency": currency, "status": status}
+        change = {"count": F("count") + count, "total": F("total") + total, "updated_at": timezone.now()}
+        if not DailyPaymentRollup.objects.filter(**lookup).update(**change):
+            DailyPaymentRollup.objects.get_or_create(**lookup)
+            DailyPaymentRollup.objects.filter(**lookup).update(**change)
+
+
+# Connected in PaymentsConfig.ready.
+tracker = DeltaTracker("rollup", TRACKED_FIELDS, contributions, apply_deltas)
+
+
+# ----------- Backfill -----------
+def day_bounds(start, end):
+    """Aware datetimes covering the local days ``start`` through ``end``."""
+    tz = timezone.get_current_timezone()
+    return (timezone.make_aware(datetime.combine(start, dt_time.min), tz),
+            timezone.make_aware(datetime.combine(end + timedelta(days=1), dt_time.min), tz))
+
+
+def fill_paypal_amounts(since, until, chunk_size=1000):
+    """
+    Copy amount/currency out of the payload for PayPal rows created in
+    [since, until) that lack them; returns how many were filled.
+    """
+    pending = PaypalPayment.objects.filter(amount__isnull=True, created_at__gte=since, created_at__lt=until)
+    filled = 0
+    last_pk = 0
+    while True:
+        rows = prefetch(list(pending.filter(pk__gt=last_pk).order_by("pk").only("pk", "currency")[:chunk_size]))
+        if not rows:
+            return filled
+        last_pk = rows[-1].pk
+        changed = []
+        for row in rows:
+            amount, currency = payload_amount(row.raw_payload)
+            if amount is not None:
+                row.amount, row.currency = amount, currency or row.currency
+                changed.append(row)
+        # No rollup deltas: backfill() rebuilds these days right after.
+        PaypalPayment.objects.bulk_update(changed, ["amount", "currency"])
+        filled += len(changed)
+
+
+def aggregate(model, since, until, chunk_size):
+    """Rollup totals for ``model`` rows created in [since, until), read in pk-range chunks."""
+    rows = model.objects.filter(created_at__gte=since, created_at__lt=until)
+    bounds = rows.aggregate(lo=Min("pk"), hi=Max("pk"))
+    totals = {}
+    if bounds["lo"] is None:
+        return totals
+    group = ("day", "status", "currency") if model is PaypalPayment else ("day", "status")
+    for lo in range(bounds["lo"], bounds["hi"] + 1, chunk_size):
+        chunk = rows.filter(pk__gte=lo, pk__lt=lo + chunk_size).annotate(day=TruncDate("created_at"))
+        for row in chunk.values(*group).annotate(n=Count("pk"), summed=Sum("amount")).order_by():
+            key = (row["day"], CHANNELS[model], row.get("currency", MPESA_CURRENCY), row["status"])
+            merge(totals, {key: (row["n"], row["summed"] or ZERO)})
+    return totals
+
+
+def backfill(start, end, chunk_size=10000):
+    """
+    Recompute the rollups for local days ``start``..``end`` from the payment
+    tables and replace the stored rows; returns how many rollup rows were written.
+    """
+    since, until = day_bounds(start, end)
+    fill_paypal_amounts(since, until)
+    totals = {}
+    for model in CHANNELS:
+        merge(totals, aggregate(model, since, until, chunk_size))
+    with transaction.atomic():
+        DailyPaymentRollup.objects.filter(day__gte=start, day__lte=end).delete()
+        DailyPaymentRollup.objects.bulk_create([
+            DailyPaymentRollup(day=day, channel=channel, currency=currency, status=status, count=count, total=total)
+            for (day, channel, currency, status), (count, total) in totals.items()
+        ], batch_size=1000)
+    return len(totals)
+
+
+# ----------- Read side -----------
+def stats(start, end, group_by=DIMENSIONS):
+    """Summed rollup rows for ``start``..``end``, grouped by ``group_by``."""
+    rows = (
+        DailyPaymentRollup.objects.filter(day__gte=start, day__lte=end)
+        .values(*group_by)
+        .annotate(payments=Sum("count"), amount=Sum("total"))
+        .filter(payments__gt=0)
+        .order_by(*group_by)
+    )
+    return [
+        {**{name: row[name] for name in group_by}, "count": row["payments"], "total": str(row["amount"].quantize(CENTS))}
+        for row in rows
+    ]
@@ -1,9 +1,17 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
 from .models import MpesaPayment, PaypalPayment
+from .rollups import DIMENSIONS
 
 
 # ----------- M-Pesa Transaction Serializer -----------
 class MpesaTransactionSerializer(serializers.ModelSerializer):
+    mpesa_response = serializers.JSONField(required=False, allow_null=True)
+
     class Meta:
         model = MpesaPayment
         fields = '__all__'
@@ -11,6 +19,46 @@ class MpesaTransactionSerializer(serializers.ModelSerializer):
 
 # ----------- PayPal Log Serializer -----------
 class PaypalLogSerializer(serializers.ModelSerializer):
+    raw_payload = serializers.JSONField(required=False, allow_null=True)
+
     class Meta:
         model = PaypalPayment
         fields = ['order_id', 'payer_id', 'amount', 'currency', 'raw_payload']
+
+
+# ----------- Bulk STK Push Serializers -----------
+class BulkStkItemSerializer(serializers.Serializer):
+    phone = serializers.CharField(max_length=13)
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal("1"))
+
+
+class BulkStkPushSerializer(serializers.Serializer):
+    campaign = serializers.CharField(max_length=100, required=False, allow_blank=True, default="")
+    items = BulkStkItemSerializer(many=True, allow_empty=False)
+
+    def validate_items(self, items):
+        limit = getattr(settings, "MPESA_BULK_MAX_ITEMS", 10000)
+        if len(items) > limit:
+            raise serializers.ValidationError(f"At most {limit} items per batch.")
+        return items
+
+
+# ----------- Payment Stats Query Serializer -----------
+class PaymentStatsQuerySerializer(serializers.Serializer):
+    """``?start=&end=`` (local dates, inclusive; default the last 30 days) and ``?group_by=``."""
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    group_by = serializers.CharField(required=False, default=",".join(DIMENSIONS))
+
+    def validate_group_by(self, value):
+        names = tuple(dict.fromkeys(n.strip() for n in value.split(",") if n.strip()))
+        if not names or set(names) - set(DIMENSIONS):
+            raise serializers.ValidationError(f"Comma-separated, from: {', '.join(DIMENSIONS)}.")
+        return names
+
+    def validate(self, attrs):
+        attrs["end"] = attrs.get("end") or timezone.localdate()
+        attrs["start"] = attrs.get("start") or attrs["end"] - timedelta(days=29)
+        if attrs["start"] > attrs["end"]:
+            raise serializers.ValidationError("start must not be after end.")
+        return attrs
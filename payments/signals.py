@@ -0,0 +1,9 @@
+from django.dispatch import Signal
+
+# Sent after ``bulk_create`` (which skips post_save) with ``sender=model`` and
+# ``objs=[created instances]``, so denormalised counts can catch up.
+rows_bulk_created = Signal()
+
+# Sent after ``bulk_update`` with ``sender=model`` and ``objs=[updated
+# instances]``; each instance still carries what it looked like when loaded.
+rows_bulk_updated = Signal()
@@ -0,0 +1,208 @@
+"""
+Parsing of provider statement exports for ``import_payments``.
+
+Nothing here touches Django: ``parse_chunk`` runs in worker processes
+started with ``spawn``, so it takes and returns plain values (dict rows
+in, field dicts out) and is handed the time zone by name.
+
+Columns are matched by name ignoring case, spaces and punctuation. The
+aliases cover the Daraja transaction export (``CheckoutRequestID``,
+``ResultCode``, ``TransactionDate``...), the columns an M-Pesa org portal
+statement shares with it (``Receipt No.``, ``Completion Time``,
+``Paid In``, ``Other Party Info``) and PayPal's activity download
+(``Transaction ID``, ``Gross``, ``Date``/``Time``/``TimeZone``).
+"""
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+CENTS = Decimal("0.01")
+
+COLUMNS = {
+    "mpesa": {
+        "checkout_request_id": ("checkoutrequestid",),
+        "merchant_request_id": ("merchantrequestid",),
+        "phone": ("phonenumber", "phone", "msisdn", "otherpartyinfo"),
+        "amount": ("amount", "paidin", "transactionamount"),
+        "result_code": ("resultcode",),
+        "status": ("transactionstatus", "status"),
+        "receipt": ("mpesareceiptnumber", "receiptno", "receiptnumber"),
+        "time": ("transactiondate", "completiontime", "transactiontime", "initiationtime"),
+    },
+    "paypal": {
+        "order_id": ("orderid", "transactionid"),
+        "payer_id": ("payerid", "payeraccountid"),
+        "amount": ("gross", "amount"),
+        "currency": ("currency", "currencycode"),
+        "status": ("status",),
+        "date": ("date", "createtime", "createdat"),
+        "time": ("time",),
+        "timezone": ("timezone",),
+    },
+}
+REQUIRED = {"mpesa": ("checkout_request_id", "amount"), "paypal": ("order_id", "amount")}
+
+MPESA_STATUSES = {
+    "completed": "completed", "success": "completed", "successful": "completed",
+    "failed": "failed", "cancelled": "failed", "canceled": "failed", "declined": "failed",
+    "pending": "pending",
+}
+# PayPal's activity download names the zone by abbreviation.
+ZONE_OFFSETS = {
+    "UTC": 0, "GMT": 0, "EAT": 3, "CET": 1, "CEST": 2, "BST": 1,
+    "EST": -5, "EDT": -4, "CST": -6, "CDT": -5, "MST": -7, "MDT": -6, "PST": -8, "PDT": -7,
+}
+# Day first from Safaricom, month first from PayPal; ISO 8601 is tried before either.
+MPESA_TIME_FORMATS = ("%Y%m%d%H%M%S", "%Y-%m-%d %H:%M:%S", "%d-%m-%Y %H:%M:%S", "%d/%m/%Y %H:%M:%S")
+PAYPAL_TIME_FORMATS = ("%m/%d/%Y %H:%M:%S", "%m/%d/%Y")
+
+
+class RowError(ValueError):
+    """A row that cannot be imported; the message says why."""
+
+
+def normalize(name):
+    return re.sub(r"[^a-z0-9]", "", (name or "").lower())
+
+
+def detect_format(fieldnames):
+    names = {normalize(name) for name in fieldnames or ()}
+    if names & {"checkoutrequestid", "mpesareceiptnumber", "receiptno", "paidin"}:
+        return "mpesa"
+    if names & {"orderid", "transactionid", "gross"}:
+        return "paypal"
+    return None
+
+
+def resolve_columns(kind, fieldnames):
+    """``{field: header}`` for the columns present; raises ``ValueError`` if a required one is missing."""
+    headers = {normalize(name): name for name in fieldnames or ()}
+    columns = {}
+    for field, aliases in COLUMNS[kind].items():
+        for alias in aliases:
+            if alias in headers:
+                columns[field] = headers[alias]
+                break
+    missing = [field for field in REQUIRED[kind] if field not in columns]
+    if missing:
+        raise ValueError(f"{kind} export has no {', '.join(missing)} column")
+    return columns
+
+
+# ----------- Values -----------
+def parse_amount(text):
+    cleaned = re.sub(r"[^0-9.\-]", "", text or "")
+    try:
+        amount = Decimal(cleaned).quantize(CENTS)
+    except InvalidOperation:
+        raise RowError(f"bad amount {text!r}")
+    if amount <= 0:
+        raise RowError(f"amount {text!r} is not a payment received")
+    return amount
+
+
+def parse_time(text, tz, formats):
+    text = (text or "").strip()
+    if not text:
+        return None
+    try:
+        value = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        for fmt in formats:
+            try:
+                value = datetime.strptime(text, fmt)
+                break
+            except ValueError:
+                continue
+        else:
+            raise RowError(f"bad time {text!r}")
+    return value if value.tzinfo else value.replace(tzinfo=tz)
+
+
+def zone(name, default):
+    name = (name or "").strip()
+    if not name:
+        return default
+    if name.upper() in ZONE_OFFSETS:
+        return dt_timezone(timedelta(hours=ZONE_OFFSETS[name.upper()]))
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return default
+
+
+def parse_phone(text):
+    match = re.search(r"\+?\d{9,13}", text or "")
+    return match.group().lstrip("+") if match else None
+
+
+# ----------- Rows -----------
+def parse_mpesa(row, columns, tz):
+    get = lambda field: (row.get(columns[field]) or "").strip() if field in columns else ""
+    checkout_id = get("checkout_request_id")
+    if not checkout_id:
+        raise RowError("no CheckoutRequestID")
+    record = {"checkout_request_id": checkout_id, "amount": parse_amount(get("amount"))}
+
+    if get("result_code"):
+        try:
+            record["status"] = "completed" if int(get("result_code")) == 0 else "failed"
+        except ValueError:
+            raise RowError(f"bad ResultCode {get('result_code')!r}")
+    elif get("status"):
+        if get("status").lower() not in MPESA_STATUSES:
+            raise RowError(f"unknown status {get('status')!r}")
+        record["status"] = MPESA_STATUSES[get("status").lower()]
+    else:
+        record["status"] = "completed"  # A statement only lists what went through.
+
+    if parse_phone(get("phone")):
+        record["phone"] = parse_phone(get("phone"))
+    if get("merchant_request_id"):
+        record["merchant_request_id"] = get("merchant_request_id")
+    created_at = parse_time(get("time"), tz, MPESA_TIME_FORMATS)
+    if created_at is not None:
+        record["created_at"] = created_at
+    record["payload"] = {"source": "statement_import", "receipt": get("receipt") or None, "row": row}
+    return record
+
+
+def parse_paypal(row, columns, tz):
+    get = lambda field: (row.get(columns[field]) or "").strip() if field in columns else ""
+    order_id = get("order_id")
+    if not order_id:
+        raise RowError("no order or transaction id")
+    record = {
+        "order_id": order_id,
+        "amount": parse_amount(get("amount")),
+        "status": (get("status") or "COMPLETED").upper(),
+    }
+    if get("currency"):
+        record["currency"] = get("currency").upper()
+    if get("payer_id"):
+        record["payer_id"] = get("payer_id")
+    stamp = " ".join(part for part in (get("date"), get("time")) if part)
+    created_at = parse_time(stamp, zone(get("timezone"), tz), PAYPAL_TIME_FORMATS)
+    if created_at is not None:
+        record["created_at"] = created_at
+    record["payload"] = {"source": "statement_import", "row": row}
+    return record
+
+
+PARSERS = {"mpesa": parse_mpesa, "paypal": parse_paypal}
+
+
+def parse_chunk(kind, columns, rows, first_row, tz_name):
+    """
+    Parse consecutive data rows numbered from ``first_row`` (1-based).
+    Returns ``(records, errors)``, ``errors`` being ``(row number, message)``.
+    """
+    parse, tz = PARSERS[kind], ZoneInfo(tz_name)
+    records, errors = [], []
+    for number, row in enumerate(rows, start=first_row):
+        try:
+            records.append(parse(row, columns, tz))
+        except RowError as exc:
+            errors.append((number, str(exc)))
+    return records, errors
@@ -0,0 +1,185 @@
+"""
+Local stand-ins for the payment providers, used by the test suite.
+
+``FakeDarajaServer`` and ``FakePayPalServer`` speak just enough of the
+Safaricom and PayPal APIs for the payment views to run end to end without
+network access (tests and ``benchmarks/``).
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+
+class _FakeHandler(BaseHTTPRequestHandler):
+    server_version = "FakeProvider/1.0"
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without TCP_NODELAY each
+    # keep-alive response stalls ~40ms on delayed ACKs.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        try:
+            return json.loads(raw or b"{}")
+        except ValueError:
+            return raw.decode()
+
+    def _dispatch(self, method):
+        fake = self.server.fake
+        path = urlparse(self.path).path
+        route = fake.routes.get((method, path))
+        if route is None:
+            self._send_json(404, {"error": f"no route for {method} {path}"})
+            return
+        body = self._read_json() if method == "POST" else None
+        fake.record(path, self.headers, body, self.client_address)
+        if fake.delay:
+            time.sleep(fake.delay)
+        status, data = route(self.headers, body)
+        self._send_json(status, data)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+
+class _FakeHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Benchmarks open hundreds of connections at once.
+    request_queue_size = 512
+
+
+class FakeProviderServer:
+    """Threaded HTTP server on an ephemeral localhost port."""
+
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.routes = {}
+        self.requests = []
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record(self, path, headers, body, client_address=None):
+        with self._lock:
+            self.requests.append({
+                "path": path,
+                "headers": dict(headers),
+                "body": body,
+                "client_address": client_address,
+            })
+
+    def calls(self, path):
+        with self._lock:
+            return [r for r in self.requests if r["path"] == path]
+
+    def start(self):
+        self._httpd = _FakeHTTPServer(("127.0.0.1", 0), _FakeHandler)
+        self._httpd.fake = self
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class FakeDarajaServer(FakeProviderServer):
+    OAUTH_PATH = "/oauth/v1/generate"
+    STKPUSH_PATH = "/mpesa/stkpush/v1/processrequest"
+    STKQUERY_PATH = "/mpesa/stkpushquery/v1/query"
+
+    def __init__(self, expires_in=3599, delay=0):
+        super().__init__(delay=delay)
+        self.expires_in = expires_in
+        # CheckoutRequestID -> ResultCode for STK queries; None means
+        # "still being processed". Unlisted ids succeed.
+        self.query_results = {}
+        self._issued = 0
+        self._pushes = 0
+        self.routes.update({
+            ("GET", self.OAUTH_PATH): self.oauth,
+            ("POST", self.STKPUSH_PATH): self.stkpush,
+            ("POST", self.STKQUERY_PATH): self.stkquery,
+        })
+
+    def oauth(self, headers, body):
+        with self._lock:
+            self._issued += 1
+            token = f"fake-token-{self._issued}"
+        return 200, {"access_token": token, "expires_in": str(self.expires_in)}
+
+    def stkpush(self, headers, body):
+        with self._lock:
+            self._pushes += 1
+            n = self._pushes
+        return 200, {
+            "MerchantRequestID": f"merchant-{n}",
+            "CheckoutRequestID": f"ws_CO_{n:012d}",
+            "ResponseCode": "0",
+            "ResponseDescription": "Success. Request accepted for processing",
+            "CustomerMessage": "Success. Request accepted for processing",
+        }
+
+    def stkquery(self, headers, body):
+        checkout_id = body.get("CheckoutRequestID")
+        result_code = self.query_results.get(checkout_id, "0")
+        if result_code is None:
+            return 500, {"errorCode": "500.001.1001", "errorMessage": "The transaction is being processed"}
+        return 200, {
+            "ResponseCode": "0",
+            "ResponseDescription": "The service request has been accepted successsfully",
+            "MerchantRequestID": f"merchant-{checkout_id}",
+            "CheckoutRequestID": checkout_id,
+            "ResultCode": result_code,
+            "ResultDesc": "The service request is processed successfully." if result_code == "0" else "Request cancelled by user",
+        }
+
+
+class FakePayPalServer(FakeProviderServer):
+    OAUTH_PATH = "/v1/oauth2/token"
+    VERIFY_PATH = "/v1/notifications/verify-webhook-signature"
+
+    def __init__(self, verification_status="SUCCESS", delay=0):
+        super().__init__(delay=delay)
+        self.verification_status = verification_status
+        self.routes.update({
+            ("POST", self.OAUTH_PATH): self.oauth,
+            ("POST", self.VERIFY_PATH): self.verify,
+        })
+
+    def oauth(self, headers, body):
+        return 200, {"access_token": "fake-paypal-token", "token_type": "Bearer", "expires_in": 32400}
+
+    def verify(self, headers, body):
+        return 200, {"verification_status": self.verification_status}
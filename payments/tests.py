@@ -1,3 +1,1251 @@
-from django.test import TestCase
+import asyncio
+import base64
+import datetime
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from io import StringIO
+from urllib.parse import urlencode
+from unittest import mock
 
-# Create your tests here.
+import requests
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from cryptography.x509.oid import NameOID
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import ParseError
+from rest_framework.test import APIClient
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from backend import throttling
+from backend.renderers import FastJSONParser, FastJSONRenderer, TimedJSONRenderer
+
+from . import async_views, dispatch, mpesa, payloads, paypal, reconcile, rollups, views
+from .breaker import CircuitBreaker, ProviderUnavailable, get_breaker, reset_breakers
+from .bulk import create_batch
+from .clients import ProviderClient
+from .dispatch import StkDispatcher, claim_jobs, recover_stale, run_job
+from .idempotency import deduplicator
+from .models import (
+    DailyPaymentRollup, MpesaPayment, PaymentPayload, PaypalPayment, ProcessedEvent, StkPushBatch, StkPushJob,
+)
+from .mpesa import apply_stk_callback
+from .paypal import CertificateCache
+from .ratelimit import TokenBucket
+from .reconcile import PendingReconciler
+from .serializers import MpesaTransactionSerializer
+from .testing import FakeDarajaServer, FakePayPalServer, FakeProviderServer
+from .tokens import TokenManager
+
+
+def fake_fetch(fake):
+    def fetch():
+        resp = requests.get(fake.base_url + FakeDarajaServer.OAUTH_PATH, timeout=5)
+        resp.raise_for_status()
+        return resp.json()
+    return fetch
+
+
+class TokenManagerTests(TestCase):
+    def setUp(self):
+        self.fake = FakeDarajaServer().start()
+        self.addCleanup(self.fake.stop)
+
+    def oauth_calls(self):
+        return len(self.fake.calls(FakeDarajaServer.OAUTH_PATH))
+
+    def test_token_is_cached_until_expiry(self):
+        manager = TokenManager("test", fake_fetch(self.fake))
+        first = manager.get_token()
+        self.assertEqual(manager.get_token(), first)
+        self.assertEqual(self.oauth_calls(), 1)
+        stats = manager.stats()
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["refreshes"], 1)
+
+    def test_token_inside_refresh_margin_is_refetched(self):
+        self.fake.expires_in = 30
+        manager = TokenManager("test", fake_fetch(self.fake), refresh_margin=60, proactive_window=60)
+        self.assertNotEqual(manager.get_token(), manager.get_token())
+        self.assertEqual(self.oauth_calls(), 2)
+
+    def test_proactive_window_refreshes_in_background(self):
+        self.fake.expires_in = 100
+        manager = TokenManager("test", fake_fetch(self.fake), refresh_margin=10, proactive_window=200)
+        first = manager.get_token()
+        # Still valid, so the caller gets the current token immediately.
+        self.assertEqual(manager.get_token(), first)
+        manager._background.join(5)
+        self.assertEqual(manager.stats()["background_refreshes"], 1)
+        self.assertNotEqual(manager._token, first)
+
+    def test_concurrent_callers_share_one_fetch(self):
+        self.fake.delay = 0.2
+        manager = TokenManager("test", fake_fetch(self.fake))
+        tokens = []
+        threads = [threading.Thread(target=lambda: tokens.append(manager.get_token())) for _ in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(set(tokens)), 1)
+        self.assertEqual(self.oauth_calls(), 1)
+
+    def test_shared_cache_is_reused_across_workers(self):
+        worker_a = TokenManager("shared-test", fake_fetch(self.fake), cache_alias="default")
+        worker_b = TokenManager("shared-test", fake_fetch(self.fake), cache_alias="default")
+        self.addCleanup(worker_a.invalidate)
+        self.assertEqual(worker_a.get_token(), worker_b.get_token())
+        self.assertEqual(self.oauth_calls(), 1)
+        self.assertEqual(worker_b.stats()["shared_hits"], 1)
+
+    def test_invalidate_forces_refetch(self):
+        manager = TokenManager("test", fake_fetch(self.fake))
+        manager.get_token()
+        manager.invalidate()
+        manager.get_token()
+        self.assertEqual(self.oauth_calls(), 2)
+
+
+class MpesaStkPushViewTests(TestCase):
+    def setUp(self):
+        self.fake = FakeDarajaServer().start()
+        self.addCleanup(self.fake.stop)
+        settings_override = override_settings(
+            MPESA_BASE_URL=self.fake.base_url,
+            MPESA_SHORTCODE="174379",
+            MPESA_PASSKEY="passkey",
+            THROTTLE_ENABLED=False,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        mpesa.mpesa_token_manager.invalidate()
+        self.addCleanup(mpesa.mpesa_token_manager.invalidate)
+        self.client = APIClient()
+
+    def test_stk_push_reuses_cached_token(self):
+        for _ in range(3):
+            res = self.client.post(
+                "/api/payments/mpesa/stkpush/",
+                {"phone": "254700000000", "amount": "10.00"},
+                format="json",
+                secure=True,
+            )
+            self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(self.fake.calls(FakeDarajaServer.OAUTH_PATH)), 1)
+        pushes = self.fake.calls(FakeDarajaServer.STKPUSH_PATH)
+        self.assertEqual(len(pushes), 3)
+        self.assertEqual(pushes[0]["headers"]["Authorization"], "Bearer fake-token-1")
+        self.assertEqual(MpesaPayment.objects.exclude(checkout_request_id=None).count(), 3)
+
+    @override_settings(INSTRUMENTATION_SERVER_TIMING=True)
+    def test_server_timing_reports_db_and_provider_time(self):
+        res = self.client.post(
+            "/api/payments/mpesa/stkpush/",
+            {"phone": "254700000000", "amount": "10.00"},
+            format="json",
+            secure=True,
+        )
+        timing = res["Server-Timing"]
+        self.assertIn('http;dur=', timing)
+        self.assertIn('desc="2 calls"', timing)  # oauth + stkpush
+        self.assertIn('render;dur=', timing)
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="[1-9]\d* queries"')
+
+    def test_server_timing_is_off_by_default(self):
+        res = self.client.get("/api/dashboard-counts/", secure=True)
+        self.assertEqual(res.status_code, 200)
+        self.assertNotIn("Server-Timing", res)
+
+    @override_settings(METRICS_ENABLED=True, METRICS_TOKEN="scrape")
+    def test_metrics_endpoint(self):
+        self.client.post(
+            "/api/payments/mpesa/stkpush/",
+            {"phone": "254700000000", "amount": "10.00"},
+            format="json",
+            secure=True,
+        )
+        self.assertEqual(self.client.get("/metrics", secure=True).status_code, 401)
+        self.assertEqual(self.client.get("/metrics", secure=True, HTTP_AUTHORIZATION="Bearer scrapf").status_code, 401)
+        res = self.client.get("/metrics", secure=True, HTTP_AUTHORIZATION="Bearer scrape")
+        self.assertEqual(res.status_code, 200)
+        body = res.content.decode()
+        self.assertIn('http_requests_total{route="/api/payments/mpesa/stkpush/",method="POST",status="200"}', body)
+        self.assertIn('payments_provider_request_duration_seconds_count{provider="mpesa",endpoint="mpesa.stkpush"}', body)
+        self.assertIn("payments_stk_queue_depth 0", body)
+        self.assertIn("payments_reconcile_backlog 0", body)
+
+    @override_settings(INSTRUMENTATION_SLOW_REQUEST_MS=0, INSTRUMENTATION_SLOW_SAMPLE_RATE=1.0)
+    def test_slow_requests_are_logged(self):
+        with self.assertLogs("backend.requests.slow", "WARNING") as logs:
+            self.client.get("/api/payments/mpesa/stkpush/", secure=True)
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line["route"], "/api/payments/mpesa/stkpush/")
+        self.assertEqual(line["status"], 405)
+        self.assertIn("render_ms", line)
+
+    def test_metrics_endpoint_is_off_by_default(self):
+        self.assertEqual(self.client.get("/metrics", secure=True).status_code, 404)
+
+    @override_settings(METRICS_ENABLED=True)
+    def test_open_circuit_returns_503(self):
+        self.addCleanup(reset_breakers)
+        breaker = get_breaker("mpesa")
+        breaker._open(breaker.clock())
+        res = self.client.post(
+            "/api/payments/mpesa/stkpush/",
+            {"phone": "254700000000", "amount": "10.00"},
+            format="json",
+            secure=True,
+        )
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.data["reason"], "circuit_open")
+        self.assertEqual(int(res["Retry-After"]), res.data["retry_after"])
+        self.assertFalse(MpesaPayment.objects.exists())
+        self.assertEqual(self.fake.requests, [])
+        body = self.client.get("/metrics", secure=True).content.decode()
+        self.assertIn('payments_circuit_state{provider="mpesa"} 2', body)
+        self.assertIn('payments_circuit_rejected_total{provider="mpesa",reason="circuit_open"} 1', body)
+
+
+class AsyncStkPushTests(TransactionTestCase):
+    def setUp(self):
+        self.fake = FakeDarajaServer().start()
+        self.addCleanup(self.fake.stop)
+        settings_override = override_settings(
+            MPESA_BASE_URL=self.fake.base_url,
+            MPESA_SHORTCODE="174379",
+            MPESA_PASSKEY="passkey",
+            MPESA_STK_ASYNC=True,
+            THROTTLE_ENABLED=False,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        mpesa.mpesa_token_manager.invalidate()
+        self.addCleanup(mpesa.mpesa_token_manager.invalidate)
+        self.client = APIClient()
+
+    def push(self):
+        return self.client.post(
+            "/api/payments/mpesa/stkpush/",
+            {"phone": "254700000000", "amount": "10.00"},
+            format="json",
+            secure=True,
+        )
+
+    def test_push_is_queued_not_sent(self):
+        res = self.push()
+        self.assertEqual(res.status_code, 202)
+        payment = MpesaPayment.objects.get(pk=res.data["payment_id"])
+        self.assertEqual(payment.dispatch_job.status, "queued")
+        self.assertEqual(self.fake.calls(FakeDarajaServer.STKPUSH_PATH), [])
+
+    def test_dispatcher_sends_queued_pushes(self):
+        ids = [self.push().data["payment_id"] for _ in range(3)]
+        processed = StkDispatcher(workers=1).run(once=True)
+        self.assertEqual(processed, 3)
+        self.assertEqual(len(self.fake.calls(FakeDarajaServer.STKPUSH_PATH)), 3)
+        for payment in MpesaPayment.objects.filter(id__in=ids).select_related("dispatch_job"):
+            self.assertEqual(payment.dispatch_job.status, "done")
+            self.assertIsNotNone(payment.checkout_request_id)
+
+    def test_failures_after_the_send_are_not_retried(self):
+        self.fake.routes[("POST", FakeDarajaServer.STKPUSH_PATH)] = lambda h, b: (503, {})
+        payment_id = self.push().data["payment_id"]
+        (job_id,) = claim_jobs(10)
+        self.assertEqual(run_job(job_id), "done")
+        self.assertIn("503", StkPushJob.objects.get(pk=job_id).last_error)
+        self.assertEqual(MpesaPayment.objects.get(pk=payment_id).status, "pending")
+        self.assertEqual(len(self.fake.calls(FakeDarajaServer.STKPUSH_PATH)), 1)
+
+    def test_read_timeout_sends_one_push(self):
+        def slow(headers, body):
+            time.sleep(0.3)
+            return 200, {"ResponseCode": "0"}
+
+        self.fake.routes[("POST", FakeDarajaServer.STKPUSH_PATH)] = slow
+        payment_id = self.push().data["payment_id"]
+        with override_settings(PAYMENT_HTTP_TIMEOUTS={"default": (3.05, 15), "mpesa.stkpush": (3.05, 0.1)}):
+            self.assertEqual(StkDispatcher(workers=1).run(once=True), 1)
+        self.assertEqual(len(self.fake.calls(FakeDarajaServer.STKPUSH_PATH)), 1)
+        payment = MpesaPayment.objects.select_related("dispatch_job").get(pk=payment_id)
+        self.assertEqual((payment.status, payment.dispatch_job.status), ("pending", "done"))
+
+    def test_refused_connections_are_requeued(self):
+        refused = requests.ConnectionError(MaxRetryError(None, "/", NewConnectionError(None, "refused")))
+        payment_id = self.push().data["payment_id"]
+        (job_id,) = claim_jobs(10)
+        with mock.patch.object(dispatch, "send_stk_push", side_effect=refused):
+            self.assertEqual(run_job(job_id), "queued")
+        self.assertEqual(StkPushJob.objects.get(pk=job_id).attempts, 1)
+        self.assertEqual(MpesaPayment.objects.get(pk=payment_id).status, "pending")
+
+    def test_open_circuit_requeues_without_using_an_attempt(self):
+        self.addCleanup(reset_breakers)
+        breaker = get_breaker("mpesa")
+        breaker._open(breaker.clock())
+        self.push()
+        (job_id,) = claim_jobs(10)
+        self.assertEqual(run_job(job_id), "queued")
+        job = StkPushJob.objects.get(pk=job_id)
+        self.assertEqual(job.attempts, 0)
+        self.assertIn("circuit open", job.last_error)
+        self.assertEqual(self.fake.calls(FakeDarajaServer.STKPUSH_PATH), [])
+
+    def test_jobs_of_a_dead_dispatcher_are_recovered(self):
+        unsent, sent = (self.push().data["payment_id"] for _ in range(2))
+        claim_jobs(10)
+        MpesaPayment.objects.filter(pk=sent).update(checkout_request_id="ws_CO_sent")
+        self.assertEqual(recover_stale(), 0)
+
+        later = timezone.now() + datetime.timedelta(seconds=301)
+        self.assertEqual(recover_stale(now=later), 2)
+        jobs = dict(StkPushJob.objects.values_list("payment_id", "status"))
+        self.assertEqual(jobs, {unsent: "queued", sent: "done"})
+        self.assertEqual(StkDispatcher(workers=1).run(once=True), 1)
+        self.assertEqual(len(self.fake.calls(FakeDarajaServer.STKPUSH_PATH)), 1)
+
+    def test_status_endpoint_supports_conditional_get(self):
+        payment_id = self.push().data["payment_id"]
+        url = f"/api/payments/mpesa/{payment_id}/status/"
+        first = self.client.get(url, secure=True)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.data["dispatch_status"], "queued")
+
+        cached = self.client.get(url, secure=True, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(cached.status_code, 304)
+
+        StkDispatcher(workers=1).run(once=True)
+        changed = self.client.get(url, secure=True, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.data["dispatch_status"], "done")
+
+    def test_status_endpoint_404(self):
+        self.assertEqual(self.client.get("/api/payments/mpesa/999/status/", secure=True).status_code, 404)
+
+
+class BulkStkPushTests(TransactionTestCase):
+    def setUp(self):
+        self.fake = FakeDarajaServer().start()
+        self.addCleanup(self.fake.stop)
+        settings_override = override_settings(
+            MPESA_BASE_URL=self.fake.base_url,
+            MPESA_SHORTCODE="174379",
+            MPESA_PASSKEY="passkey",
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        mpesa.mpesa_token_manager.invalidate()
+        self.addCleanup(mpesa.mpesa_token_manager.invalidate)
+        patcher = mock.patch.object(dispatch, "stk_rate_limiter", TokenBucket(0))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.client.force_login(get_user_model().objects.create_user("campaigns", password="pw", is_staff=True))
+
+    def test_bulk_request_queues_one_job_per_item(self):
+        items = [{"phone": f"25470000000{i}", "amount": "50.00"} for i in range(4)]
+        res = self.client.post("/api/payments/mpesa/stkpush/bulk/", {"campaign": "December", "items": items},
+                               format="json", secure=True)
+        self.assertEqual(res.status_code, 202)
+        batch = StkPushBatch.objects.get(pk=res.data["batch_id"])
+        self.assertEqual((batch.campaign, batch.total), ("December", 4))
+        self.assertEqual(StkPushJob.objects.filter(payment__batch=batch, status="queued").count(), 4)
+
+        StkDispatcher(workers=1).run(once=True)
+        self.assertEqual(len(self.fake.calls(FakeDarajaServer.OAUTH_PATH)), 1)
+        progress = self.client.get(res.data["status_url"], secure=True).data
+        self.assertEqual(progress["dispatch"], {"done": 4})
+        self.assertEqual(progress["payments"], {"pending": 4})
+        self.assertEqual(len(progress["items"]), 4)
+        self.assertTrue(all(item["checkout_request_id"] for item in progress["items"]))
+
+    def test_bulk_request_accepts_csv(self):
+        res = self.client.generic("POST", "/api/payments/mpesa/stkpush/bulk/?campaign=csv",
+                                  "phone,amount\n254700000001,10\n254700000002,20\n",
+                                  content_type="text/csv", secure=True)
+        self.assertEqual(res.status_code, 202)
+        self.assertEqual(MpesaPayment.objects.filter(batch_id=res.data["batch_id"]).count(), 2)
+
+    def test_invalid_rows_reject_the_batch(self):
+        items = [{"phone": "254700000001", "amount": "10"}, {"phone": "254700000002", "amount": "abc"}]
+        res = self.client.post("/api/payments/mpesa/stkpush/bulk/", items, format="json", secure=True)
+        self.assertEqual(res.status_code, 400)
+        # Only the failing rows are reported, keyed by index.
+        self.assertEqual(list(res.data["items"]), [1])
+        self.assertIn("amount", res.data["items"][1])
+        self.assertFalse(StkPushBatch.objects.exists())
+
+    def test_requires_staff(self):
+        self.client.logout()
+        res = self.client.post("/api/payments/mpesa/stkpush/bulk/", [], format="json", secure=True)
+        self.assertEqual(res.status_code, 403)
+
+    def test_command_streams_outcomes(self):
+        self.fake.routes[("POST", FakeDarajaServer.STKPUSH_PATH)] = (
+            lambda h, b: (400, {}) if b["PhoneNumber"] == "254700000003" else self.fake.stkpush(h, b)
+        )
+        path = tempfile.mktemp(suffix=".csv")
+        with open(path, "w") as f:
+            f.write("254700000001,10\n254700000002,20\n254700000003,30\n")
+        self.addCleanup(os.remove, path)
+        out, err = StringIO(), StringIO()
+        call_command("send_bulk_stk", path, "--workers", "1", "--rate", "0", stdout=out, stderr=err)
+        results = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(sorted(r["result"] for r in results), ["failed", "sent", "sent"])
+        self.assertEqual(len(self.fake.calls(FakeDarajaServer.OAUTH_PATH)), 1)
+        self.assertIn("2 sent, 1 failed", err.getvalue())
+        self.assertEqual(MpesaPayment.objects.get(phone="254700000003").status, "failed")
+        self.assertFalse(StkPushJob.objects.exists())
+
+    def test_counters_include_bulk_inserted_rows(self):
+        from dashboard.models import Counter
+
+        self.client.post("/api/payments/mpesa/stkpush/bulk/",
+                         [{"phone": "254700000001", "amount": "10"}, {"phone": "254700000002", "amount": "15"}],
+                         format="json", secure=True)
+        counter = Counter.objects.get(name="mpesa:pending")
+        self.assertEqual((counter.value, counter.total), (2, 25))
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_burst_then_rate(self):
+        bucket = TokenBucket(rate=20, burst=2)
+        started = time.monotonic()
+        for _ in range(6):
+            bucket.acquire()
+        # Two from the burst, then four at 20/s.
+        self.assertGreaterEqual(time.monotonic() - started, 0.18)
+
+    def test_try_acquire_reports_wait(self):
+        bucket = TokenBucket(rate=1, burst=1)
+        self.assertEqual(bucket.try_acquire(), 0.0)
+        self.assertGreater(bucket.try_acquire(), 0.5)
+
+
+class WriteThrottleTests(SimpleTestCase):
+    def setUp(self):
+        throttling.get_cache().clear()
+        throttling.reset_stats()
+
+    def test_bucket_bursts_then_refills(self):
+        take = throttling.take
+        self.assertEqual([take("s", "ip", "1.2.3.4", "2/min", now=0) for _ in range(2)], [0.0, 0.0])
+        self.assertEqual(take("s", "ip", "1.2.3.4", "2/min", now=0), 30.0)
+        self.assertEqual(take("s", "ip", "1.2.3.4", "2/min", now=30), 0.0)
+        self.assertEqual(take("s", "ip", "5.6.7.8", "2/min", now=30), 0.0)
+
+    def test_phone_numbers_share_a_bucket_across_formats(self):
+        self.assertEqual(throttling.phone_key("0712 345 678"), throttling.phone_key("+254712345678"))
+        self.assertIsNone(throttling.phone_key("12"))
+
+    @override_settings(THROTTLE_RATES={"stk_push": {"ip": "10/min", "phone": "1/min"}})
+    def test_phone_bucket_and_counters(self):
+        self.assertEqual(throttling.check("stk_push", "1.2.3.4", "254700000000"), 0.0)
+        self.assertGreater(throttling.check("stk_push", "5.6.7.8", "0700000000"), 0)
+        self.assertEqual(throttling.check("stk_push", "1.2.3.4", "254700000001"), 0.0)
+        self.assertEqual(throttling.stats(), {"stk_push:ip": {"allowed": 3, "rejected": 0},
+                                              "stk_push:phone": {"allowed": 2, "rejected": 1}})
+        [metric] = throttling._collect()
+        self.assertIn(({"scope": "stk_push", "bucket": "phone", "outcome": "rejected"}, 1), metric.samples)
+
+
+@override_settings(THROTTLE_RATES={"stk_push": {"ip": "10/min", "phone": "1/min"}})
+class StkPushThrottleTests(TestCase):
+    def setUp(self):
+        throttling.get_cache().clear()
+
+    def test_rejected_before_validation_or_a_row(self):
+        with mock.patch.object(views, "send_stk_push", return_value={"ResponseCode": "0"}):
+            res = APIClient().post("/api/payments/mpesa/stkpush/", {"phone": "254700000000", "amount": "10.00"},
+                                   format="json", secure=True)
+            self.assertEqual(res.status_code, 200)
+            with self.assertNumQueries(0):
+                res = APIClient().post("/api/payments/mpesa/stkpush/", {"phone": "0700000000", "amount": "oops"},
+                                       format="json", secure=True)
+        self.assertEqual(res.status_code, 429)
+        self.assertEqual(res["Retry-After"], "60")
+        self.assertEqual(MpesaPayment.objects.count(), 1)
+
+    def test_rotating_forwarded_for_is_still_throttled(self):
+        throttling.reset_stats()
+
+        def push(i):
+            # Render's proxy appends the address it saw to whatever the client sent.
+            return APIClient().post("/api/payments/mpesa/stkpush/", {"phone": f"25470000{i:04d}", "amount": "oops"},
+                                    format="json", secure=True, HTTP_X_FORWARDED_FOR=f"10.0.0.{i}, 203.0.113.7")
+
+        statuses = [push(i).status_code for i in range(11)]
+        self.assertEqual(statuses, [400] * 10 + [429])
+        self.assertEqual(throttling.stats()["stk_push:ip"]["rejected"], 1)
+
+    async def test_async_view(self):
+        factory = AsyncRequestFactory()
+        statuses = []
+        for _ in range(2):
+            request = factory.post("/api/payments/mpesa/stkpush/", json.dumps({"phone": "254700000000"}),
+                                   content_type="application/json")
+            response = await async_views.MpesaStkPushView.as_view()(request)
+            statuses.append(response.status_code)
+        self.assertEqual(statuses, [400, 429])
+        self.assertEqual(response["Retry-After"], "60")
+
+
+class PendingReconcilerTests(TransactionTestCase):
+    def setUp(self):
+        self.fake = FakeDarajaServer().start()
+        self.addCleanup(self.fake.stop)
+        settings_override = override_settings(
+            MPESA_BASE_URL=self.fake.base_url,
+            MPESA_SHORTCODE="174379",
+            MPESA_PASSKEY="passkey",
+            MPESA_RECONCILE_AFTER_SECONDS=120,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        mpesa.mpesa_token_manager.invalidate()
+        self.addCleanup(mpesa.mpesa_token_manager.invalidate)
+
+    def pending(self, checkout_id, minutes_ago=10):
+        payment = MpesaPayment.objects.create(phone="254700000000", amount=10, checkout_request_id=checkout_id)
+        created = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=minutes_ago)
+        MpesaPayment.objects.filter(pk=payment.pk).update(created_at=created)
+        return payment
+
+    def queried(self):
+        return sorted(call["body"]["CheckoutRequestID"] for call in self.fake.calls(FakeDarajaServer.STKQUERY_PATH))
+
+    def test_stale_pending_payments_are_resolved(self):
+        paid, cancelled, waiting = self.pending("ws_paid"), self.pending("ws_cancelled"), self.pending("ws_waiting")
+        self.pending("ws_fresh", minutes_ago=0)
+        MpesaPayment.objects.create(phone="254700000000", amount=10)  # never pushed
+        self.fake.query_results.update({"ws_cancelled": "1032", "ws_waiting": None})
+
+        reconciler = PendingReconciler(workers=2)
+        self.assertEqual(reconciler.run_once(), 2)
+        self.assertEqual(self.queried(), ["ws_cancelled", "ws_paid", "ws_waiting"])
+        self.assertEqual(len(self.fake.calls(FakeDarajaServer.OAUTH_PATH)), 1)
+        statuses = dict(MpesaPayment.objects.filter(pk__in=[paid.pk, cancelled.pk, waiting.pk]).values_list("pk", "status"))
+        self.assertEqual(statuses, {paid.pk: "completed", cancelled.pk: "failed", waiting.pk: "pending"})
+        self.assertEqual(MpesaPayment.objects.get(pk=paid.pk).mpesa_response["ResultCode"], "0")
+        self.assertEqual(
+            {k: reconciler.stats[k] for k in ("checked", "completed", "failed", "still_pending", "errors")},
+            {"checked": 3, "completed": 1, "failed": 1, "still_pending": 1, "errors": 0},
+        )
+
+    def test_counters_follow_bulk_update(self):
+        from dashboard.models import Counter
+
+        self.pending("ws_paid")
+        PendingReconciler(workers=1).run_once()
+        counts = dict(Counter.objects.values_list("name", "value"))
+        self.assertEqual((counts["mpesa:pending"], counts["mpesa:completed"]), (0, 1))
+
+    def test_unresolved_rows_do_not_block_later_pages(self):
+        for i in range(5):
+            self.pending(f"ws_{i}", minutes_ago=10 - i)
+            self.fake.query_results[f"ws_{i}"] = None
+        PendingReconciler(workers=2, batch_size=2).run_once()
+        self.assertEqual(self.queried(), [f"ws_{i}" for i in range(5)])
+
+    def test_callback_that_lands_first_wins(self):
+        payment = self.pending("ws_race")
+
+        def callback_then_query(checkout_id):
+            MpesaPayment.objects.filter(pk=payment.pk).update(status="completed")
+            return {"ResultCode": "1037"}
+
+        with mock.patch.object(reconcile, "query_stk_push", callback_then_query):
+            PendingReconciler(workers=1).run_once()
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, "completed")
+
+    def test_command_reports_backlog(self):
+        self.pending("ws_waiting")
+        self.fake.query_results["ws_waiting"] = None
+        out = StringIO()
+        call_command("reconcile_pending_payments", "--once", stdout=out)
+        self.assertIn("1 still pending; backlog 1", out.getvalue())
+
+
+class MpesaCallbackTests(TestCase):
+    def setUp(self):
+        deduplicator.clear()
+        self.client = APIClient()
+        self.payment = MpesaPayment.objects.create(
+            phone="254700000000", amount=10, checkout_request_id="ws_CO_1", merchant_request_id="merchant-1",
+        )
+
+    def callback(self, checkout_id, merchant_id, result_code=0):
+        body = {"Body": {"stkCallback": {
+            "CheckoutRequestID": checkout_id, "MerchantRequestID": merchant_id, "ResultCode": result_code,
+        }}}
+        return self.client.post("/api/payments/mpesa/callback/", body, format="json", secure=True)
+
+    def test_callback_matches_by_checkout_id_in_one_lookup(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.callback("ws_CO_1", "merchant-1").status_code, 200)
+        selects = [q for q in ctx.captured_queries if q["sql"].startswith("SELECT") and "payments_mpesapayment" in q["sql"]]
+        self.assertEqual(len(selects), 1)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, "completed")
+
+    def test_callback_falls_back_to_merchant_id(self):
+        self.callback(None, "merchant-1", result_code=1032)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, "failed")
+
+    def test_callback_prefers_checkout_match(self):
+        other = MpesaPayment.objects.create(phone="254711111111", amount=5, merchant_request_id="merchant-2")
+        self.callback("ws_CO_1", "merchant-2")
+        self.payment.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.payment.status, "completed")
+        self.assertEqual(other.status, "pending")
+
+    def test_unmatched_callback_is_recorded(self):
+        self.callback("ws_CO_missing", None)
+        self.assertTrue(MpesaPayment.objects.filter(phone="unknown").exists())
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, "pending")
+
+
+class CallbackDeduplicationTests(TestCase):
+    def setUp(self):
+        deduplicator.clear()
+        self.addCleanup(deduplicator.clear)
+        self.client = APIClient()
+        self.payment = MpesaPayment.objects.create(phone="254700000000", amount=10, checkout_request_id="ws_CO_1")
+        self.body = {"Body": {"stkCallback": {"CheckoutRequestID": "ws_CO_1", "ResultCode": 0}}}
+
+    def post_callback(self, body):
+        return self.client.post("/api/payments/mpesa/callback/", body, format="json", secure=True)
+
+    def test_replayed_callback_is_acked_without_queries(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertNotIn("duplicate", self.post_callback(self.body).data)
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.post_callback(self.body)
+        self.assertTrue(res.data["duplicate"])
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(ProcessedEvent.objects.count(), 1)
+        self.assertEqual(deduplicator.stats()["lru_hits"], 1)
+
+    def test_replay_after_restart_uses_table(self):
+        self.post_callback(self.body)
+        deduplicator.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertTrue(self.post_callback(self.body).data["duplicate"])
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_unmatched_callback_replays_do_not_create_rows(self):
+        body = {"Body": {"stkCallback": {"CheckoutRequestID": "ws_CO_missing", "ResultCode": 0}}}
+        for _ in range(3):
+            self.post_callback(body)
+        self.assertEqual(MpesaPayment.objects.filter(phone="unknown").count(), 1)
+
+    def test_replayed_paypal_webhook_skips_verification(self):
+        ProcessedEvent.objects.create(provider="paypal", event_key="event:WH-1")
+        res = self.client.post(
+            "/api/payments/paypal/webhook/",
+            {"id": "WH-1", "event_type": "PAYMENT.CAPTURE.COMPLETED"},
+            format="json",
+            secure=True,
+            HTTP_PAYPAL_TRANSMISSION_ID="tx-2",
+        )
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.data["duplicate"])
+        self.assertEqual(PaypalPayment.objects.count(), 0)
+
+
+def make_signing_cert(days=30):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "messageverificationcerts.paypal.com")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=days))
+        .sign(key, hashes.SHA256())
+    )
+    return key, cert.public_bytes(serialization.Encoding.PEM)
+
+
+@override_settings(PAYPAL_WEBHOOK_ID="WH-ID-1", PAYPAL_WEBHOOK_VERIFY_MODE="local")
+class PaypalLocalVerificationTests(TestCase):
+    CERT_URL = "https://api.sandbox.paypal.com/v1/notifications/certs/CERT-1"
+
+    def setUp(self):
+        deduplicator.clear()
+        self.key, self.pem = make_signing_cert()
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        self.cache = CertificateCache(cache_dir=self.cache_dir, fetch=self.no_network)
+        self.cache.store(self.CERT_URL, self.pem)
+        patcher = mock.patch.object(paypal, "certificate_cache", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+
+    @staticmethod
+    def no_network(url):
+        raise AssertionError(f"unexpected certificate download: {url}")
+
+    def signed_headers(self, body, **overrides):
+        message = paypal.expected_message("tx-1", "2026-10-18T10:00:00Z", "WH-ID-1", body)
+        signature = self.key.sign(message, padding.PKCS1v15(), hashes.SHA256())
+        headers = {
+            "HTTP_PAYPAL_TRANSMISSION_ID": "tx-1",
+            "HTTP_PAYPAL_TRANSMISSION_TIME": "2026-10-18T10:00:00Z",
+            "HTTP_PAYPAL_TRANSMISSION_SIG": base64.b64encode(signature).decode(),
+            "HTTP_PAYPAL_AUTH_ALGO": "SHA256withRSA",
+            "HTTP_PAYPAL_CERT_URL": self.CERT_URL,
+        }
+        headers.update(overrides)
+        return headers
+
+    def post(self, body, headers):
+        return self.client.generic(
+            "POST", "/api/payments/paypal/webhook/", body, content_type="application/json", secure=True, **headers
+        )
+
+    def test_valid_signature_is_accepted_without_network(self):
+        body = json.dumps({"id": "WH-EVT-1", "event_type": "PAYMENT.CAPTURE.COMPLETED"}).encode()
+        res = self.post(body, self.signed_headers(body))
+        self.assertEqual(res.status_code, 200, res.data)
+        self.assertTrue(res.data["verified"])
+        self.assertEqual(PaypalPayment.objects.get().status, "PAYMENT.CAPTURE.COMPLETED")
+
+    def test_tampered_body_is_rejected(self):
+        body = json.dumps({"id": "WH-EVT-1", "event_type": "PAYMENT.CAPTURE.COMPLETED"}).encode()
+        headers = self.signed_headers(body)
+        res = self.post(body.replace(b"COMPLETED", b"DENIED"), headers)
+        self.assertEqual(res.status_code, 400)
+        self.assertFalse(PaypalPayment.objects.exists())
+
+    def test_certificate_host_must_be_allow_listed(self):
+        body = b'{"id": "WH-EVT-2"}'
+        res = self.post(body, self.signed_headers(body, HTTP_PAYPAL_CERT_URL="https://evil.example.com/cert.pem"))
+        self.assertEqual(res.status_code, 400)
+
+    def test_certificate_is_reloaded_from_disk(self):
+        fresh = CertificateCache(cache_dir=self.cache_dir, fetch=self.no_network)
+        fresh.get(self.CERT_URL)
+        fresh.get(self.CERT_URL)
+        self.assertEqual(fresh.stats()["disk_hits"], 1)
+        self.assertEqual(fresh.stats()["memory_hits"], 1)
+
+    def test_expired_certificate_is_downloaded_again(self):
+        expired = CertificateCache(fetch=lambda url: self.pem)
+        _, old_pem = make_signing_cert(days=-1)
+        expired._certs[self.CERT_URL] = x509.load_pem_x509_certificate(old_pem)
+        expired.get(self.CERT_URL)
+        self.assertEqual(expired.stats()["downloads"], 1)
+
+
+class ProviderClientTests(SimpleTestCase):
+    def setUp(self):
+        self.fake = FakeProviderServer().start()
+        self.addCleanup(self.fake.stop)
+        self.client = ProviderClient("test", backoff_base=0.01, breaker=CircuitBreaker("test"))
+        self.addCleanup(self.client.close)
+        self.responses = []
+
+        def flaky(headers, body):
+            return self.responses.pop(0) if self.responses else (200, {"ok": True})
+        self.fake.routes[("GET", "/flaky")] = flaky
+        self.fake.routes[("POST", "/flaky")] = flaky
+
+    def test_connections_are_kept_alive(self):
+        for _ in range(5):
+            self.client.get(self.fake.base_url + "/flaky", "test.flaky").raise_for_status()
+        ports = {r["client_address"] for r in self.fake.calls("/flaky")}
+        self.assertEqual(len(ports), 1)
+
+    def test_idempotent_calls_are_retried(self):
+        self.responses = [(503, {}), (502, {})]
+        res = self.client.get(self.fake.base_url + "/flaky", "test.flaky")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(self.fake.calls("/flaky")), 3)
+        stats = self.client.stats()["test.flaky"]
+        self.assertEqual(stats["count"], 3)
+        self.assertEqual(stats["errors"], 2)
+        self.assertEqual(stats["buckets"][-1][1], 3)
+
+    def test_non_idempotent_calls_are_not_retried(self):
+        self.responses = [(503, {})]
+        res = self.client.post(self.fake.base_url + "/flaky", "test.flaky", json={})
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(len(self.fake.calls("/flaky")), 1)
+
+    def test_connection_errors_raise_after_retries(self):
+        with self.assertRaises(requests.ConnectionError):
+            self.client.get("http://127.0.0.1:9/", "test.down", timeout=(0.2, 0.2))
+        self.assertEqual(self.client.stats()["test.down"]["errors"], 3)
+
+
+class JSONFastPathTests(SimpleTestCase):
+    def test_renderers_agree(self):
+        created = datetime.datetime(2024, 1, 2, 3, 4, 5, 678901, tzinfo=datetime.timezone.utc)
+        payment = MpesaPayment(id=1, phone="254700000000", amount=Decimal("10.50"), created_at=created,
+                               updated_at=created, mpesa_response={"Body": {"Amount": 10.5, "Note": "caf\u00e9 \u2028"}})
+        payloads = [
+            MpesaTransactionSerializer([payment], many=True).data,
+            {"amount": payment.amount, "created_at": created, "items": {0: ["bad phone"]}, "none": None},
+        ]
+        for data in payloads:
+            self.assertEqual(FastJSONRenderer().render(data), TimedJSONRenderer().render(data))
+        body = json.loads(FastJSONRenderer().render(payloads[1]))
+        self.assertEqual(body["amount"], 10.5)
+        self.assertEqual(body["created_at"], "2024-01-02T03:04:05.678901Z")
+        # Exponents are spelt differently but read back the same; wide ints use the stdlib.
+        data = {"big": 1e16, "wide": 2 ** 70}
+        self.assertEqual(json.loads(FastJSONRenderer().render(data)), json.loads(TimedJSONRenderer().render(data)))
+        self.assertIn(b'"wide":1180591620717411303424', FastJSONRenderer().render(data))
+
+    def test_parser(self):
+        parse = FastJSONParser().parse
+        self.assertEqual(parse(io.BytesIO('{"amount": "10.00", "name": "Wanjir\u0169"}'.encode())),
+                         {"amount": "10.00", "name": "Wanjir\u0169"})
+        self.assertEqual(parse(io.BytesIO(b'{"a": 1}'), parser_context={"encoding": "latin-1"}), {"a": 1})
+        with self.assertRaises(ParseError):
+            parse(io.BytesIO(b'{"amount": '))
+        wide = b'{"id": 18446744073709551616, "neg": -9223372036854775809, "ok": 9007199254740993}'
+        self.assertEqual(parse(io.BytesIO(wide)), json.loads(wide))
+        self.assertIsInstance(parse(io.BytesIO(wide))["id"], int)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.breaker = CircuitBreaker("test", failure_rate=0.5, min_calls=4, window=10, open_seconds=30,
+                                      max_concurrent=2, clock=lambda: self.now)
+
+    def call(self, ok):
+        probe = self.breaker.before_call()
+        self.breaker.after_call(ok, probe)
+
+    def test_opens_on_failure_rate_and_fails_fast(self):
+        for ok in (True, False, True):
+            self.call(ok)
+        self.assertEqual(self.breaker.state, "closed")
+        self.call(False)  # 2 of 4 failed
+        self.assertEqual(self.breaker.state, "open")
+        self.now = 10
+        with self.assertRaises(ProviderUnavailable) as ctx:
+            self.breaker.before_call()
+        self.assertEqual((ctx.exception.reason, ctx.exception.retry_after), ("circuit_open", 20))
+        self.assertEqual(self.breaker.snapshot()["rejected_circuit_open"], 1)
+
+    def test_old_outcomes_leave_the_window(self):
+        for _ in range(3):
+            self.call(False)
+        self.now = 11
+        self.call(False)
+        self.assertEqual(self.breaker.state, "closed")
+
+    def test_half_open_probe(self):
+        self.breaker._open(self.now)
+        self.now = 30
+        probe = self.breaker.before_call()
+        self.assertTrue(probe)
+        with self.assertRaises(ProviderUnavailable):
+            self.breaker.before_call()  # one probe at a time
+        self.breaker.after_call(False, probe)
+        self.assertEqual(self.breaker.state, "open")
+
+        self.now = 60
+        self.call(True)
+        self.assertEqual(self.breaker.state, "closed")
+        self.assertEqual(self.breaker.snapshot()["opened"], 2)
+
+    def test_bulkhead_caps_in_flight_calls(self):
+        self.breaker.before_call()
+        self.breaker.before_call()
+        with self.assertRaises(ProviderUnavailable) as ctx:
+            self.breaker.before_call()
+        self.assertEqual(ctx.exception.reason, "bulkhead_full")
+        self.breaker.after_call(None)
+        self.breaker.before_call()
+
+    def test_client_counts_server_errors_but_not_client_errors(self):
+        fake = FakeProviderServer().start()
+        self.addCleanup(fake.stop)
+        statuses = [400, 404, 400, 500, 500, 500]
+        fake.routes[("POST", "/x")] = lambda h, b: (statuses.pop(0), {})
+        client = ProviderClient("test", breaker=self.breaker)
+        self.addCleanup(client.close)
+        for _ in range(5):
+            client.post(fake.base_url + "/x", "test.x")
+        self.assertEqual(self.breaker.state, "closed")
+        client.post(fake.base_url + "/x", "test.x")  # 3 of 6 failed
+        self.assertEqual(self.breaker.state, "open")
+        with self.assertRaises(ProviderUnavailable):
+            client.post(fake.base_url + "/x", "test.x")
+        self.assertEqual(len(fake.calls("/x")), 6)
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        deduplicator.clear()
+        self.addCleanup(deduplicator.clear)
+        self.daraja = FakeDarajaServer().start()
+        self.addCleanup(self.daraja.stop)
+        self.paypal = FakePayPalServer().start()
+        self.addCleanup(self.paypal.stop)
+        settings_override = override_settings(
+            MPESA_BASE_URL=self.daraja.base_url,
+            MPESA_SHORTCODE="174379",
+            MPESA_PASSKEY="passkey",
+            PAYPAL_BASE_URL=self.paypal.base_url,
+            PAYPAL_WEBHOOK_VERIFY_MODE="remote",
+            THROTTLE_ENABLED=False,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for manager in (mpesa.mpesa_token_manager, paypal.paypal_token_manager):
+            manager.invalidate()
+            self.addCleanup(manager.invalidate)
+        self.factory = AsyncRequestFactory()
+
+    async def post(self, view, path, body, **headers):
+        request = self.factory.post(path, json.dumps(body), content_type="application/json", **headers)
+        response = await view.as_view()(request)
+        return response.status_code, json.loads(response.content)
+
+    async def test_stk_push(self):
+        status, body = await self.post(
+            async_views.MpesaStkPushView, "/api/payments/mpesa/stkpush/", {"phone": "254700000000", "amount": "10.00"},
+        )
+        self.assertEqual(status, 200)
+        self.assertEqual(body["response"]["CheckoutRequestID"], "ws_CO_000000000001")
+        payment = await MpesaPayment.objects.aget(checkout_request_id="ws_CO_000000000001")
+        self.assertEqual(payment.merchant_request_id, "merchant-1")
+
+    async def test_stk_pushes_wait_on_the_provider_concurrently(self):
+        self.daraja.delay = 0.3
+        await mpesa.mpesa_token_manager.aget_token()
+        started = asyncio.get_running_loop().time()
+        results = await asyncio.gather(*[
+            self.post(async_views.MpesaStkPushView, "/api/payments/mpesa/stkpush/",
+                      {"phone": "254700000000", "amount": "10.00"})
+            for _ in range(20)
+        ])
+        elapsed = asyncio.get_running_loop().time() - started
+        self.assertEqual([status for status, _ in results], [200] * 20)
+        # Serially this would take 20 * 0.3s.
+        self.assertLess(elapsed, 3)
+        self.assertEqual(await MpesaPayment.objects.exclude(checkout_request_id=None).acount(), 20)
+
+    async def test_stk_push_validation_error(self):
+        status, body = await self.post(async_views.MpesaStkPushView, "/api/payments/mpesa/stkpush/", {"phone": ""})
+        self.assertEqual(status, 400)
+        self.assertIn("amount", body)
+
+    async def test_callback_is_applied_once(self):
+        payment = await MpesaPayment.objects.acreate(
+            phone="254700000000", amount=10, checkout_request_id="ws_CO_9", merchant_request_id="merchant-9",
+        )
+        callback = {"Body": {"stkCallback": {
+            "CheckoutRequestID": "ws_CO_9", "MerchantRequestID": "merchant-9", "ResultCode": 0,
+        }}}
+        first = await self.post(async_views.MpesaCallbackView, "/api/payments/mpesa/callback/", callback)
+        second = await self.post(async_views.MpesaCallbackView, "/api/payments/mpesa/callback/", callback)
+        self.assertEqual(first, (200, {"success": True}))
+        self.assertEqual(second, (200, {"success": True, "duplicate": True}))
+        await payment.arefresh_from_db()
+        self.assertEqual(payment.status, "completed")
+
+    async def test_paypal_webhook_remote_verification(self):
+        event = {"id": "WH-ASYNC-1", "event_type": "PAYMENT.CAPTURE.COMPLETED", "resource": {"id": "CAPTURE-1"}}
+        status, body = await self.post(async_views.PaypalWebhookVerifyView, "/api/payments/paypal/webhook/", event)
+        self.assertEqual((status, body), (200, {"success": True, "verified": True}))
+        self.assertEqual(len(self.paypal.calls(FakePayPalServer.VERIFY_PATH)), 1)
+        self.assertTrue(await PaypalPayment.objects.filter(order_id="CAPTURE-1").aexists())
+
+    @override_settings(INSTRUMENTATION_SERVER_TIMING=True)
+    async def test_asgi_requests_are_instrumented(self):
+        response = await self.async_client.get("/api/dashboard-counts/", secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("db;dur=", response["Server-Timing"])
+
+
+class PaymentRollupTests(TestCase):
+    def setUp(self):
+        self.today = timezone.localdate()
+
+    def rollups(self):
+        return {
+            (r.channel, r.currency, r.status): (r.count, r.total)
+            for r in DailyPaymentRollup.objects.filter(day=self.today).exclude(count=0)
+        }
+
+    def test_rows_are_updated_in_key_order(self):
+        # Writers touching the same rows must lock them in one order.
+        keys = [(self.today, "mpesa", "KES", status) for status in ("pending", "failed", "completed")]
+        rollups.apply_deltas({key: (1, Decimal("1")) for key in keys})
+        with CaptureQueriesContext(connection) as queries:
+            rollups.apply_deltas({key: (1, Decimal("1")) for key in keys})
+        updated = [status for q in queries.captured_queries for status in ("completed", "failed", "pending")
+                   if q["sql"].startswith("UPDATE") and f"'{status}'" in q["sql"]]
+        self.assertEqual(updated, ["completed", "failed", "pending"])
+
+    def test_status_changes_move_payments_between_rows(self):
+        payment = MpesaPayment.objects.create(phone="254700000000", amount=10, checkout_request_id="ws_CO_1")
+        MpesaPayment.objects.create(phone="254700000001", amount=5)
+        self.assertEqual(self.rollups(), {("mpesa", "KES", "pending"): (2, Decimal("15"))})
+
+        apply_stk_callback({"Body": {"stkCallback": {"CheckoutRequestID": "ws_CO_1", "ResultCode": 0}}})
+        self.assertEqual(self.rollups(), {("mpesa", "KES", "pending"): (1, Decimal("5")),
+                                          ("mpesa", "KES", "completed"): (1, Decimal("10"))})
+        payment.delete()
+        self.assertEqual(self.rollups(), {("mpesa", "KES", "pending"): (1, Decimal("5"))})
+
+    def test_bulk_paths_and_paypal_amounts(self):
+        create_batch([{"phone": "254700000000", "amount": Decimal("20")}] * 3, queue=False)
+        views.store_paypal_event({"event_type": "PAYMENT.CAPTURE.COMPLETED", "resource": {
+            "id": "CAP-1", "amount": {"value": "12.50", "currency_code": "EUR"}}}, [])
+        self.assertEqual(PaypalPayment.objects.get().amount, Decimal("12.50"))
+        self.assertEqual(self.rollups(), {("mpesa", "KES", "pending"): (3, Decimal("60")),
+                                          ("paypal", "EUR", "PAYMENT.CAPTURE.COMPLETED"): (1, Decimal("12.50"))})
+
+    def test_backfill_rebuilds_from_the_payment_tables(self):
+        MpesaPayment.objects.create(phone="254700000000", amount=10, status="completed")
+        old = PaypalPayment.objects.create(order_id="O-1", status="COMPLETED", raw_payload={
+            "resource": {"purchase_units": [{"amount": {"value": "7.00", "currency_code": "USD"}}]}})
+        expected = {("mpesa", "KES", "completed"): (1, Decimal("10")), ("paypal", "USD", "COMPLETED"): (1, Decimal("7"))}
+        DailyPaymentRollup.objects.all().delete()
+        DailyPaymentRollup.objects.create(day=self.today, channel="mpesa", currency="KES", status="stale", count=9)
+
+        call_command("backfill_payment_rollups", "--chunk-size", "1", stdout=StringIO())
+        self.assertEqual(self.rollups(), expected)
+        old.refresh_from_db()
+        self.assertEqual((old.amount, old.currency), (Decimal("7.00"), "USD"))
+
+    def test_stats_endpoint(self):
+        MpesaPayment.objects.create(phone="254700000000", amount=10, status="completed")
+        MpesaPayment.objects.create(phone="254700000001", amount=15, status="completed")
+        PaypalPayment.objects.create(order_id="O-1", amount=5, currency="USD", status="COMPLETED")
+        DailyPaymentRollup.objects.create(day=self.today - datetime.timedelta(days=60), channel="mpesa",
+                                          currency="KES", status="completed", count=4, total=100)
+        client = APIClient()
+        self.assertEqual(client.get("/api/payments/stats/", secure=True).status_code, 403)
+        client.force_login(get_user_model().objects.create_user("finance", password="pw", is_staff=True))
+
+        with self.assertNumQueries(4):  # session, user, rows, totals
+            res = client.get("/api/payments/stats/?group_by=channel,currency", secure=True)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()["rows"], [
+            {"channel": "mpesa", "currency": "KES", "count": 2, "total": "25.00"},
+            {"channel": "paypal", "currency": "USD", "count": 1, "total": "5.00"},
+        ])
+        start = (self.today - datetime.timedelta(days=90)).isoformat()
+        res = client.get(f"/api/payments/stats/?start={start}&group_by=channel", secure=True)
+        self.assertEqual(res.json()["rows"][0], {"channel": "mpesa", "count": 6, "total": "125.00"})
+        self.assertEqual(res.json()["totals"][0]["currency"], "KES")
+        self.assertEqual(client.get("/api/payments/stats/?group_by=phone", secure=True).status_code, 400)
+        self.assertEqual(client.get(f"/api/payments/stats/?start={self.today}&end={start}", secure=True).status_code, 400)
+
+
+class PaymentImportTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+
+    def write(self, name, text):
+        path = os.path.join(self.dir, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def run_import(self, path, *args):
+        out, err = StringIO(), StringIO()
+        call_command("import_payments", path, "--workers", "0", "--batch-size", "2", *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_mpesa_export_upserts_by_checkout_request_id(self):
+        MpesaPayment.objects.create(phone="254700000001", amount=10, checkout_request_id="ws_CO_1",
+                                    mpesa_response={"from": "stk"})
+        path = self.write("daraja.csv", (
+            "CheckoutRequestID,MerchantRequestID,ResultCode,Amount,MpesaReceiptNumber,TransactionDate,PhoneNumber\n"
+            "ws_CO_1,,0,10.00,RKA1,20260101120000,\n"
+            "ws_CO_2,m-2,0,\"1,250\",RKA2,20260101120000,254700000002\n"
+            "ws_CO_3,,0,abc,,,\n"
+            ",,0,5,,,\n"
+        ))
+        out, err = self.run_import(path)
+        self.assertIn("1 created, 1 updated, 2 rejected", out)
+        self.assertIn("row 3: bad amount 'abc'", err)
+        self.assertFalse(os.path.exists(path + ".checkpoint"))
+
+        updated = MpesaPayment.objects.get(checkout_request_id="ws_CO_1")
+        self.assertEqual((updated.status, updated.phone, updated.mpesa_response), ("completed", "254700000001", {"from": "stk"}))
+        created = MpesaPayment.objects.get(checkout_request_id="ws_CO_2")
+        self.assertEqual((created.amount, created.phone, created.merchant_request_id), (Decimal("1250"), "254700000002", "m-2"))
+        self.assertEqual(created.mpesa_response["receipt"], "RKA2")
+        self.assertEqual(timezone.localtime(created.created_at).replace(tzinfo=None), datetime.datetime(2026, 1, 1, 12))
+        rollup = DailyPaymentRollup.objects.get(day=datetime.date(2026, 1, 1))
+        self.assertEqual((rollup.status, rollup.count, rollup.total), ("completed", 1, Decimal("1250")))
+        self.assertFalse(DailyPaymentRollup.objects.filter(status="pending").exclude(count=0).exists())
+
+    def test_pending_rows_do_not_undo_a_settled_status(self):
+        MpesaPayment.objects.create(phone="254700000001", amount=10, checkout_request_id="ws_CO_1", status="completed")
+        MpesaPayment.objects.create(phone="254700000002", amount=20, checkout_request_id="ws_CO_2")
+        path = self.write("pending.csv", "CheckoutRequestID,Amount,Status\nws_CO_1,10,Pending\nws_CO_2,20,Failed\n")
+        out, _ = self.run_import(path)
+        self.assertIn("0 created, 2 updated", out)
+        self.assertEqual(dict(MpesaPayment.objects.values_list("checkout_request_id", "status")),
+                         {"ws_CO_1": "completed", "ws_CO_2": "failed"})
+
+    def test_paypal_export_resumes_from_checkpoint(self):
+        rows = "".join(f"10/0{i}/2026,09:00:00,PDT,Donor {i},Completed,USD,{i}.50,TX-{i}\n" for i in range(1, 6))
+        path = self.write("paypal.csv", '"Date","Time","TimeZone","Name","Status","Currency","Gross","Transaction ID"\n' + rows)
+        with open(path + ".checkpoint", "w") as f:
+            json.dump({"source": os.path.realpath(path), "size": os.path.getsize(path), "format": "paypal",
+                       "rows": 2, "created": 2, "updated": 0, "rejected": 0}, f)
+
+        out, _ = self.run_import(path)
+        self.assertIn("Resumed after row 2", out)
+        self.assertIn("Imported 5 paypal rows: 5 created", out)
+        self.assertEqual(sorted(PaypalPayment.objects.values_list("order_id", flat=True)), ["TX-3", "TX-4", "TX-5"])
+        payment = PaypalPayment.objects.get(order_id="TX-3")
+        self.assertEqual((payment.amount, payment.currency, payment.status), (Decimal("3.50"), "USD", "COMPLETED"))
+        self.assertEqual(payment.created_at, datetime.datetime(2026, 10, 3, 16, tzinfo=datetime.timezone.utc))
+
+        with open(path + ".checkpoint", "w") as f:
+            json.dump({"source": "elsewhere.csv", "size": 1, "format": "paypal", "rows": 2}, f)
+        with self.assertRaisesMessage(Exception, "--restart"):
+            self.run_import(path)
+        out, _ = self.run_import(path, "--restart")
+        self.assertIn("2 created, 3 updated", out)
+
+    def test_process_pool(self):
+        rows = "".join(f"ws_CO_{i},0,{i + 1},2026-01-02 08:00:00\n" for i in range(50))
+        path = self.write("pool.csv", "CheckoutRequestID,ResultCode,Amount,TransactionDate\n" + rows)
+        out = StringIO()
+        call_command("import_payments", path, "--workers", "2", "--batch-size", "7", stdout=out)
+        self.assertIn("50 created", out.getvalue())
+        self.assertEqual(MpesaPayment.objects.filter(status="completed", phone="unknown").count(), 50)
+
+
+class PaymentPayloadTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.archive_dir = tmp.name
+        self.payment = MpesaPayment.objects.create(phone="254700000000", amount=10, checkout_request_id="ws_CO_1",
+                                                   mpesa_response={"stk": "accepted"})
+
+    def test_payloads_load_lazily_from_their_own_table(self):
+        self.assertNotIn("mpesa_response", [f.name for f in MpesaPayment._meta.concrete_fields])
+        with self.assertNumQueries(1):
+            payment = MpesaPayment.objects.get(pk=self.payment.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(payment.mpesa_response, {"stk": "accepted"})
+            self.assertEqual(payment.mpesa_response, {"stk": "accepted"})
+
+        apply_stk_callback({"Body": {"stkCallback": {"CheckoutRequestID": "ws_CO_1", "ResultCode": 0}}})
+        payment = MpesaPayment.objects.get(pk=self.payment.pk)
+        self.assertEqual(payment.mpesa_response["Body"]["stkCallback"]["ResultCode"], 0)
+        payment.delete()
+        self.assertFalse(PaymentPayload.objects.exists())
+
+    def test_archive_moves_old_payloads_to_segments(self):
+        MpesaPayment.objects.filter(pk=self.payment.pk).update(created_at=timezone.now() - datetime.timedelta(days=100))
+        recent = MpesaPayment.objects.create(phone="254700000001", amount=5, mpesa_response={"stk": "recent"})
+        with override_settings(PAYMENT_ARCHIVE_DIR=self.archive_dir):
+            out = StringIO()
+            call_command("archive_payment_payloads", "--older-than", "90", stdout=out)
+            self.assertIn("mpesa: 1 payload(s) archived", out.getvalue())
+
+            stored = PaymentPayload.objects.get(payment_id=self.payment.pk)
+            self.assertIsNone(stored.body)
+            self.assertTrue(os.path.exists(os.path.join(self.archive_dir, stored.segment)))
+            self.assertEqual(PaymentPayload.objects.get(payment_id=recent.pk).segment, "")
+            self.assertEqual(MpesaPayment.objects.get(pk=self.payment.pk).mpesa_response, {"stk": "accepted"})
+            self.assertEqual(payloads.bodies("mpesa", [self.payment.pk, recent.pk]),
+                             {self.payment.pk: {"stk": "accepted"}, recent.pk: {"stk": "recent"}})
+
+            admin = get_user_model().objects.create_superuser("admin", "admin@example.com", "pw")
+            self.client.force_login(admin)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get("/admin/payments/mpesapayment/", secure=True).status_code, 200)
+            self.assertFalse(any("paymentpayload" in q["sql"] for q in queries.captured_queries))
+            res = self.client.get(f"/admin/payments/mpesapayment/{self.payment.pk}/change/", secure=True)
+            self.assertContains(res, "accepted")
+
+            # Writing it again brings it back into the table.
+            payment = MpesaPayment.objects.get(pk=self.payment.pk)
+            payment.mpesa_response = {"stk": "rewritten"}
+            payment.save()
+            stored.refresh_from_db()
+            self.assertEqual((stored.body, stored.segment), ({"stk": "rewritten"}, ""))
+
+    def test_archive_needs_a_verified_segment_in_a_configured_dir(self):
+        MpesaPayment.objects.filter(pk=self.payment.pk).update(created_at=timezone.now() - datetime.timedelta(days=100))
+        with override_settings(PAYMENT_ARCHIVE_DIR=""), self.assertRaisesMessage(CommandError, "PAYMENT_ARCHIVE_DIR"):
+            call_command("archive_payment_payloads", stdout=StringIO())
+
+        with override_settings(PAYMENT_ARCHIVE_DIR=self.archive_dir), \
+                mock.patch.object(payloads, "read_segment", return_value={}), \
+                self.assertRaisesMessage(RuntimeError, "did not read back"):
+            payloads.archive("mpesa", timezone.now())
+        stored = PaymentPayload.objects.get(payment_id=self.payment.pk)
+        self.assertEqual((stored.body, stored.segment), ({"stk": "accepted"}, ""))
+        self.assertEqual([files for _, _, files in os.walk(self.archive_dir) if files], [])
+
+
+class PaymentAdminTests(TestCase):
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_superuser("admin", "admin@example.com", "pw"))
+
+    def add(self, count):
+        start = MpesaPayment.objects.count()
+        MpesaPayment.objects.bulk_create([
+            MpesaPayment(phone="254700000000", amount=100, status="completed" if i % 3 else "failed",
+                         checkout_request_id=f"ws_CO_admin_{i}")
+            for i in range(start, start + count)
+        ])
+        today = timezone.localdate()
+        rollups.backfill(today, today)
+
+    def changelist(self, query=""):
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(f"/admin/payments/mpesapayment/{query}", secure=True)
+        self.assertEqual(res.status_code, 200)
+        return res, len(queries.captured_queries)
+
+    def test_fixed_query_count(self):
+        self.add(3)
+        _, few = self.changelist()
+        self.add(250)
+        res, many = self.changelist()
+        self.assertEqual(few, many)
+        self.assertEqual(res.context["cl"].result_list[0].checkout_request_id, "ws_CO_admin_252")
+        since = (timezone.now() - datetime.timedelta(days=1)).isoformat()
+        _, filtered = self.changelist(f"?status=failed&{urlencode({'created_at__gte': since})}")
+        self.assertEqual(filtered, many)
+
+    def test_status_filter_offers_rollup_statuses(self):
+        self.add(3)
+        res, _ = self.changelist("?status=failed")
+        self.assertEqual(res.context["cl"].result_count, 1)
+        status_filter = res.context["cl"].filter_specs[0]
+        self.assertEqual(status_filter.lookup_choices, [("completed", "completed"), ("failed", "failed")])
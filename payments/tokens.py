@@ -0,0 +1,187 @@
+import logging
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+
+# ----------- Cached OAuth access tokens -----------
+class TokenManager:
+    """
+    Caches a provider OAuth access token until shortly before it expires.
+
+    ``fetch`` is a callable returning the provider's token response as a dict
+    (``access_token`` and ``expires_in``). Tokens are refreshed in the
+    background once they enter the ``proactive_window`` and fetched
+    synchronously once they are within ``refresh_margin`` of expiry. Only one
+    thread per process fetches at a time; when ``cache_alias`` is set the
+    token (and a short refresh lock) is shared across workers through
+    Django's cache.
+    """
+
+    def __init__(self, name, fetch, refresh_margin=60, proactive_window=300,
+                 default_expires_in=3599, cache_alias=None, lock_timeout=20):
+        self.name = name
+        self.fetch = fetch
+        self.refresh_margin = refresh_margin
+        self.proactive_window = max(proactive_window, refresh_margin)
+        self.default_expires_in = default_expires_in
+        self.cache_alias = cache_alias
+        self.lock_timeout = lock_timeout
+
+        self._token = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+        self._background = None
+        self._stats_lock = threading.Lock()
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "refreshes": 0,
+            "background_refreshes": 0,
+            "shared_hits": 0,
+            "failures": 0,
+        }
+
+    # ----- public API -----
+    def get_token(self):
+        now = time.time()
+        token, expires_at = self._token, self._expires_at
+        if token and now < expires_at - self.refresh_margin:
+            self._count("hits")
+            if now >= expires_at - self.proactive_window:
+                self._refresh_in_background()
+            return token
+
+        self._count("misses")
+        with self._lock:
+            # Another thread may have refreshed while we waited for the lock.
+            if self._token and time.time() < self._expires_at - self.refresh_margin:
+                return self._token
+            return self._refresh_locked()
+
+    async def aget_token(self):
+        """``get_token`` for async views; only a refresh leaves the event loop."""
+        token, expires_at = self._token, self._expires_at
+        if token and time.time() < expires_at - self.proactive_window:
+            self._count("hits")
+            return token
+        return await sync_to_async(self.get_token, thread_sensitive=False)()
+
+    def invalidate(self):
+        """Drop the cached token, e.g. after the provider answered 401."""
+        with self._lock:
+            self._token = None
+            self._expires_at = 0.0
+        cache = self._shared_cache()
+        if cache is not None:
+            cache.delete(self._cache_key)
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._counters)
+        stats["expires_in"] = max(0, int(self._expires_at - time.time())) if self._token else 0
+        return stats
+
+    # ----- internals -----
+    @property
+    def _cache_key(self):
+        return f"payments:token:{self.name}"
+
+    def _count(self, key):
+        with self._stats_lock:
+            self._counters[key] += 1
+
+    def _shared_cache(self):
+        if not self.cache_alias:
+            return None
+        return caches[self.cache_alias]
+
+    def _store(self, token, expires_at):
+        self._token = token
+        self._expires_at = expires_at
+
+    def _load_shared(self, cache, margin):
+        entry = cache.get(self._cache_key)
+        if entry and time.time() < entry["expires_at"] - margin:
+            self._store(entry["token"], entry["expires_at"])
+            self._count("shared_hits")
+            return entry["token"]
+        return None
+
+    def _refresh_locked(self, background=False):
+        """Fetch a new token. The caller must hold ``self._lock``."""
+        cache = self._shared_cache()
+        if cache is None:
+            return self._fetch_and_store(background)
+
+        # A background refresh only accepts a token that is fresher than ours.
+        margin = self.proactive_window if background else self.refresh_margin
+        token = self._load_shared(cache, margin)
+        if token:
+            return token
+
+        lock_key = f"{self._cache_key}:lock"
+        deadline = time.time() + self.lock_timeout
+        while not cache.add(lock_key, 1, timeout=self.lock_timeout):
+            # Another worker is refreshing; use its token as soon as it lands.
+            time.sleep(0.05)
+            token = self._load_shared(cache, margin)
+            if token:
+                return token
+            if time.time() >= deadline:
+                break
+        try:
+            return self._fetch_and_store(background, cache)
+        finally:
+            cache.delete(lock_key)
+
+    def _fetch_and_store(self, background, cache=None):
+        try:
+            data = self.fetch()
+        except Exception:
+            self._count("failures")
+            raise
+        token = data.get("access_token")
+        if not token:
+            self._count("failures")
+            raise ValueError(f"{self.name} OAuth response did not include an access_token")
+        try:
+            expires_in = int(data.get("expires_in") or self.default_expires_in)
+        except (TypeError, ValueError):
+            expires_in = self.default_expires_in
+        expires_at = time.time() + expires_in
+
+        self._store(token, expires_at)
+        self._count("background_refreshes" if background else "refreshes")
+        if cache is not None:
+            cache.set(self._cache_key, {"token": token, "expires_at": expires_at}, timeout=expires_in)
+        return token
+
+    def _refresh_in_background(self):
+        if self._background is not None and self._background.is_alive():
+            return
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            if self._background is not None and self._background.is_alive():
+                return
+            self._background = threading.Thread(
+                target=self._background_refresh, name=f"{self.name}-token-refresh", daemon=True
+            )
+            self._background.start()
+        finally:
+            self._lock.release()
+
+    def _background_refresh(self):
+        with self._lock:
+            # A foreground refresh may already have replaced the token.
+            if time.time() < self._expires_at - self.proactive_window:
+                return
+            try:
+                self._refresh_locked(background=True)
+            except Exception as exc:
+                logger.warning("Background %s token refresh failed: %s", self.name, exc)
@@ -1,10 +1,18 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+
+# Under ASGI the provider-bound endpoints are served by their async versions.
+provider_views = async_views if getattr(settings, "ASGI_MODE", False) else views
 
 urlpatterns = [
     path('', views.payments_home, name='payments-home'),
-    path('mpesa/stkpush/', views.MpesaStkPushView.as_view(), name='mpesa-stkpush'),
-    path('mpesa/callback/', views.MpesaCallbackView.as_view(), name='mpesa-callback'),
-    path('paypal/webhook/', views.PaypalWebhookVerifyView.as_view(), name='paypal-webhook'),
+    path('mpesa/stkpush/', provider_views.MpesaStkPushView.as_view(), name='mpesa-stkpush'),
+    path('mpesa/stkpush/bulk/', views.BulkStkPushView.as_view(), name='mpesa-stkpush-bulk'),
+    path('mpesa/batches/<int:pk>/', views.StkPushBatchView.as_view(), name='mpesa-batch'),
+    path('mpesa/<int:pk>/status/', views.MpesaPaymentStatusView.as_view(), name='mpesa-status'),
+    path('mpesa/callback/', provider_views.MpesaCallbackView.as_view(), name='mpesa-callback'),
+    path('paypal/webhook/', provider_views.PaypalWebhookVerifyView.as_view(), name='paypal-webhook'),
     path('paypal/log/', views.PaypalLogView.as_view(), name='paypal-log'),
+    path('stats/', views.PaymentStatsView.as_view(), name='payment-stats'),
 ]
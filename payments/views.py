@@ -1,37 +1,49 @@
-import base64
-import requests
+import hashlib
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
 from django.http import JsonResponse
-from django.utils import timezone
+from django.urls import reverse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
-from .serializers import MpesaTransactionSerializer, PaypalLogSerializer
-from .models import MpesaPayment, PaypalPayment
+from rest_framework.exceptions import ParseError
+from backend.throttling import StkPushThrottle
+from .serializers import BulkStkPushSerializer, MpesaTransactionSerializer, PaymentStatsQuerySerializer, PaypalLogSerializer
+from .models import MpesaPayment, PaypalPayment, StkPushBatch, StkPushJob
+from .breaker import ProviderUnavailable, get_breaker
+from .bulk import create_batch, read_csv
+from .rollups import stats
+from .paypal import payload_amount, verify_webhook, webhook_order_id
+from .idempotency import deduplicator, mpesa_event_key, paypal_event_keys
+from .mpesa import apply_stk_callback, send_stk_push
 
-# ----------- Helpers: M-Pesa endpoints & tokens -----------
-def get_mpesa_urls():
-    base = "https://api.safaricom.co.ke" if getattr(settings, "MPESA_ENV", "sandbox") == "production" else "https://sandbox.safaricom.co.ke"
-    return {
-        "oauth": f"{base}/oauth/v1/generate?grant_type=client_credentials",
-        "stkpush": f"{base}/mpesa/stkpush/v1/processrequest",
-    }
-
-def get_mpesa_token():
-    urls = get_mpesa_urls()
-    consumer_key = settings.MPESA_CONSUMER_KEY
-    consumer_secret = settings.MPESA_CONSUMER_SECRET
-    resp = requests.get(urls["oauth"], auth=(consumer_key, consumer_secret), timeout=15)
-    resp.raise_for_status()
-    return resp.json().get("access_token")
+# ----------- Provider outages -----------
+def unavailable_body(exc):
+    return {"success": False, "error": str(exc), "reason": exc.reason, "retry_after": exc.retry_after}
 
-def generate_mpesa_password(shortcode, passkey, timestamp):
-    data = f"{shortcode}{passkey}{timestamp}"
-    return base64.b64encode(data.encode()).decode()
+def unavailable_response(exc):
+    """503 for a call refused by the provider's circuit breaker or bulkhead."""
+    return Response(unavailable_body(exc), status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    headers={"Retry-After": str(exc.retry_after)})
 
 # ----------- M-Pesa STK Push -----------
+def queue_stk_push(phone, amount):
+    """Create the payment and its dispatch job; returns the 202 response body."""
+    with transaction.atomic():
+        mpesa_obj = MpesaPayment.objects.create(phone=phone, amount=amount, status="pending")
+        StkPushJob.objects.create(payment=mpesa_obj)
+    return {
+        "success": True,
+        "queued": True,
+        "payment_id": mpesa_obj.id,
+        "status_url": reverse("mpesa-status", args=[mpesa_obj.id]),
+    }
+
 class MpesaStkPushView(APIView):
     permission_classes = [permissions.AllowAny]
+    # Per IP and per phone; rejected before the serializer or a row is touched.
+    throttle_classes = [StkPushThrottle]
 
     def post(self, request):
         serializer = MpesaTransactionSerializer(data=request.data)
@@ -39,120 +51,202 @@ class MpesaStkPushView(APIView):
         phone = serializer.validated_data['phone']
         amount = serializer.validated_data['amount']
 
-        mpesa_obj = MpesaPayment.objects.create(phone=phone, amount=amount, status="pending")
+        if getattr(settings, "MPESA_STK_ASYNC", False):
+            return Response(queue_stk_push(phone, amount), status=status.HTTP_202_ACCEPTED)
 
         try:
-            token = get_mpesa_token()
-            urls = get_mpesa_urls()
-            shortcode = settings.MPESA_SHORTCODE
-            passkey = settings.MPESA_PASSKEY
-            timestamp = timezone.now().strftime("%Y%m%d%H%M%S")
-            password = generate_mpesa_password(shortcode, passkey, timestamp)
-
-            payload = {
-                "BusinessShortCode": shortcode,
-                "Password": password,
-                "Timestamp": timestamp,
-                "TransactionType": "CustomerPayBillOnline",
-                "Amount": str(amount),
-                "PartyA": phone,
-                "PartyB": shortcode,
-                "PhoneNumber": phone,
-                "CallBackURL": settings.MPESA_CALLBACK_URL,
-                "AccountReference": "EPICARE",
-                "TransactionDesc": "Donation"
-            }
-
-            headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-
-            stk_res = requests.post(urls["stkpush"], json=payload, headers=headers, timeout=20)
-            stk_res.raise_for_status()
-            stk_data = stk_res.json()
-
-            mpesa_obj.mpesa_response = stk_data
-            mpesa_obj.checkout_request_id = stk_data.get("CheckoutRequestID")
-            mpesa_obj.merchant_request_id = stk_data.get("MerchantRequestID")
-            mpesa_obj.save()
+            # Fail fast while Safaricom is down rather than piling up failed rows.
+            get_breaker("mpesa").check()
+        except ProviderUnavailable as exc:
+            return unavailable_response(exc)
 
+        mpesa_obj = MpesaPayment.objects.create(phone=phone, amount=amount, status="pending")
+
+        try:
+            stk_data = send_stk_push(mpesa_obj)
             return Response({"success": True, "response": stk_data}, status=status.HTTP_200_OK)
 
+        except ProviderUnavailable as exc:
+            mpesa_obj.status = "failed"
+            mpesa_obj.mpesa_response = {"error": str(exc)}
+            mpesa_obj.save()
+            return unavailable_response(exc)
         except Exception as e:
             mpesa_obj.status = "failed"
             mpesa_obj.mpesa_response = {"error": str(e)}
             mpesa_obj.save()
             return Response({"success": False, "error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+# ----------- M-Pesa Bulk STK Push -----------
+def bulk_request_data(request):
+    """Serializer input from JSON (object or bare list), a text/csv body or a multipart ``file``."""
+    try:
+        if request.content_type.startswith("text/csv"):
+            return {"campaign": request.query_params.get("campaign", ""), "items": read_csv(request.body.decode("utf-8-sig"))}
+        upload = request.FILES.get("file") if request.content_type.startswith("multipart/") else None
+        if upload is not None:
+            return {"campaign": request.data.get("campaign", ""), "items": read_csv(upload.read().decode("utf-8-sig"))}
+    except UnicodeDecodeError:
+        raise ParseError("CSV must be UTF-8 encoded.")
+    if isinstance(request.data, list):
+        return {"items": request.data}
+    return request.data
+
+class BulkStkPushView(APIView):
+    """
+    Queue a campaign's STK pushes in one request. Rows are inserted with
+    ``bulk_create`` and sent by ``run_stk_dispatcher`` under
+    MPESA_STK_RATE_LIMIT; poll the returned ``status_url`` for progress.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request):
+        serializer = BulkStkPushSerializer(data=bulk_request_data(request))
+        serializer.is_valid(raise_exception=True)
+        batch, _ = create_batch(serializer.validated_data["items"], serializer.validated_data["campaign"])
+        return Response({
+            "success": True,
+            "batch_id": batch.id,
+            "total": batch.total,
+            "status_url": reverse("mpesa-batch", args=[batch.id]),
+        }, status=status.HTTP_202_ACCEPTED)
+
+class StkPushBatchView(APIView):
+    """Progress of a bulk push: counts by status plus per-item outcomes, paged with ``?after=<payment_id>``."""
+    permission_classes = [permissions.IsAdminUser]
+    page_size = 500
+
+    def get(self, request, pk):
+        batch = StkPushBatch.objects.filter(pk=pk).first()
+        if batch is None:
+            return Response({"error": "Batch not found"}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            after = int(request.query_params.get("after") or 0)
+        except ValueError:
+            raise ParseError("'after' must be a payment id.")
+
+        payments = MpesaPayment.objects.filter(batch=batch)
+        rows = list(
+            payments.filter(id__gt=after).order_by("id").values(
+                "id", "phone", "amount", "status", "checkout_request_id",
+                "dispatch_job__status", "dispatch_job__last_error",
+            )[:self.page_size]
+        )
+        return Response({
+            "batch_id": batch.id,
+            "campaign": batch.campaign,
+            "total": batch.total,
+            "payments": dict(payments.values_list("status").annotate(n=Count("id")).order_by()),
+            "dispatch": dict(
+                StkPushJob.objects.filter(payment__batch=batch).values_list("status").annotate(n=Count("id")).order_by()
+            ),
+            "items": [{
+                "payment_id": row["id"],
+                "phone": row["phone"],
+                "amount": str(row["amount"]),
+                "status": row["status"],
+                "dispatch_status": row["dispatch_job__status"],
+                "checkout_request_id": row["checkout_request_id"],
+                "error": row["dispatch_job__last_error"] or "",
+            } for row in rows],
+            "next_after": rows[-1]["id"] if len(rows) == self.page_size else None,
+        })
+
+# ----------- M-Pesa Payment Status -----------
+class MpesaPaymentStatusView(APIView):
+    """
+    Cheap polling endpoint for queued STK pushes. Clients should send the
+    returned ETag back as If-None-Match and get a 304 until something changes.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, pk):
+        row = MpesaPayment.objects.filter(pk=pk).values(
+            "id", "status", "checkout_request_id", "updated_at",
+            "dispatch_job__status", "dispatch_job__updated_at",
+        ).first()
+        if row is None:
+            return Response({"error": "Payment not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        version = f"{row['id']}:{row['status']}:{row['updated_at'].isoformat()}:{row['dispatch_job__updated_at']}"
+        etag = '"%s"' % hashlib.md5(version.encode()).hexdigest()
+        if etag in request.headers.get("If-None-Match", ""):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response({
+                "payment_id": row["id"],
+                "status": row["status"],
+                "dispatch_status": row["dispatch_job__status"],
+                "checkout_request_id": row["checkout_request_id"],
+                "updated_at": row["updated_at"],
+            })
+        response["ETag"] = etag
+        response["Cache-Control"] = "no-cache"
+        return response
+
 # ----------- M-Pesa Callback -----------
+def process_mpesa_callback(payload, event_key):
+    """Apply a callback unless another delivery claimed it first; returns False for a replay."""
+    with transaction.atomic():
+        if not deduplicator.claim("mpesa", event_key):
+            return False
+        apply_stk_callback(payload)
+    return True
+
 class MpesaCallbackView(APIView):
     permission_classes = [permissions.AllowAny]
 
     def post(self, request):
         payload = request.data
         try:
-            callback = payload.get("Body", {}).get("stkCallback", payload)
-            checkout_id = callback.get("CheckoutRequestID")
-            result_code = callback.get("ResultCode", 1)
-            merchant_id = callback.get("MerchantRequestID")
-
-            mpesa_obj = MpesaPayment.objects.filter(
-                checkout_request_id=checkout_id
-            ).first() or MpesaPayment.objects.filter(
-                merchant_request_id=merchant_id
-            ).first()
-
-            if mpesa_obj:
-                mpesa_obj.mpesa_response = payload
-                mpesa_obj.status = "completed" if int(result_code) == 0 else "failed"
-                mpesa_obj.save()
-            else:
-                MpesaPayment.objects.create(phone="unknown", amount=0, status="failed", mpesa_response=payload)
-
+            event_key = mpesa_event_key(payload)
+            # Safaricom retries callbacks; replays are acked without touching the payment.
+            if deduplicator.seen("mpesa", event_key) or not process_mpesa_callback(payload, event_key):
+                return Response({"success": True, "duplicate": True}, status=status.HTTP_200_OK)
             return Response({"success": True}, status=status.HTTP_200_OK)
         except Exception as exc:
             return Response({"success": False, "error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
 # ----------- PayPal Webhook Verification -----------
+def store_paypal_event(event, event_keys):
+    """Record a verified webhook event; returns False if it was already processed."""
+    with transaction.atomic():
+        if event_keys and not deduplicator.claim("paypal", event_keys[0]):
+            return False
+        defaults = {"raw_payload": event, "status": event.get("event_type", "UNKNOWN")}
+        # Keep the amount in its column so rollups and admin lists needn't open the payload.
+        amount, currency = payload_amount(event)
+        if amount is not None:
+            defaults["amount"] = amount
+        if currency:
+            defaults["currency"] = currency
+        PaypalPayment.objects.update_or_create(order_id=webhook_order_id(event), defaults=defaults)
+    return True
+
 class PaypalWebhookVerifyView(APIView):
     permission_classes = [permissions.AllowAny]
 
     def post(self, request):
+        # Read the raw body before DRF parses it; the signature covers these exact bytes.
+        raw_body = request.body
         event = request.data
         headers = request.headers
-        verify_payload = {
-            "transmission_id": headers.get("PayPal-Transmission-Id"),
-            "transmission_time": headers.get("PayPal-Transmission-Time"),
-            "cert_url": headers.get("PayPal-Cert-Url"),
-            "auth_algo": headers.get("PayPal-Auth-Algo"),
-            "transmission_sig": headers.get("PayPal-Transmission-Sig"),
-            "webhook_id": getattr(settings, "PAYPAL_WEBHOOK_ID", None),
-            "webhook_event": event,
-        }
+        event_keys = paypal_event_keys(event, headers)
+        if any(deduplicator.seen("paypal", key) for key in event_keys):
+            return Response({"success": True, "verified": True, "duplicate": True}, status=status.HTTP_200_OK)
 
         try:
-            base = "https://api.paypal.com" if getattr(settings, "PAYPAL_ENV", "sandbox") == "production" else "https://api.sandbox.paypal.com"
-
-            token_res = requests.post(
-                f"{base}/v1/oauth2/token",
-                auth=(settings.PAYPAL_CLIENT_ID, settings.PAYPAL_CLIENT_SECRET),
-                data={"grant_type": "client_credentials"},
-            )
-            token_res.raise_for_status()
-            access_token = token_res.json().get("access_token")
-
-            verify_res = requests.post(
-                f"{base}/v1/notifications/verify-webhook-signature",
-                headers={"Content-Type": "application/json", "Authorization": f"Bearer {access_token}"},
-                json=verify_payload,
-                timeout=15,
-            )
-            verify_res.raise_for_status()
-            verify_data = verify_res.json()
-
-            if verify_data.get("verification_status") == "SUCCESS":
-                PaypalPayment.objects.create(raw_payload=event, status=event.get("event_type", "UNKNOWN"))
+            verified, verify_data = verify_webhook(headers, raw_body, event)
+
+            if verified:
+                if not store_paypal_event(event, event_keys):
+                    return Response({"success": True, "verified": True, "duplicate": True}, status=status.HTTP_200_OK)
                 return Response({"success": True, "verified": True}, status=status.HTTP_200_OK)
             else:
                 return Response({"success": False, "verified": False, "detail": verify_data}, status=status.HTTP_400_BAD_REQUEST)
+        except ProviderUnavailable as exc:
+            # PayPal redelivers webhooks that don't get a 2xx.
+            return unavailable_response(exc)
         except Exception as exc:
             return Response({"success": False, "error": str(exc)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -170,6 +264,28 @@ class PaypalLogView(APIView):
         paypal_obj.save()
         return Response({"success": True, "order_id": paypal_obj.order_id}, status=status.HTTP_200_OK)
 
+# ----------- Payment Stats -----------
+class PaymentStatsView(APIView):
+    """
+    Donation counts and totals for a date range, grouped by any of day,
+    channel, currency and status. Answered from ``DailyPaymentRollup``
+    (see ``payments/rollups.py``), never from the payment tables.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        query = PaymentStatsQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        start, end, group_by = (query.validated_data[k] for k in ("start", "end", "group_by"))
+        return Response({
+            "start": start,
+            "end": end,
+            "group_by": group_by,
+            "rows": stats(start, end, group_by),
+            # Amounts only add up within a currency.
+            "totals": stats(start, end, ("channel", "currency")),
+        })
+
 # ----------- Payments Home (Root Endpoint) -----------
 def payments_home(request):
     return JsonResponse({"message": "Payments API root — use /mpesa/ or /paypal/ endpoints"})
@@ -0,0 +1,27 @@
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+
+from .index import INDEXED, search
+
+
+class RankedChangeList(ChangeList):
+    def get_queryset(self, request, exclude_parameters=None):
+        queryset = super().get_queryset(request, exclude_parameters)
+        # Best match first, unless a column header was clicked.
+        if self.query.strip() and ORDER_VAR not in self.params:
+            queryset = queryset.order_by("-search_rank", *queryset.query.order_by)
+        return queryset
+
+
+class FullTextSearchMixin:
+    """
+    ModelAdmin search through the search index instead of ``icontains``
+    on every ``search_fields`` column, with results ranked.
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        if self.model not in INDEXED or not search_term.strip():
+            return super().get_search_results(request, queryset, search_term)
+        return search(queryset, search_term), False
+
+    def get_changelist(self, request, **kwargs):
+        return RankedChangeList if self.model in INDEXED else super().get_changelist(request, **kwargs)
@@ -0,0 +1,105 @@
+"""
+Database-specific storage for the search index.
+
+Each indexed model gets a side table, ``<db_table>_search``, with one row
+per object keyed by its id and holding two weighted texts: *head* (names,
+emails) and *body* (free text).
+
+* PostgreSQL: a ``tsvector`` column (head weighted A, body B) behind a GIN
+  index; matches are ranked with ``ts_rank``.
+* SQLite: an FTS5 table with the Porter stemmer. Ranking is coarser:
+  rows matching in the head come before rows matching only in the body.
+  (A per-row ``bm25`` re-runs the match for every row, which is quadratic
+  on SQLite; this is meant for local development.)
+
+Other databases have no backend and ``search.index.search`` falls back to
+``icontains``. Texts are reduced to their words first, so ``a@example.com``
+is searchable as ``a``, ``example`` and ``com`` on both backends.
+"""
+import re
+
+TEXT_CONFIG = "english"
+MAX_TERMS = 8
+
+
+def words(text):
+    return re.findall(r"\w+", str(text or ""))
+
+
+def plain(*values):
+    return " ".join(word for value in values for word in words(value))
+
+
+def table_name(db_table):
+    return f"{db_table}_search"
+
+
+class PostgresBackend:
+    def create(self, cursor, table):
+        cursor.execute(f"CREATE TABLE {table} (object_id bigint PRIMARY KEY, document tsvector NOT NULL)")
+        cursor.execute(f"CREATE INDEX {table}_gin ON {table} USING gin (document)")
+
+    def drop(self, cursor, table):
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+
+    def write(self, cursor, table, rows):
+        """Insert or replace ``(id, head, body)`` rows."""
+        cursor.executemany(
+            f"INSERT INTO {table} (object_id, document) VALUES "
+            f"(%s, setweight(to_tsvector('{TEXT_CONFIG}', %s), 'A') || setweight(to_tsvector('{TEXT_CONFIG}', %s), 'B')) "
+            "ON CONFLICT (object_id) DO UPDATE SET document = EXCLUDED.document",
+            rows,
+        )
+
+    def delete(self, cursor, table, ids):
+        cursor.execute(f"DELETE FROM {table} WHERE object_id = ANY(%s)", [list(ids)])
+
+    def clear(self, cursor, table):
+        cursor.execute(f"TRUNCATE {table}")
+
+    def query(self, terms):
+        # Every term, as a prefix: "ami kip" finds "Amina Kiprop".
+        return " & ".join(f"{term}:*" for term in terms)
+
+    def matches(self, table, query):
+        return (f"SELECT object_id FROM {table} WHERE document @@ to_tsquery('{TEXT_CONFIG}', %s)", [query])
+
+    def rank(self, table, query, outer_pk):
+        return (f"SELECT ts_rank(document, to_tsquery('{TEXT_CONFIG}', %s)) FROM {table} "
+                f"WHERE object_id = {outer_pk}", [query])
+
+
+class SqliteBackend:
+    def create(self, cursor, table):
+        cursor.execute(f"CREATE VIRTUAL TABLE {table} USING fts5(head, body, tokenize='porter unicode61')")
+
+    def drop(self, cursor, table):
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+
+    def write(self, cursor, table, rows):
+        cursor.executemany(f"INSERT OR REPLACE INTO {table} (rowid, head, body) VALUES (%s, %s, %s)", rows)
+
+    def delete(self, cursor, table, ids):
+        ids = list(ids)
+        cursor.execute(f"DELETE FROM {table} WHERE rowid IN ({', '.join(['%s'] * len(ids))})", ids)
+
+    def clear(self, cursor, table):
+        cursor.execute(f"DELETE FROM {table}")
+
+    def query(self, terms):
+        return " ".join(f'"{term}"*' for term in terms)
+
+    def matches(self, table, query):
+        return (f"SELECT rowid FROM {table} WHERE {table} MATCH %s", [query])
+
+    def rank(self, table, query, outer_pk):
+        # Not correlated, so SQLite evaluates the head match once.
+        return (f"CASE WHEN {outer_pk} IN (SELECT rowid FROM {table} WHERE {table} MATCH %s) "
+                "THEN 1.0 ELSE 0.0 END", [f"head : ({query})"])
+
+
+BACKENDS = {"postgresql": PostgresBackend(), "sqlite": SqliteBackend()}
+
+
+def get_backend(connection):
+    return BACKENDS.get(connection.vendor)
@@ -0,0 +1,115 @@
+"""
+Full-text search over form submissions.
+
+``INDEXED`` lists each searchable model with its *head* fields (short,
+weighted high) and *body* fields (free text). Saves and deletes keep the
+index in step through ``search.signals``, in the same transaction as the
+change; ``rebuild_search_index`` repopulates it from scratch.
+
+``search(queryset, q)`` filters a queryset down to the rows matching every
+word of ``q`` (as a prefix) through the index, and annotates the
+``search_rank`` they should be ordered by, best first.
+"""
+from django.db import connections
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from contacts.models import Contact
+from partnerApplications.models import Partners
+from volunteers.models import Volunteer
+
+from .backends import MAX_TERMS, get_backend, plain, table_name, words
+
+INDEXED = {
+    Contact: (("name", "email"), ("message",)),
+    Volunteer: (("full_name", "email", "phone"), ("skills",)),
+    Partners: (("organization_name", "contact_person", "email"), ("message",)),
+}
+
+
+def index_table(model):
+    return table_name(model._meta.db_table)
+
+
+# ----------- Keeping the index in step -----------
+def index_objects(model, objs, using="default"):
+    backend = get_backend(connections[using])
+    if backend is None or model not in INDEXED:
+        return
+    head, body = INDEXED[model]
+    rows = [
+        (obj.pk, plain(*(getattr(obj, f) for f in head)), plain(*(getattr(obj, f) for f in body)))
+        for obj in objs if obj.pk is not None
+    ]
+    if rows:
+        with connections[using].cursor() as cursor:
+            backend.write(cursor, index_table(model), rows)
+
+
+def unindex(model, ids, using="default"):
+    backend = get_backend(connections[using])
+    ids = list(ids)
+    if backend is None or model not in INDEXED or not ids:
+        return
+    with connections[using].cursor() as cursor:
+        backend.delete(cursor, index_table(model), ids)
+
+
+def rebuild(model, using="default", chunk_size=2000):
+    """Re-index every row of ``model``; returns how many were indexed."""
+    backend = get_backend(connections[using])
+    if backend is None:
+        return 0
+    head, body = INDEXED[model]
+    table = index_table(model)
+    with connections[using].cursor() as cursor:
+        backend.clear(cursor, table)
+    rows, total = [], 0
+    for pk, *values in model.objects.using(using).values_list("pk", *head, *body).iterator(chunk_size=chunk_size):
+        rows.append((pk, plain(*values[:len(head)]), plain(*values[len(head):])))
+        if len(rows) >= chunk_size:
+            with connections[using].cursor() as cursor:
+                backend.write(cursor, table, rows)
+            total, rows = total + len(rows), []
+    if rows:
+        with connections[using].cursor() as cursor:
+            backend.write(cursor, table, rows)
+    return total + len(rows)
+
+
+# ----------- Querying -----------
+def search(queryset, q):
+    """Rows of ``queryset`` matching every word of ``q``, annotated with ``search_rank``."""
+    model = queryset.model
+    if model not in INDEXED:
+        raise ValueError(f"{model._meta.label} is not in the search index")
+    terms = [term.lower() for term in words(q)][:MAX_TERMS]
+    if not terms:
+        return _unranked(queryset.none())
+    connection = connections[queryset.db]
+    backend = get_backend(connection)
+    if backend is None:
+        return _search_columns(queryset, terms)
+
+    table = index_table(model)
+    query = backend.query(terms)
+    qn = connection.ops.quote_name
+    outer_pk = f"{qn(model._meta.db_table)}.{qn(model._meta.pk.column)}"
+    return queryset.filter(pk__in=RawSQL(*backend.matches(table, query))).annotate(
+        search_rank=RawSQL(*backend.rank(table, query, outer_pk), output_field=FloatField()),
+    )
+
+
+def _search_columns(queryset, terms):
+    """The unindexed path: each term must appear somewhere in the indexed fields."""
+    head, body = INDEXED[queryset.model]
+    for term in terms:
+        match = Q()
+        for field in head + body:
+            match |= Q(**{f"{field}__icontains": term})
+        queryset = queryset.filter(match)
+    return _unranked(queryset)
+
+
+def _unranked(queryset):
+    return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from search.index import INDEXED, rebuild
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index for contacts, volunteers and partner applications."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Rows read and indexed per batch.")
+
+    def handle(self, *args, **options):
+        for model in INDEXED:
+            count = rebuild(model, chunk_size=options["chunk_size"])
+            self.stdout.write(self.style.SUCCESS(f"Indexed {count} {model._meta.label} row(s)"))
@@ -0,0 +1,53 @@
+from django.db import migrations
+
+from search.backends import get_backend, plain, table_name
+
+# (app, model, head fields, body fields) as of this migration.
+INDEXES = (
+    ('contacts', 'Contact', ('name', 'email'), ('message',)),
+    ('volunteers', 'Volunteer', ('full_name', 'email', 'phone'), ('skills',)),
+    ('partnerApplications', 'Partners', ('organization_name', 'contact_person', 'email'), ('message',)),
+)
+
+
+def create_indexes(apps, schema_editor):
+    backend = get_backend(schema_editor.connection)
+    if backend is None:
+        return  # search.index falls back to icontains.
+    with schema_editor.connection.cursor() as cursor:
+        for app_label, model_name, head, body in INDEXES:
+            model = apps.get_model(app_label, model_name)
+            table = table_name(model._meta.db_table)
+            backend.create(cursor, table)
+            rows = []
+            for pk, *values in model.objects.values_list('pk', *head, *body).iterator(chunk_size=2000):
+                rows.append((pk, plain(*values[:len(head)]), plain(*values[len(head):])))
+                if len(rows) >= 2000:
+                    backend.write(cursor, table, rows)
+                    rows = []
+            if rows:
+                backend.write(cursor, table, rows)
+
+
+def drop_indexes(apps, schema_editor):
+    backend = get_backend(schema_editor.connection)
+    if backend is None:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for app_label, model_name, _, _ in INDEXES:
+            backend.drop(cursor, table_name(apps.get_model(app_label, model_name)._meta.db_table))
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('contacts', '0003_contact_status'),
+        ('partnerApplications', '0003_date_applied_index'),
+        ('volunteers', '0002_date_applied_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,25 @@
+from django.db.models.signals import post_delete, post_save
+
+from payments.signals import rows_bulk_created, rows_bulk_updated
+
+from .index import INDEXED, index_objects, unindex
+
+
+def index_saved(sender, instance, using="default", **kwargs):
+    index_objects(sender, [instance], using)
+
+
+def unindex_deleted(sender, instance, using="default", **kwargs):
+    unindex(sender, [instance.pk], using)
+
+
+def index_bulk(sender, objs, **kwargs):
+    index_objects(sender, objs)
+
+
+for model in INDEXED:
+    uid = f"search-{model._meta.label_lower}"
+    post_save.connect(index_saved, sender=model, dispatch_uid=uid)
+    post_delete.connect(unindex_deleted, sender=model, dispatch_uid=uid)
+    rows_bulk_created.connect(index_bulk, sender=model, dispatch_uid=uid)
+    rows_bulk_updated.connect(index_bulk, sender=model, dispatch_uid=uid)
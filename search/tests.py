@@ -0,0 +1,85 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from backend import caching, throttling
+from contacts.models import Contact
+from payments.signals import rows_bulk_created
+from volunteers.models import Volunteer
+
+from .index import _search_columns, rebuild, search
+
+
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        self.amina = Contact.objects.create(name="Amina Kiprop", email="amina@example.com", message="Fundraising walk")
+        self.brian = Contact.objects.create(name="Brian Otieno", email="brian@example.com",
+                                           message="Amina told me about the walk")
+
+    def names(self, q, queryset=None):
+        return [c.name for c in search(queryset or Contact.objects.all(), q).order_by("-search_rank", "-id")]
+
+    def test_ranks_head_fields_above_body(self):
+        self.assertEqual(self.names("amina"), ["Amina Kiprop", "Brian Otieno"])
+        self.assertEqual(self.names("otieno"), ["Brian Otieno"])
+
+    def test_every_term_must_match_as_a_prefix(self):
+        self.assertEqual(self.names("ami kip"), ["Amina Kiprop"])
+        self.assertEqual(self.names("brian@example.com"), ["Brian Otieno"])
+        self.assertEqual(len(self.names("walking")), 2)  # stemmed
+        self.assertEqual(self.names("nobody"), [])
+        self.assertEqual(self.names("!!"), [])
+
+    def test_saves_and_deletes_keep_the_index_in_step(self):
+        self.amina.name = "Wanjiru Kamau"
+        self.amina.save()
+        self.assertEqual(self.names("wanjiru"), ["Wanjiru Kamau"])
+        self.assertEqual(self.names("kiprop"), [])
+        self.brian.delete()
+        self.assertEqual(self.names("walk"), ["Wanjiru Kamau"])
+
+        contacts = Contact.objects.bulk_create([Contact(name="Zawadi", email="z@example.com", message="Hi")])
+        rows_bulk_created.send(sender=Contact, objs=contacts)
+        self.assertEqual(self.names("zawadi"), ["Zawadi"])
+
+    def test_rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM contacts_contact_search")
+        self.assertEqual(self.names("amina"), [])
+        call_command("rebuild_search_index", stdout=StringIO())
+        self.assertEqual(rebuild(Contact), 2)
+        self.assertEqual(len(self.names("amina")), 2)
+
+    def test_column_fallback_matches_the_index(self):
+        rows = _search_columns(Contact.objects.all(), ["amina", "walk"])
+        self.assertEqual(sorted(c.name for c in rows), ["Amina Kiprop", "Brian Otieno"])
+
+
+class SearchEndpointTests(TestCase):
+    def setUp(self):
+        caching.get_cache().clear()
+        throttling.get_cache().clear()
+        Volunteer.objects.create(full_name="Amina Kiprop", email="a@example.com", phone="0700000001",
+                                 skills="First aid")
+        Volunteer.objects.create(full_name="Brian Otieno", email="b@example.com", phone="0700000002",
+                                 skills="Logistics, first aid for Amina's team")
+
+    def test_list_api_q(self):
+        client = APIClient()
+        res = client.get("/api/volunteers/?q=amina", secure=True)
+        self.assertEqual([row["full_name"] for row in res.json()], ["Amina Kiprop", "Brian Otieno"])
+        self.assertNotIn("search_rank", res.json()[0])
+        res = client.get("/api/volunteers/?q=logistics&page_size=1&fields=full_name", secure=True)
+        self.assertEqual(res.json()["results"], [{"full_name": "Brian Otieno"}])
+
+    def test_admin_search_is_ranked(self):
+        admin = get_user_model().objects.create_superuser("admin", "admin@example.com", "pw")
+        self.client.force_login(admin)
+        res = self.client.get("/admin/volunteers/volunteer/?q=amina", secure=True)
+        self.assertEqual([str(v) for v in res.context["cl"].result_list], ["Amina Kiprop", "Brian Otieno"])
+        res = self.client.get("/admin/volunteers/volunteer/?q=logistics", secure=True)
+        self.assertEqual(res.context["cl"].result_count, 1)
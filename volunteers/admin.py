@@ -1,8 +1,10 @@
 from django.contrib import admin
+from backend.admin import PerformanceAdminMixin
+from search.admin import FullTextSearchMixin
 from .models import Volunteer
 
 @admin.register(Volunteer)
-class VolunteerAdmin(admin.ModelAdmin):
+class VolunteerAdmin(PerformanceAdminMixin, FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('full_name', 'email', 'phone', 'availability', 'date_applied')
     list_filter = ('availability', 'date_applied')
     search_fields = ('full_name', 'email', 'phone', 'skills')
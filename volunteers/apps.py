@@ -5,4 +5,7 @@ class VolunteersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'volunteers'
 
+    def ready(self):
+        from backend.caching import track_model
 
+        track_model(self.get_model("Volunteer"))
@@ -9,5 +9,11 @@ class Volunteer(models.Model):
     availability = models.BooleanField(default=False)
     date_applied = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["date_applied", "id"], name="volunteer_date_applied_idx"),
+            models.Index(fields=["availability", "date_applied"], name="volunteer_availability_idx"),
+        ]
+
     def __str__(self):
         return self.full_name
@@ -1,7 +1,8 @@
 from rest_framework import serializers
+from backend.serializers import SparseFieldsMixin
 from .models import Volunteer
 
-class VolunteerSerializer(serializers.ModelSerializer):
+class VolunteerSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Volunteer
         fields = '__all__'  # Include all fields, or list them explicitly if needed
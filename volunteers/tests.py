@@ -1,3 +1,48 @@
+from datetime import timedelta
+
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from backend.caching import get_cache
+from backend.serializers import ValuesReader
+
+from .models import Volunteer
+from .serializers import VolunteerSerializer
+
+
+class VolunteerListTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        now = timezone.now()
+        # Pairs of volunteers share a date_applied so the cursor has to break ties.
+        Volunteer.objects.bulk_create([
+            Volunteer(
+                full_name=f"Volunteer {i}",
+                email=f"v{i}@example.com",
+                phone="0700000000",
+                skills="First aid",
+                date_applied=now - timedelta(days=i // 2),
+            )
+            for i in range(15)
+        ])
+
+    def test_cursor_pages_handle_equal_dates(self):
+        seen, url = [], "/api/volunteers/?page_size=4&fields=id,date_applied"
+        while url:
+            res = self.client.get(url, secure=True)
+            self.assertEqual(res.status_code, 200)
+            seen.extend(row["id"] for row in res.data["results"])
+            url = res.data["next"]
+        self.assertEqual(sorted(seen), sorted(Volunteer.objects.values_list("id", flat=True)))
+        self.assertEqual(len(seen), len(set(seen)))
 
-# Create your tests here.
+    def test_values_reader_matches_serializer(self):
+        Volunteer.objects.filter(pk=Volunteer.objects.first().pk).update(availability=True)
+        queryset = Volunteer.objects.order_by("-date_applied", "-id")
+        reader = ValuesReader(VolunteerSerializer)
+        self.assertTrue(reader.supported)
+        expected = [dict(row) for row in VolunteerSerializer(queryset, many=True).data]
+        self.assertEqual(reader.to_representation(reader.values(queryset)), expected)
+        self.assertEqual(self.client.get("/api/volunteers/", secure=True).json(), expected)
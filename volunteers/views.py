@@ -1,20 +1,26 @@
-from rest_framework.decorators import api_view
+from django.db import transaction
+from rest_framework.decorators import api_view, throttle_classes
 from rest_framework.response import Response
 from rest_framework import status
+from backend.caching import cache_response
+from backend.pagination import list_response
+from backend.throttling import VolunteerSubmitThrottle
 from .models import Volunteer
 from .serializers import VolunteerSerializer
 
 
+@cache_response(Volunteer)
 @api_view(['GET', 'POST'])
+@throttle_classes([VolunteerSubmitThrottle])
 def volunteers_view(request):
     if request.method == 'GET':
-        volunteers = Volunteer.objects.all().order_by('-date_applied')
-        serializer = VolunteerSerializer(volunteers, many=True)
-        return Response(serializer.data)
+        return list_response(request, Volunteer.objects.all(), VolunteerSerializer, ordering=('-date_applied', '-id'))
 
     elif request.method == 'POST':
         serializer = VolunteerSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            # The outbox message (see outbox.signals) commits with the row.
+            with transaction.atomic():
+                serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)